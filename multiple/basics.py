@@ -2,9 +2,10 @@
 import time
 import logging
 from logging.handlers import TimedRotatingFileHandler
-import regex # type: ignore
 from typing import List, Any, Dict, Union, Literal, Optional
 import os
+import importlib.util
+from console_output import ConsoleOutput
 
 INDENT = str("   ")
 
@@ -46,19 +47,22 @@ Slice = Literal["whole", "lastHalf", "lastQuarter"]
 Category = Literal["potentialMarket", "openInvest", "closedInvest"]
 Formats = Literal["png", "jpg", "jpeg", "webp", "svg", "pdf"]
 
+# La libreria numpy es opcional y se importa solo donde se usa, para no cargarla al iniciar el programa.
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+
 
 class Basics():
     
     @staticmethod 
     def cmd(message:str, prefix:str="", suffix:str=""):
         '''
-        Imprime en consola un mensaje de texto.
+        Imprime en consola un mensaje de texto, mediante ConsoleOutput.
         param message: Mensaje de texto que se debe mostrar en la consola CMD.
         param prefix: Cadena de texto que solo se agrega delante del texto que se imprime en pantalla.
         param suffix: Cadena de texto que solo se agrega detras del texto que se imprime en pantalla.
         return: Devuelve el mismo mensaje.
         '''
-        print(f"{prefix}{message}{suffix}")
+        ConsoleOutput.write(f"{prefix}{message}{suffix}")
         return message
 
 
@@ -75,6 +79,7 @@ class Basics():
         param debugMode: jhgjh
         return: kgjh
         '''
+        import regex # type: ignore
         LOG_FORMAT = '%(asctime)s %(levelname)s %(module)s:%(funcName)s:%(lineno)04d - %(message)s'
         handler = TimedRotatingFileHandler(fileName, when="midnight", backupCount=filesCount) 
         handler.setLevel(logging.DEBUG if debugMode else logging.INFO)
@@ -127,19 +132,19 @@ class Basics():
         try:
             if type(data) == dict or type(data) == list or type(data) == tuple:
                 if title != "":
-                    print(f"{str(ident) * (level - 1)}{title}")
+                    ConsoleOutput.write(f"{str(ident) * (level - 1)}{title}")
                 if type(data) == dict:
                     for key in data.keys():
-                        time.sleep(0.1)
+                        ConsoleOutput.pause(0.1)
                         Basics.show_object(data[key], key, ident=ident, level=level+1)
                 else:
                     count = 0
                     for element in data:
-                        time.sleep(0.1)
+                        ConsoleOutput.pause(0.1)
                         Basics.show_object(element, f'elemento {count}', ident=ident, level=level+1) 
                         count += 1
             else:
-                print(f"{str(ident) * (level - 1)}{title}: {str(data)}") 
+                ConsoleOutput.write(f"{str(ident) * (level - 1)}{title}: {str(data)}") 
             return True
         except:
             return False               
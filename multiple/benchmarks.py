@@ -0,0 +1,389 @@
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from basics import *
+from file_manager import FileManager
+from market_metrics import MarketMetrics
+from validations import Validations
+from ticker_table import TickerTable, TICKER_TABLE_AVAILABLE
+from market_universe import MarketUniverse
+from universe_manager import UniverseManager
+from trendtaker_core import TrendTakerCore
+from configuration import DEFAULT_CONFIGURATION
+from metrics_engines import random_candles
+
+BENCHMARK_FILE_VERSION = 1
+DEFAULT_MARKETS = [100, 1000]
+DEFAULT_HOURS = [168, 720]
+DEFAULT_REPEAT = 5
+DEFAULT_OUTPUT = "./benchmark_results.json"
+DEFAULT_STARTUP_EXCHANGE = "hitbtc"
+HEAVY_MODULES = ["ccxt", "plotly", "regex", "numpy"]
+
+Benchmark = Callable[['BenchmarkData'], int]
+
+
+####################################################################################################
+# DATOS SINTETICOS
+# Se generan con una semilla, de manera que dos ejecuciones con los mismos parametros miden
+# exactamente los mismos datos y los resultados se pueden comparar antes y despues de un cambio.
+####################################################################################################
+
+def synthetic_ticker(generator:random.Random, symbol:MarketId) -> Ticker:
+    '''
+    Crea un ticker aleatorio con los campos que usan MarketMetrics y Validations.
+    param generator: Generador de numeros aleatorios con semilla.
+    param symbol: Identificador del mercado del ticker.
+    return: Ticker con la estructura de la libreria CCXT.
+    '''
+    last = 10 ** generator.uniform(-6, 3)
+    low = last * generator.uniform(0.85, 1.0)
+    high = last * generator.uniform(1.0, 1.2)
+    spread = generator.uniform(0, 0.02)
+    return {
+        "symbol": symbol,
+        "last": last,
+        "bid": last,
+        "ask": last * (1 + spread),
+        "low": low,
+        "high": high,
+        "percentage": generator.uniform(-15, 25),
+        "quoteVolume": generator.uniform(0, 1000000)
+    }
+
+
+def synthetic_markets(generator:random.Random, count:int, quote:CurrencyId) -> Tuple[DictOfMarkets, DictOfCurrencies]:
+    '''
+    Crea mercados y currencies con la estructura de la libreria CCXT.
+    Una parte de los mercados tiene otra quote, esta inactiva o no es spot, para que el filtro trabaje.
+    param generator: Generador de numeros aleatorios con semilla.
+    param count: Cantidad de mercados.
+    param quote: Currency quote de la mayoria de los mercados.
+    return: Diccionario de mercados y diccionario de currencies.
+    '''
+    markets: DictOfMarkets = {}
+    currencies: DictOfCurrencies = {quote: {"id": quote, "active": True}, "BTC": {"id": "BTC", "active": True}}
+    for index in range(count):
+        base = f'C{index}'
+        marketQuote = quote if generator.random() < 0.8 else "BTC"
+        symbol = f'{base}/{marketQuote}'
+        spot = generator.random() < 0.95
+        currencies[base] = {"id": base, "active": generator.random() < 0.95}
+        markets[symbol] = {
+            "symbol": symbol,
+            "base": base,
+            "quote": marketQuote,
+            "active": generator.random() < 0.95,
+            "spot": spot,
+            "type": "spot" if spot else "swap",
+            "limits": {"amount": {"min": 10 ** generator.uniform(-4, 1), "max": 10 ** generator.uniform(4, 8)}}
+        }
+    return markets, currencies
+
+
+
+class SyntheticExchangeInterface(Basics):
+    '''
+    Sustituye a ExchangeInterface en las mediciones que solo leen los mercados y currencies ya cargados.
+    '''
+
+    def __init__(self, markets:DictOfMarkets, currencies:DictOfCurrencies):
+        self.markets = markets
+        self.currencies = currencies
+
+    def get_markets(self) -> DictOfMarkets:
+        return self.markets
+
+    def get_currencies(self) -> DictOfCurrencies:
+        return self.currencies
+
+    def load_markets_and_currencies(self, reload:bool=False) -> bool:
+        return True
+
+
+
+class BenchmarkCore(TrendTakerCore):
+    '''
+    TrendTakerCore sin conexion con el exchange ni ficheros de inversiones, para medir sus metodos de filtrado.
+    '''
+
+    def __init__(self, markets:DictOfMarkets, currencies:DictOfCurrencies):
+        Validations.__init__(self, "benchmark")
+        self.botId = "benchmark"
+        self.exchangeInterface = SyntheticExchangeInterface(markets, currencies)
+        self.universeManager = UniverseManager("benchmark", self.exchangeInterface, self)
+
+
+
+class BenchmarkData(Basics):
+    '''
+    Datos sinteticos de una combinacion de cantidad de mercados y cantidad de velas.
+    '''
+
+    def __init__(self, seed:int, marketsCount:int, hours:int, quote:CurrencyId="USDT"):
+        generator = random.Random(f'{seed}-{marketsCount}-{hours}')
+        self.marketsCount = marketsCount
+        self.hours = hours
+        self.quote = quote
+        self.configuration = DEFAULT_CONFIGURATION
+        self.markets, self.currencies = synthetic_markets(generator, marketsCount, quote)
+        self.symbols = list(self.markets.keys())
+        self.tickers = [synthetic_ticker(generator, symbol) for symbol in self.symbols]
+        self.candles = [random_candles(generator, "normal", hours) for symbol in self.symbols]
+        self._metrics: Optional[List[Dict]] = None
+        self._trendLines: Optional[List[List[float]]] = None
+        self._universe: Optional[MarketUniverse] = None
+
+    def metrics(self) -> List[Dict]:
+        '''
+        return: Metricas de cada mercado. Se calculan una sola vez, fuera del tiempo medido.
+        '''
+        if self._metrics is None:
+            self._metrics = [MarketMetrics.calculate(ticker, candles, []) for ticker, candles in zip(self.tickers, self.candles)]
+        return self._metrics
+
+    def universe(self) -> MarketUniverse:
+        '''
+        return: Indice de los mercados. Se crea una sola vez, fuera del tiempo medido, igual que despues de load_markets.
+        '''
+        if self._universe is None:
+            self._universe = MarketUniverse(self.markets, self.currencies, self.configuration["blackList"], self.configuration["preselected"])
+        return self._universe
+
+    def trend_lines(self) -> List[List[float]]:
+        '''
+        return: Linea de tendencia de cada mercado. Se calcula una sola vez, fuera del tiempo medido.
+        '''
+        if self._trendLines is None:
+            self._trendLines = []
+            for candles in self.candles:
+                prices = [MarketMetrics._candle_estimated_average(candle) for candle in candles]
+                self._trendLines.append(MarketMetrics._create_trend_line(prices[0], prices[-1], len(prices)))
+        return self._trendLines
+
+
+
+####################################################################################################
+# MEDICIONES
+# Cada medicion ejecuta una vez la operacion sobre todos los mercados y devuelve la cantidad
+# de elementos procesados, para calcular el tiempo por elemento.
+####################################################################################################
+
+def bench_market_metrics_calculate(data:BenchmarkData) -> int:
+    for ticker, candles in zip(data.tickers, data.candles):
+        MarketMetrics.calculate(ticker, candles, [])
+    return data.marketsCount
+
+
+def bench_candles_trend_deviation(data:BenchmarkData) -> int:
+    for candles, trendLine in zip(data.candles, data.trend_lines()):
+        MarketMetrics._candles_trend_deviation(candles, trendLine)
+    return data.marketsCount
+
+
+def bench_is_valid_ticker(data:BenchmarkData) -> int:
+    for ticker in data.tickers:
+        Validations.is_valid_ticker(ticker, data.configuration)
+    return data.marketsCount
+
+
+def bench_ticker_table(data:BenchmarkData) -> int:
+    table = TickerTable(data.tickers, data.configuration["preselected"])
+    table.top(table.valid_mask(data.configuration), data.configuration["maxTickersToSelect"])
+    return data.marketsCount
+
+
+def bench_is_potential_market(data:BenchmarkData) -> int:
+    for symbol, metrics in zip(data.symbols, data.metrics()):
+        Validations.is_potential_market({"baseId": Basics.base_of_symbol(symbol), "metrics": metrics}, data.configuration)
+    return data.marketsCount
+
+
+def bench_get_list_of_valid_markets(data:BenchmarkData) -> int:
+    BenchmarkCore(data.markets, data.currencies).get_list_of_valid_markets(data.quote, data.configuration["blackList"])
+    return data.marketsCount
+
+
+def bench_get_list_of_valid_markets_with_universe(data:BenchmarkData) -> int:
+    core = BenchmarkCore(data.markets, data.currencies)
+    core.universe = data.universe()
+    core.get_list_of_valid_markets(data.quote, data.configuration["blackList"])
+    return data.marketsCount
+
+
+# Nombre de la medicion: (funcion, True si depende de la cantidad de velas).
+BENCHMARKS: Dict[str, Tuple[Benchmark, bool]] = {
+    "MarketMetrics.calculate": (bench_market_metrics_calculate, True),
+    "MarketMetrics._candles_trend_deviation": (bench_candles_trend_deviation, True),
+    "Validations.is_valid_ticker": (bench_is_valid_ticker, False),
+    "TickerTable.valid_mask+top": (bench_ticker_table, False),
+    "Validations.is_potential_market": (bench_is_potential_market, False),
+    "TrendTakerCore.get_list_of_valid_markets": (bench_get_list_of_valid_markets, False),
+    "TrendTakerCore.get_list_of_valid_markets+universe": (bench_get_list_of_valid_markets_with_universe, False)
+}
+
+
+def measure(benchmark:Benchmark, data:BenchmarkData, repeat:int) -> Dict:
+    '''
+    Ejecuta una medicion varias veces y devuelve los tiempos.
+    param benchmark: Funcion de la medicion.
+    param data: Datos sinteticos sobre los que se ejecuta la medicion.
+    param repeat: Cantidad de repeticiones. Antes se hace una ejecucion de calentamiento que no se mide.
+    return: Objeto con los tiempos minimo, mediana y media en segundos, y el tiempo por elemento en microsegundos.
+    '''
+    items = benchmark(data)
+    times = []
+    for index in range(repeat):
+        begin = time.perf_counter()
+        items = benchmark(data)
+        times.append(time.perf_counter() - begin)
+    return {
+        "items": items,
+        "seconds": {
+            "min": min(times),
+            "median": statistics.median(times),
+            "mean": statistics.mean(times)
+        },
+        "perItemMicroseconds": min(times) / max(items, 1) * 1000000
+    }
+
+
+def run_benchmarks(
+        marketsCounts:List[int],
+        hoursCounts:List[int],
+        repeat:int=DEFAULT_REPEAT,
+        seed:int=0,
+        names:Optional[List[str]]=None
+    ) -> Dict:
+    '''
+    Ejecuta las mediciones para cada combinacion de cantidad de mercados y cantidad de velas.
+    param marketsCounts: Cantidades de mercados. Ej: [100, 1000].
+    param hoursCounts: Cantidades de velas 1h por mercado. Ej: [168, 720].
+    param repeat: Cantidad de repeticiones de cada medicion.
+    param seed: Semilla de los datos sinteticos.
+    param names: Nombres de las mediciones que se deben ejecutar. None para ejecutar todas.
+    return: Objeto con los parametros de la ejecucion y la lista de resultados.
+    '''
+    selected = {name: value for name, value in BENCHMARKS.items() if names is None or name in names}
+    if not TICKER_TABLE_AVAILABLE:
+        selected.pop("TickerTable.valid_mask+top", None)
+    results = []
+    for marketsCount in marketsCounts:
+        for hoursIndex, hours in enumerate(hoursCounts):
+            data = BenchmarkData(seed, marketsCount, hours)
+            for name, (benchmark, dependsOnHours) in selected.items():
+                if not dependsOnHours and hoursIndex > 0:
+                    continue
+                result = {"name": name, "markets": marketsCount, "hours": hours if dependsOnHours else None}
+                result.update(measure(benchmark, data, repeat))
+                results.append(result)
+                hoursLabel = f'{hours} velas' if dependsOnHours else ''
+                print(f'{name:52} {marketsCount:6} mercados {hoursLabel:10} {result["perItemMicroseconds"]:12.2f} us/mercado')
+    return {
+        "version": BENCHMARK_FILE_VERSION,
+        "datetimeUTC": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "repeat": repeat,
+        "results": results
+    }
+
+
+
+
+####################################################################################################
+# ARRANQUE
+# Cada medicion se hace en un interprete nuevo, porque los modulos ya importados no se vuelven a
+# cargar. Se mide el tiempo de importar trendtaker y el tiempo hasta que el bot puede hacer la
+# primera peticion al exchange (exchange de CCXT creado). Con "network" se incluye la primera
+# peticion real, que es la carga de los mercados.
+####################################################################################################
+
+STARTUP_SCRIPT = """
+import sys
+import json
+import time
+begin = time.perf_counter()
+import trendtaker
+imported = time.perf_counter()
+heavyAfterImport = [name for name in json.loads(sys.argv[3]) if name in sys.modules]
+from exchange_interface import ExchangeInterface
+exchangeInterface = ExchangeInterface(sys.argv[1], "", "", "startup")
+ready = time.perf_counter()
+loaded = exchangeInterface.load_markets_and_currencies() if sys.argv[2] == "1" else None
+print(json.dumps({
+    "importSeconds": imported - begin,
+    "firstRequestSeconds": ready - begin,
+    "firstResponseSeconds": time.perf_counter() - begin if loaded is not None else None,
+    "heavyModulesAfterImport": heavyAfterImport
+}))
+"""
+
+
+def measure_startup(exchangeId:str=DEFAULT_STARTUP_EXCHANGE, repeat:int=DEFAULT_REPEAT, network:bool=False) -> Optional[Dict]:
+    '''
+    Mide el arranque del bot en interpretes nuevos.
+    param exchangeId: Identificador del exchange que se crea para la primera peticion.
+    param repeat: Cantidad de repeticiones.
+    param network: True para incluir la primera peticion real al exchange (necesita conexion).
+    return: Objeto con los tiempos minimo y mediana en segundos de cada fase, y los modulos pesados
+            que quedan cargados despues de importar trendtaker. None si el interprete falla.
+    '''
+    directory = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for index in range(repeat):
+        begin = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT, exchangeId, "1" if network else "0", json.dumps(HEAVY_MODULES)],
+            cwd=directory, capture_output=True, text=True
+        )
+        if process.returncode != 0:
+            print(process.stderr)
+            return None
+        sample = json.loads(process.stdout.strip().splitlines()[-1])
+        sample["processSeconds"] = time.perf_counter() - begin
+        samples.append(sample)
+    result: Dict = {"exchange": exchangeId, "network": network, "seconds": {}}
+    for name in ["importSeconds", "firstRequestSeconds", "firstResponseSeconds", "processSeconds"]:
+        times = [sample[name] for sample in samples if sample[name] is not None]
+        if len(times) > 0:
+            result["seconds"][name] = {"min": min(times), "median": statistics.median(times)}
+            print(f'{"Arranque " + name:52} {exchangeId:15} {min(times) * 1000:12.1f} ms')
+    result["heavyModulesAfterImport"] = samples[-1]["heavyModulesAfterImport"]
+    print(f'{"Modulos pesados cargados al importar trendtaker":52} {", ".join(result["heavyModulesAfterImport"]) or "-"}')
+    return result
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mediciones de rendimiento de MarketMetrics y Validations.")
+    parser.add_argument("--markets", type=str, default=",".join(str(value) for value in DEFAULT_MARKETS), help="Cantidades de mercados separadas por comas.")
+    parser.add_argument("--hours", type=str, default=",".join(str(value) for value in DEFAULT_HOURS), help="Cantidades de velas 1h separadas por comas.")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Repeticiones de cada medicion.")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de los datos sinteticos.")
+    parser.add_argument("--only", type=str, action="append", choices=list(BENCHMARKS.keys()) + ["startup"], help="Ejecuta solo la medicion indicada.")
+    parser.add_argument("--startup-exchange", type=str, default=DEFAULT_STARTUP_EXCHANGE, help="Exchange de la medicion del arranque.")
+    parser.add_argument("--startup-network", action="store_true", help="Incluye en el arranque la primera peticion real al exchange.")
+    parser.add_argument("--output", type=str, default=DEFAULT_OUTPUT, help="Fichero JSON de resultados.")
+    arguments = parser.parse_args()
+    report = run_benchmarks(
+        [int(value) for value in arguments.markets.split(",")],
+        [int(value) for value in arguments.hours.split(",")],
+        arguments.repeat,
+        arguments.seed,
+        arguments.only
+    )
+    if arguments.only is None or "startup" in arguments.only:
+        report["startup"] = measure_startup(arguments.startup_exchange, arguments.repeat, arguments.startup_network)
+    sys.exit(0 if FileManager.data_to_file_json(report, arguments.output) else 1)
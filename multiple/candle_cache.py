@@ -0,0 +1,113 @@
+
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from basics import *
+
+DEFAULT_MAX_AGE_SECONDS = 300
+DEFAULT_MAX_ENTRIES = 1000
+
+CandlesKey = Tuple[MarketId, int, str]
+
+
+class CandleCache(Basics):
+    '''
+    Cache en memoria de las ultimas velas pedidas al exchange, para no descargar dos veces las velas de un
+    mismo mercado.\n
+    Cuando se escanean varias quotes, o se repite el escaneo en poco tiempo, un mismo symbol se puede pedir
+    varias veces. Las velas se guardan por symbol, cantidad y temporalidad, y se reutilizan mientras tengan
+    menos de "maxAgeSeconds" segundos. Cuando se superan "maxEntries" entradas se descartan las menos usadas.
+    Los mercados retirados o modificados en el exchange se pueden invalidar con "invalidate".
+    '''
+
+    def __init__(self, botId:str, exchangeInterface, maxAgeSeconds:float=DEFAULT_MAX_AGE_SECONDS, maxEntries:int=DEFAULT_MAX_ENTRIES):
+        '''
+        param botId: Identificador del bot. Se usa para obtener el log.
+        param exchangeInterface: Interfaz con el exchange. Debe tener el metodo get_last_candles.
+        param maxAgeSeconds: Edad maxima en segundos de las velas reutilizadas. Cero para desactivar el cache.
+        param maxEntries: Cantidad maxima de entradas guardadas.
+        '''
+        self.log = logging.getLogger(botId)
+        self.exchangeInterface = exchangeInterface
+        self.maxAgeSeconds = float(maxAgeSeconds)
+        self.maxEntries = max(1, int(maxEntries))
+        self.entries: OrderedDict[CandlesKey, Tuple[float, ListOfCandles]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def configure(self, configuration:Dict):
+        '''
+        Aplica la seccion "candleCache" de la configuracion.
+        param configuration: Objeto con la configuracion del algoritmo.
+        '''
+        candleCache = configuration.get("candleCache", {})
+        self.maxAgeSeconds = float(candleCache.get("maxAgeSeconds", DEFAULT_MAX_AGE_SECONDS)) if candleCache.get("enable", True) else 0.0
+        self.maxEntries = max(1, int(candleCache.get("maxEntries", DEFAULT_MAX_ENTRIES)))
+        if self.maxAgeSeconds <= 0:
+            self.entries.clear()
+
+
+    def get_last_candles(self, symbol:MarketId, count:int=24, timeFrame:str='1h') -> Optional[ListOfCandles]:
+        '''
+        Devuelve las ultimas velas del mercado, desde el cache si son recientes o desde el exchange.
+        Los parametros son los mismos que en ExchangeInterface.get_last_candles.
+        return: Lista con las velas obtenidas. Si falla devuelve None. Los errores no se guardan en el cache.
+        '''
+        if self.maxAgeSeconds <= 0:
+            return self.exchangeInterface.get_last_candles(symbol, count, timeFrame)
+        key = (symbol, int(count), timeFrame)
+        now = time.monotonic()
+        entry = self.entries.get(key, None)
+        if entry is not None and now - entry[0] <= self.maxAgeSeconds:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[1]
+        self.misses += 1
+        candles = self.exchangeInterface.get_last_candles(symbol, count, timeFrame)
+        if candles is not None:
+            self.entries[key] = (now, candles)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+        return candles
+
+
+    def invalidate(self, symbols:ListOfMarketsId) -> int:
+        '''
+        Elimina del cache las velas de los mercados especificados.
+        param symbols: Lista de identificadores de mercados.
+        return: Cantidad de entradas eliminadas.
+        '''
+        symbolsSet = set(symbols)
+        keys = [key for key in self.entries if key[0] in symbolsSet]
+        for key in keys:
+            del self.entries[key]
+        return len(keys)
+
+
+    def report(self) -> str:
+        '''
+        return: Texto con la cantidad de velas reutilizadas y descargadas.
+        '''
+        return f'Cache de velas. Reutilizadas: {self.hits}  Descargadas: {self.misses}  Entradas: {len(self.entries)}'
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+
+    class CountingExchangeInterface(Basics):
+        def __init__(self):
+            self.calls = 0
+        def get_last_candles(self, symbol:MarketId, count:int=24, timeFrame:str='1h') -> Optional[ListOfCandles]:
+            self.calls += 1
+            return [[index, 1, 1, 1, 1, 1] for index in range(count)]
+
+    exchange = CountingExchangeInterface()
+    cache = CandleCache("test", exchange, maxEntries=2)
+    for symbol in ["ETH/BTC", "ETH/USDT", "ETH/BTC", "ETH/BTC", "SOL/USDT", "ETH/USDT"]:
+        cache.get_last_candles(symbol, 168, "1h")
+    print(f'Peticiones al exchange: {exchange.calls}   {cache.report()}')
+    print(f'Entradas invalidadas: {cache.invalidate(["SOL/USDT"])}')
@@ -0,0 +1,228 @@
+
+import math
+import logging
+from typing import Callable, Dict, List, Optional
+from basics import *
+from market_metrics import MarketMetrics
+from candle_series import Candles
+from validations import Validations
+
+TimeFrameStatistics = Callable[[MarketId, Candles, str], Optional[Dict]]
+
+PIPELINE_STAGES = ["changes", "completion", "colapses", "timeframes", "metrics"]
+MIN_CANDLES = 5         # Con menos velas, MarketMetrics no puede calcular la desviacion de tendencia.
+
+
+class CandleFilterPipeline(Basics):
+    '''
+    Aplica los filtros de velas de Validations.is_potential_market por etapas, de la mas barata a la
+    mas costosa, y descarta el mercado en la primera etapa que no cumple.\n
+    Cada etapa calcula solo el dato que necesita:
+    - changes: Variaciones del rango completo y de sus dos mitades. Usa solo tres velas, O(1).
+               Descarta tambien las series muy cortas y las que tienen precio cero en esas tres velas.
+    - completion: Porciento de completitud del rango de velas. Compara timestamps, O(T).
+    - colapses: Porciento de velas colapsadas. Busca el minimo y maximo de cada vela, O(T).
+    - timeframes: Confirmacion de las temporalidades mayores. Agrupa las velas y calcula sus estadisticas.
+    - metrics: Metricas completas del mercado (desviacion de tendencia incluida). Lo registra quien las calcula.\n
+    Los valores de cada etapa se calculan igual que en MarketMetrics, por lo que un mercado pasa todas
+    las etapas si y solo si pasa Validations.is_potential_market.
+    '''
+
+    def __init__(
+            self,
+            botId:str,
+            filters:Optional[Dict]=None,
+            timeframeStatistics:Optional[TimeFrameStatistics]=None,
+            onlyPresent:bool=False
+        ):
+        '''
+        param botId: Identificador del bot. Se usa para obtener el log.
+        param filters: Objeto "filters" de la configuracion del algoritmo.
+        param timeframeStatistics: Funcion (symbol, candles1h, timeFrame) que devuelve las estadisticas de una
+                                   temporalidad mayor. Por defecto se usa MarketMetrics.timeframe_statistics.
+                                   Permite tomar las estadisticas del cache de metricas.
+        param onlyPresent: True para comprobar solo los filtros de velas presentes en "filters", igual que en
+                           los filtros de temporalidades. Con False, un filtro ausente descarta el mercado,
+                           igual que en Validations.is_potential_market.
+        '''
+        self.log = logging.getLogger(botId)
+        self.onlyPresent = onlyPresent
+        self.filters:Dict = filters if filters is not None else {}
+        self.timeframeStatistics = timeframeStatistics
+        self.counts:Dict[str, List[int]] = {}
+        self.failedStage:Optional[str] = None       # Etapa en la que se descarto el ultimo mercado filtrado.
+        self.reset()
+
+
+    def reset(self):
+        '''
+        Pone a cero los contadores de mercados aprobados y descartados de cada etapa.
+        '''
+        self.counts = {stage: [0, 0] for stage in PIPELINE_STAGES}
+
+
+    def count(self, stage:str, passed:bool) -> bool:
+        '''
+        Registra el resultado de una etapa para un mercado.
+        param stage: Nombre de la etapa. Uno de PIPELINE_STAGES.
+        param passed: True si el mercado paso la etapa.
+        return: Devuelve el mismo valor de "passed".
+        '''
+        self.counts[stage][0 if passed else 1] += 1
+        if not passed:
+            self.failedStage = stage
+        return passed
+
+
+    def run(self, symbol:MarketId, candles:Candles) -> bool:
+        '''
+        Aplica las etapas de filtrado a las velas del mercado hasta que una no se cumple.\n
+        La etapa "metrics" no se aplica aqui. Quien calcula las metricas completas la registra con "count".
+        param symbol: Identificador del mercado.
+        param candles: Velas 1h del mercado, las mismas que se usan para calcular las metricas.
+        return: True si el mercado pasa todas las etapas. False si se descarta en alguna. La etapa queda en "failedStage".
+        '''
+        candlesFilters = self.filters.get("candles", {})
+        self.failedStage = None
+        try:
+            if not self.count("changes", self.changes_passed(candles, candlesFilters, self.onlyPresent)):
+                return False
+            if not self.count("completion", self.completion_passed(candles, candlesFilters, self.onlyPresent)):
+                return False
+            if not self.count("colapses", self.colapses_passed(candles, candlesFilters, self.onlyPresent)):
+                return False
+            return self.count("timeframes", self.timeframes_passed(symbol, candles))
+        except Exception as e:
+            self.log.warning(self.cmd(f'Error: Filtrando las velas del mercado {symbol}. Exception: {str(e)}'))
+            self.failedStage = "error"
+            return False
+
+
+    def report(self) -> str:
+        '''
+        return: Cadena con los mercados aprobados y descartados en cada etapa desde la ultima llamada.
+        '''
+        stages = ", ".join(f'{stage} {passed}/{passed + failed}' for stage, (passed, failed) in self.counts.items())
+        self.reset()
+        return f'Filtros de velas (aprobados/evaluados): {stages}.'
+
+
+    ####################################################################################################
+    # ETAPAS DEL FILTRADO
+    ####################################################################################################
+
+    @staticmethod
+    def _check(value:float, condition:ComparisonCondition, filters:Dict, filterName:str, onlyPresent:bool) -> bool:
+        if onlyPresent and filterName not in filters:
+            return True
+        return Validations.check(value, condition, filters.get(filterName, None))
+
+
+    @staticmethod
+    def changes_passed(candles:Candles, filters:Dict, onlyPresent:bool=False) -> bool:
+        '''
+        Comprueba las variaciones del precio en el rango completo de velas y en sus dos mitades.
+        Solo usa la primera vela, la del medio y la ultima.
+        param candles: Velas 1h del mercado.
+        param filters: Filtros de velas de la configuracion.
+        param onlyPresent: True para comprobar solo los filtros presentes.
+        return: True si las variaciones cumplen los filtros "minProfitWhole", "minProfitHalf1" y "minProfitHalf2".
+                False si hay menos de MIN_CANDLES velas o si alguno de los tres precios es cero o no existe,
+                porque las metricas del mercado no se pueden calcular.
+        '''
+        if len(candles) < MIN_CANDLES:
+            return False
+        first = CandleFilterPipeline._candle_price(candles[0])
+        middle = CandleFilterPipeline._candle_price(candles[round(float(len(candles)-1) * 0.5)])
+        last = CandleFilterPipeline._candle_price(candles[-1])
+        if first is None or middle is None or last is None:
+            return False
+        if not CandleFilterPipeline._check(MarketMetrics.delta(first, last), "above", filters, "minProfitWhole", onlyPresent):
+            return False
+        if not CandleFilterPipeline._check(MarketMetrics.delta(first, middle), "above", filters, "minProfitHalf1", onlyPresent):
+            return False
+        return CandleFilterPipeline._check(MarketMetrics.delta(middle, last), "above", filters, "minProfitHalf2", onlyPresent)
+
+
+    @staticmethod
+    def _candle_price(candle:Candle) -> Optional[float]:
+        '''
+        param candle: Vela OHLCV obtenida del exchange, mediante la librería ccxt.
+        return: Precio medio estimado de la vela. None si falta algun precio o si el precio es cero.
+        '''
+        if any(value is None for value in candle[1:5]):
+            return None
+        price = float(MarketMetrics._candle_estimated_average(candle))
+        return None if price == 0 or math.isnan(price) else price
+
+
+    @staticmethod
+    def completion_passed(candles:Candles, filters:Dict, onlyPresent:bool=False) -> bool:
+        '''
+        param candles: Velas 1h del mercado.
+        param filters: Filtros de velas de la configuracion.
+        param onlyPresent: True para comprobar solo los filtros presentes.
+        return: True si el porciento de completitud del rango de velas cumple el filtro "minCompletion".
+        '''
+        completion = MarketMetrics._candles_1h_completion(candles, len(candles))
+        return CandleFilterPipeline._check(completion, "above", filters, "minCompletion", onlyPresent)
+
+
+    @staticmethod
+    def colapses_passed(candles:Candles, filters:Dict, onlyPresent:bool=False) -> bool:
+        '''
+        param candles: Velas 1h del mercado.
+        param filters: Filtros de velas de la configuracion.
+        param onlyPresent: True para comprobar solo los filtros presentes.
+        return: True si el porciento de velas colapsadas cumple el filtro "maxColapses".
+        '''
+        colapses = MarketMetrics._candles_colapses(candles)
+        return CandleFilterPipeline._check(colapses, "below", filters, "maxColapses", onlyPresent)
+
+
+    def timeframes_passed(self, symbol:MarketId, candles:Candles) -> bool:
+        '''
+        param symbol: Identificador del mercado.
+        param candles: Velas 1h del mercado.
+        return: True si todas las temporalidades configuradas en "filters.timeframes" confirman la tendencia.
+        '''
+        for timeFrame, timeFrameFilters in self.filters.get("timeframes", {}).items():
+            if self.timeframeStatistics is not None:
+                statistics = self.timeframeStatistics(symbol, candles, timeFrame)
+            else:
+                statistics = MarketMetrics.timeframe_statistics(candles, timeFrame)
+            if not Validations.is_confirmed_timeframe(statistics, timeFrameFilters):
+                return False
+        return True
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+    import io
+    import random
+    import contextlib
+    from configuration import DEFAULT_CONFIGURATION
+    from metrics_engines import PARITY_CASES, random_candles
+    generator = random.Random(0)
+    filters = dict(DEFAULT_CONFIGURATION["filters"], timeframes={"4h": {"minProfitWhole": 0.0}, "1d": {"minProfitWhole": 0.0}})
+    pipeline = CandleFilterPipeline("test", filters)
+    mismatches = 0
+    errors = 0
+    for case in PARITY_CASES:
+        for index in range(100):
+            candles = random_candles(generator, case, 168)
+            if case == "zeroPrice" and index % 2 == 0:      # Precio cero en la primera vela, que es un divisor.
+                candles[0][1:5] = [0.0, 0.0, 0.0, 0.0]
+            with contextlib.redirect_stdout(io.StringIO()):     # Mensajes de MarketMetrics con las series invalidas.
+                passed = pipeline.run("TEST/USDT", candles)
+                errors += 1 if pipeline.failedStage == "error" else 0
+                try:
+                    metrics = MarketMetrics.calculate({"symbol": "TEST/USDT", "last": 1, "percentage": 1, "bid": 1, "ask": 1, "low": 1, "high": 2}, candles, [], list(filters["timeframes"].keys()))
+                    expected = Validations.is_potential_market({"baseId": "TEST", "metrics": metrics}, dict(DEFAULT_CONFIGURATION, filters=filters))
+                except Exception:      # Las metricas no se pueden calcular y el mercado se descarta.
+                    expected = False
+            mismatches += 1 if passed != expected else 0
+    print(pipeline.report())
+    print(f'Mercados descartados por error: {errors}')
+    print(f'Diferencias con Validations.is_potential_market: {mismatches}')
@@ -0,0 +1,144 @@
+
+from typing import Dict, List, Optional
+from basics import *
+from exchange_interface import CANDLE_TIMESTAMP, CANDLE_OPEN, CANDLE_HIGT, CANDLE_LOW, CANDLE_CLOSE, CANDLE_VOLUME
+
+MILLISECONDS_PER_UNIT = {
+    "m": 60 * 1000,
+    "h": 60 * 60 * 1000,
+    "d": 24 * 60 * 60 * 1000
+}
+
+
+class CandleResampling(Basics):
+    '''
+    Obtiene velas de temporalidades mayores (2h, 4h, 1d...) a partir de las velas 1h ya descargadas,
+    sin hacer mas peticiones al exchange.\n
+    Las velas se agrupan en intervalos alineados a la hora UTC, igual que las velas del exchange.
+    De cada grupo se toma el open de la primera vela, el maximo de los high, el minimo de los low,
+    el close de la ultima vela y la suma de los volumenes.
+    '''
+
+    @staticmethod
+    def timeframe_milliseconds(timeFrame:str) -> int:
+        '''
+        Devuelve la duracion en milisegundos de una temporalidad.
+        param timeFrame: Temporalidad con el formato de CCXT. Ej: "1h", "4h", "1d".
+        return: Duracion en milisegundos de cada vela de la temporalidad.
+        '''
+        unit = timeFrame[-1:]
+        if unit not in MILLISECONDS_PER_UNIT or not timeFrame[:-1].isdigit() or int(timeFrame[:-1]) <= 0:
+            raise ValueError(f'Temporalidad no soportada: "{timeFrame}"')
+        return int(timeFrame[:-1]) * MILLISECONDS_PER_UNIT[unit]
+
+
+    @staticmethod
+    def resample(
+            candles:ListOfCandles,
+            timeFrame:str,
+            fillGaps:bool=False,
+            dropPartialFirst:bool=True
+        ) -> ListOfCandles:
+        '''
+        Agrupa las velas en velas de una temporalidad mayor.\n
+        Las velas que faltan dentro de un intervalo no impiden crear la vela del intervalo, igual que
+        en el exchange, donde una hora sin operaciones no tiene vela. Los intervalos sin ninguna vela
+        se omiten, salvo que se pida rellenarlos con velas planas al precio del cierre anterior y
+        volumen cero, que cuentan como velas colapsadas en las metricas.\n
+        param candles: Lista o CandleSeries de velas ordenadas de la mas antigua a la mas reciente.
+        param timeFrame: Temporalidad de las velas resultantes. Ej: "4h", "1d".
+        param fillGaps: True para rellenar los intervalos sin velas con velas planas.
+        param dropPartialFirst: True para descartar el primer intervalo si le falta la primera vela 1h,
+                                porque el rango pedido al exchange no suele empezar alineado al intervalo.
+                                El ultimo intervalo se mantiene aunque este incompleto, porque es la vela en curso.
+        return: Lista de velas de la temporalidad pedida, de la mas antigua a la mas reciente.
+        '''
+        resampler = CandleResampler(timeFrame, fillGaps, dropPartialFirst)
+        resampler.push(candles)
+        return resampler.candles
+
+
+    @staticmethod
+    def completion(candles:ListOfCandles, timeFrame:str) -> float:
+        '''
+        Devuelve el porciento de intervalos con vela entre el primer y el ultimo intervalo de la lista.
+        Es el equivalente de MarketMetrics._candles_1h_completion para velas de otras temporalidades.
+        param candles: Lista de velas devuelta por CandleResampling.resample.
+        param timeFrame: Temporalidad de las velas.
+        return: Porciento de completitud de los intervalos. Si no hay velas, devuelve cero.
+        '''
+        if len(candles) == 0:
+            return float(0)
+        period = CandleResampling.timeframe_milliseconds(timeFrame)
+        expected = (candles[-1][CANDLE_TIMESTAMP] - candles[0][CANDLE_TIMESTAMP]) // period + 1
+        return float(len(candles) / expected * 100)
+
+
+
+class CandleResampler(Basics):
+    '''
+    Version incremental de CandleResampling.resample. Recibe las velas 1h por partes (chunks), en orden,
+    y mantiene las velas de la temporalidad mayor. La ultima vela queda abierta hasta que llega una vela
+    de otro intervalo, por lo que el resultado es el mismo que agrupar todas las velas juntas.
+    '''
+
+    def __init__(self, timeFrame:str, fillGaps:bool=False, dropPartialFirst:bool=True):
+        '''
+        param timeFrame: Temporalidad de las velas resultantes. Ej: "4h", "1d".
+        param fillGaps: True para rellenar los intervalos sin velas con velas planas.
+        param dropPartialFirst: True para descartar el primer intervalo si le falta la primera vela 1h.
+        '''
+        self.timeFrame = timeFrame
+        self.period = CandleResampling.timeframe_milliseconds(timeFrame)
+        self.fillGaps = fillGaps
+        self.dropPartialFirst = dropPartialFirst
+        self.candles: ListOfCandles = []
+
+
+    def push(self, candles:ListOfCandles):
+        '''
+        Agrega velas a la agrupacion.
+        param candles: Lista o CandleSeries de velas posteriores a las ya agregadas, de la mas antigua a la mas reciente.
+        '''
+        period = self.period
+        result = self.candles
+        for candle in candles:
+            timestamp = int(candle[CANDLE_TIMESTAMP])
+            bucket = timestamp - timestamp % period
+            volume = candle[CANDLE_VOLUME]
+            volume = float(volume) if volume is not None and volume == volume else 0.0
+            if len(result) > 0 and result[-1][CANDLE_TIMESTAMP] == bucket:
+                current = result[-1]
+                current[CANDLE_HIGT] = max(current[CANDLE_HIGT], candle[CANDLE_HIGT])
+                current[CANDLE_LOW] = min(current[CANDLE_LOW], candle[CANDLE_LOW])
+                current[CANDLE_CLOSE] = candle[CANDLE_CLOSE]
+                current[CANDLE_VOLUME] += volume
+                continue
+            if len(result) == 0 and self.dropPartialFirst and timestamp - bucket >= MILLISECONDS_PER_UNIT["h"]:
+                continue
+            if self.fillGaps and len(result) > 0:
+                previousClose = result[-1][CANDLE_CLOSE]
+                for gap in range(result[-1][CANDLE_TIMESTAMP] + period, bucket, period):
+                    result.append([gap, previousClose, previousClose, previousClose, previousClose, 0.0])
+            result.append([
+                bucket,
+                candle[CANDLE_OPEN],
+                candle[CANDLE_HIGT],
+                candle[CANDLE_LOW],
+                candle[CANDLE_CLOSE],
+                volume
+            ])
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+    hour = MILLISECONDS_PER_UNIT["h"]
+    candles = [[index * hour, 1.0 + index, 2.0 + index, 0.5 + index, 1.5 + index, 10.0] for index in range(2, 30) if index not in (9, 10, 11, 12)]
+    for candle in CandleResampling.resample(candles, "4h", fillGaps=True):
+        print(candle)
+    print(CandleResampling.completion(CandleResampling.resample(candles, "4h"), "4h"))
+    resampler = CandleResampler("4h", fillGaps=True)
+    for index in range(0, len(candles), 5):
+        resampler.push(candles[index:index + 5])
+    assert resampler.candles == CandleResampling.resample(candles, "4h", fillGaps=True)
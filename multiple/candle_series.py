@@ -0,0 +1,145 @@
+
+from array import array
+from typing import Iterator, List, Optional, Union
+from basics import *
+from exchange_interface import CANDLE_TIMESTAMP, CANDLE_OPEN, CANDLE_HIGT, CANDLE_LOW, CANDLE_CLOSE, CANDLE_VOLUME
+
+CANDLE_COLUMNS_COUNT = 6
+
+
+class CandleSeries(Basics):
+    '''
+    Contenedor compacto de velas OHLCV respaldado por arrays tipados contiguos, uno por columna.\n
+    Se comporta como una lista de velas de la libreria CCXT: len(), indice e iteracion devuelven
+    velas [timestamp, open, high, low, close, volume], por lo que se puede pasar a MarketMetrics,
+    Validations y Report.create_graph en lugar de una lista de listas.\n
+    Los cortes con paso 1, como candles1h[0:candlesHours], no copian datos: devuelven otra
+    CandleSeries que comparte los arrays con la original.
+    '''
+
+    def __init__(self, columns:List[array], start:int=0, stop:Optional[int]=None):
+        '''
+        param columns: Lista de 6 arrays: timestamps ('q') y open, high, low, close, volume ('d').
+        param start: Posicion de la primera vela de la serie dentro de los arrays.
+        param stop: Posicion siguiente a la ultima vela de la serie. None para llegar al final de los arrays.
+        '''
+        if len(columns) != CANDLE_COLUMNS_COUNT:
+            raise ValueError(f'Una serie de velas necesita {CANDLE_COLUMNS_COUNT} columnas. Columnas: {len(columns)}')
+        self.columns = columns
+        self.start = start
+        self.stop = len(columns[CANDLE_TIMESTAMP]) if stop is None else stop
+
+
+    @staticmethod
+    def from_list(candles:Optional[ListOfCandles]) -> Optional['CandleSeries']:
+        '''
+        Crea una serie de velas a partir de la lista de velas obtenida mediante la libreria CCXT.
+        param candles: Lista de velas OHLCV. Los valores ausentes (None) se guardan como NaN.
+        return: Serie de velas. Si "candles" es None, devuelve None.
+        '''
+        if candles is None:
+            return None
+        if isinstance(candles, CandleSeries):
+            return candles
+        columns = [array('q')] + [array('d') for index in range(1, CANDLE_COLUMNS_COUNT)]
+        nan = float('nan')
+        for candle in candles:
+            columns[CANDLE_TIMESTAMP].append(int(candle[CANDLE_TIMESTAMP]))
+            for index in range(1, CANDLE_COLUMNS_COUNT):
+                value = candle[index] if index < len(candle) else None
+                columns[index].append(float(value) if value is not None else nan)
+        return CandleSeries(columns)
+
+
+    def to_list(self) -> ListOfCandles:
+        '''
+        return: Devuelve las velas como una lista de listas, igual que la libreria CCXT.
+        '''
+        return [candle for candle in self]
+
+
+    def column(self, index:int) -> memoryview:
+        '''
+        Devuelve una vista de solo lectura de una columna de la serie, sin copiar los datos.
+        param index: Indice de la columna. Ej: CANDLE_CLOSE.
+        return: memoryview con los valores de la columna para las velas de la serie.
+        '''
+        return memoryview(self.columns[index]).toreadonly()[self.start:self.stop]
+
+
+    @property
+    def timestamps(self) -> memoryview:
+        return self.column(CANDLE_TIMESTAMP)
+
+    @property
+    def opens(self) -> memoryview:
+        return self.column(CANDLE_OPEN)
+
+    @property
+    def highs(self) -> memoryview:
+        return self.column(CANDLE_HIGT)
+
+    @property
+    def lows(self) -> memoryview:
+        return self.column(CANDLE_LOW)
+
+    @property
+    def closes(self) -> memoryview:
+        return self.column(CANDLE_CLOSE)
+
+    @property
+    def volumes(self) -> memoryview:
+        return self.column(CANDLE_VOLUME)
+
+
+    def nbytes(self) -> int:
+        '''
+        return: Cantidad de bytes de datos que ocupan las velas de la serie.
+        '''
+        return (self.stop - self.start) * sum(column.itemsize for column in self.columns)
+
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+
+    def __getitem__(self, key:Union[int, slice]):
+        if isinstance(key, slice):
+            begin, end, step = key.indices(len(self))
+            if step == 1:
+                return CandleSeries(self.columns, self.start + begin, self.start + max(begin, end))
+            stop = self.start + end if self.start + end >= 0 else None     # Con paso negativo, end = -1 indica que llega a la primera vela.
+            return CandleSeries([column[self.start + begin:stop:step] for column in self.columns])
+        index = key + len(self) if key < 0 else key
+        if index < 0 or index >= len(self):
+            raise IndexError('Indice de vela fuera de rango.')
+        position = self.start + index
+        return [column[position] for column in self.columns]
+
+
+    def __iter__(self) -> Iterator[Candle]:
+        columns = [memoryview(column)[self.start:self.stop] for column in self.columns]
+        for candle in zip(*columns):
+            yield list(candle)
+
+
+    def __repr__(self) -> str:
+        return f'CandleSeries(count={len(self)})'
+
+
+
+Candles = Union[ListOfCandles, CandleSeries]
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+    import sys
+    candles = [[hour * 3600000, 1.0, 1.2, 0.9, 1.1, 100.0] for hour in range(168)]
+    series = CandleSeries.from_list(candles)
+    assert series is not None
+    last24 = series[-24:]
+    assert last24.columns is series.columns and last24.to_list() == candles[-24:]
+    assert series[5] == candles[5] and series[-1] == candles[-1]
+    listBytes = sys.getsizeof(candles) + sum(sys.getsizeof(c) + sum(sys.getsizeof(v) for v in c) for c in candles)
+    print(f'Lista de listas: {listBytes} bytes   CandleSeries: {series.nbytes()} bytes')
@@ -18,16 +18,89 @@ DIRECTORY_GRAPHICS = "./graphics/"
 
 DEFAULT_CONFIGURATION = {
     "debugMode": False,
+    "console": {
+        "headless": False,
+        "background": True,
+        "backgroundLog": True
+    },
     "forceCloseInvestmentAndExit": False,
     "currencyQuote": "USDT",
     "amountToInvestAsQuote": 20,
+    "amountIsPercentOfBalance": False,
     "blackList": ["DEMONIO", "KILLER"],
     "preselected": ["BTC", "ETH"],
     "maxCurrenciesToInvest": 20,
     "createWebReport": True,
     "showWebReport": True,
+    "backgroundReport": {
+        "enable": True
+    },
     "maxTickersToSelect": 50,
     "candlesDays": 7,
+    "metricsEngine": "python",
+    "metricsCache": {
+        "enable": True,
+        "maxEntries": 2000,
+        "persist": False
+    },
+    "rollingMetrics": {
+        "enable": False
+    },
+    "twoPhaseFetch": {
+        "enable": False,
+        "probeHours": 24,
+        "filters": {
+            "maxColapses": 30,
+            "minCompletion": 85,
+            "minProfitWhole": 0.0
+        }
+    },
+    "streamingCandles": {
+        "enable": False,
+        "chunkSize": 500,
+        "reportCandles": 168
+    },
+    "parallelMetrics": {
+        "enable": False,
+        "workers": 0,
+        "batchSize": 50
+    },
+    "batchMetrics": {
+        "enable": False
+    },
+    "earlyTermination": {
+        "enable": False,
+        "extraCandidates": 0,
+        "maxChangeWhole": 100
+    },
+    "diversification": {
+        "enable": False,
+        "maxCorrelation": 0.8
+    },
+    "crossQuoteScan": {
+        "enable": False,
+        "quotes": ["BTC", "ETH"]
+    },
+    "candleCache": {
+        "enable": True,
+        "maxAgeSeconds": 300,
+        "maxEntries": 1000
+    },
+    "scanCheckpoint": {
+        "enable": False,
+        "maxAgeSeconds": 600
+    },
+    "multiBot": {
+        "tickersMaxAgeSeconds": 30
+    },
+    "daemon": {
+        "enable": False,
+        "scanIntervalSeconds": 3600,
+        "scanDelaySeconds": 30,
+        "scanOnStart": True,
+        "monitorIntervalSeconds": 60,
+        "universeIntervalSeconds": 21600
+    },
     "modeActive": {
         "enable": False,
         "profitPercent": 3,
@@ -47,7 +120,9 @@ DEFAULT_CONFIGURATION = {
             "minProfitWhole": 1.0,
             "minProfitHalf1": 0.0,
             "minProfitHalf2": 0.0
-        }
+        },
+        "timeframes": {},
+        "timeframesNote": "Filtros de temporalidades mayores, calculadas desde las velas 1h. Admiten las mismas claves que \"candles\". Ej: {\"4h\": {\"minProfitWhole\": 0.0}, \"1d\": {\"minProfitWhole\": 0.0}}"
     }
 }
 
@@ -81,10 +156,18 @@ class Configuration(Basics):
                 self.log.error(self.cmd('Debe revisar o editar el fichero de configuracion antes de volver a ejecutar el bot.'))
                 return False
             self.log.info(f"La configuracion actual es: {str(self.data)}")
-            Basics.show_object(self.data, "\nLa configuracion actual es:") 
             return True
         except Exception as e:
             self.log.exception(self.cmd(f'Error: No se pudo establecer la configuracion del bot. Exception: {str(e)}'))
             return False
 
 
+    def show(self):
+        '''
+        Muestra en la consola la configuracion cargada.\n
+        Se debe llamar despues de aplicar la seccion "console" de la configuracion, para que en los
+        modos "headless" y "background" no se hagan las pausas de lectura de cada clave.
+        '''
+        Basics.show_object(self.data, "\nLa configuracion actual es:")
+
+
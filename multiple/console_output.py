@@ -0,0 +1,154 @@
+
+import sys
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Optional
+
+
+class ConsoleOutput():
+    '''
+    Salida de los mensajes de consola del bot.\n
+    Los mensajes y las pausas para que una persona pueda leer la consola (por ejemplo, al mostrar la
+    configuracion o los tickers seleccionados) pasan por esta clase, que tiene tres modos:\n
+    - Directo (por defecto): se imprime y se espera en el mismo hilo, como un print y un time.sleep.
+    - En segundo plano ("background"): los mensajes y las pausas se agregan a una cola que consume
+      un hilo aparte, por lo que la ejecucion del bot no espera por la consola.
+    - Sin consola ("headless"): no se imprime nada ni se hacen pausas. Para ejecuciones en produccion
+      donde solo interesa el fichero log.\n
+    Los metodos son de clase porque la salida de consola es unica para todo el proceso.
+    '''
+
+    headless = False
+    background = False
+    messages: queue.Queue = queue.Queue()
+    worker: Optional[threading.Thread] = None
+    listeners: List[QueueListener] = []
+    registered = False
+
+
+    @classmethod
+    def configure(cls, headless:bool=False, background:bool=False):
+        '''
+        Cambia el modo de la salida de consola. Los mensajes pendientes se imprimen antes del cambio.
+        param headless: True para no imprimir nada ni hacer pausas.
+        param background: True para imprimir y hacer las pausas en un hilo aparte.
+        '''
+        cls.flush()
+        cls.headless = headless
+        cls.background = background and not headless
+        if cls.background and (cls.worker is None or not cls.worker.is_alive()):
+            cls.worker = threading.Thread(target=cls._work, name="console", daemon=True)
+            cls.worker.start()
+            cls._register()
+
+
+    @classmethod
+    def _work(cls):
+        while True:
+            item = cls.messages.get()
+            try:
+                if isinstance(item, str):
+                    print(item)
+                elif item is not None:
+                    time.sleep(item)
+            except:
+                pass
+            finally:
+                cls.messages.task_done()
+
+
+    @classmethod
+    def write(cls, text:str):
+        '''
+        Imprime una linea de texto en la consola, segun el modo.
+        param text: Texto que se debe imprimir.
+        '''
+        if cls.headless:
+            return
+        if cls.background:
+            cls.messages.put(text)
+        else:
+            print(text)
+
+
+    @classmethod
+    def pause(cls, seconds:float):
+        '''
+        Pausa para que una persona pueda leer la consola. No detiene el bot en los modos
+        "background" y "headless". No se debe usar para esperar por el exchange.
+        param seconds: Segundos de pausa.
+        '''
+        if cls.headless:
+            return
+        if cls.background:
+            cls.messages.put(float(seconds))
+        else:
+            time.sleep(seconds)
+
+
+    @classmethod
+    def flush(cls):
+        '''
+        Espera a que se impriman los mensajes pendientes.
+        '''
+        if cls.worker is not None and cls.worker.is_alive():
+            cls.messages.join()
+            sys.stdout.flush()
+
+
+    @classmethod
+    def background_logging(cls, log:logging.Logger):
+        '''
+        Pasa a un hilo aparte la escritura de los handlers del log (ficheros), mediante una cola.
+        El log sigue aceptando los mensajes al momento y los handlers originales los escriben despues.
+        param log: Log cuyos handlers se deben ejecutar en segundo plano.
+        '''
+        handlers = [handler for handler in log.handlers if not isinstance(handler, QueueHandler)]
+        if len(handlers) == 0:
+            return
+        records: queue.Queue = queue.Queue()
+        listener = QueueListener(records, *handlers, respect_handler_level=True)
+        for handler in handlers:
+            log.removeHandler(handler)
+        log.addHandler(QueueHandler(records))
+        listener.start()
+        cls.listeners.append(listener)
+        cls._register()
+
+
+    @classmethod
+    def _register(cls):
+        if not cls.registered:
+            atexit.register(cls.close)
+            cls.registered = True
+
+
+    @classmethod
+    def close(cls):
+        '''
+        Imprime los mensajes pendientes y escribe en los ficheros los mensajes pendientes del log.
+        '''
+        cls.flush()
+        while len(cls.listeners) > 0:
+            cls.listeners.pop().stop()
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+    begin = time.perf_counter()
+    ConsoleOutput.configure(background=True)
+    for index in range(5):
+        ConsoleOutput.write(f'Mensaje {index}')
+        ConsoleOutput.pause(0.1)
+    queued = time.perf_counter() - begin
+    ConsoleOutput.flush()
+    print(f'Mensajes agregados en {round(queued * 1000, 1)} ms   Impresos en {round((time.perf_counter() - begin) * 1000, 1)} ms')
+    ConsoleOutput.configure(headless=True)
+    ConsoleOutput.write('Este mensaje no se imprime')
+    ConsoleOutput.pause(10)
+    print(f'Modo headless: {round((time.perf_counter() - begin) * 1000, 1)} ms')
@@ -0,0 +1,165 @@
+
+import time
+import logging
+from typing import Callable, Dict, List, Optional
+from basics import *
+
+ScheduledTask = Dict
+
+
+class DaemonScheduler(Basics):
+    '''
+    Planificador de tareas periodicas para ejecutar el bot como un proceso de larga duracion (daemon).\n
+    Cada tarea tiene su propio intervalo en segundos. Las tareas alineadas se ejecutan en los multiplos
+    exactos de su intervalo (hora UTC) mas un retraso, por ejemplo unos segundos despues del cierre de cada
+    vela de 1h. Las tareas no alineadas se ejecutan cada "interval" segundos desde la ejecucion anterior.\n
+    Las tareas se ejecutan en el mismo hilo, una tras otra. Si una tarea tarda mas que su intervalo, las
+    ejecuciones perdidas no se acumulan: se programa la siguiente a partir del momento actual. Un error en
+    una tarea se registra en el log y no detiene el planificador.
+    '''
+
+    def __init__(
+            self,
+            botId:str,
+            clock:Callable[[], float]=time.time,
+            sleep:Callable[[float], None]=time.sleep
+        ):
+        '''
+        param botId: Identificador del bot. Se usa para obtener el log.
+        param clock: Funcion que devuelve la hora actual en segundos (timestamp UTC).
+        param sleep: Funcion que espera la cantidad de segundos especificada.
+        '''
+        self.log = logging.getLogger(botId)
+        self.clock = clock
+        self.sleep = sleep
+        self.tasks: List[ScheduledTask] = []
+        self.stopped = False
+
+
+    def add(
+            self,
+            name:str,
+            interval:float,
+            action:Callable[[], object],
+            aligned:bool=False,
+            delay:float=0,
+            runNow:bool=False
+        ) -> ScheduledTask:
+        '''
+        Agrega una tarea periodica.
+        param name: Nombre de la tarea. Se usa en los mensajes del log.
+        param interval: Intervalo en segundos entre ejecuciones. Debe ser mayor que cero.
+        param action: Funcion sin parametros que ejecuta la tarea.
+        param aligned: True para ejecutar la tarea en los multiplos exactos del intervalo, mas "delay".
+        param delay: Segundos de retraso despues de cada multiplo del intervalo. Solo en tareas alineadas.
+        param runNow: True para ejecutar la tarea en la primera vuelta del planificador.
+        return: Objeto con los datos de la tarea.
+        '''
+        task = {
+            "name": name,
+            "interval": max(1.0, float(interval)),
+            "action": action,
+            "aligned": aligned,
+            "delay": float(delay) if aligned else 0.0,
+            "next": 0.0,
+            "runs": 0,
+            "errors": 0
+        }
+        task["next"] = self.clock() if runNow else self.next_time(task, self.clock())
+        self.tasks.append(task)
+        return task
+
+
+    @staticmethod
+    def next_time(task:ScheduledTask, now:float) -> float:
+        '''
+        Calcula el momento de la siguiente ejecucion de una tarea, posterior a "now".
+        param task: Objeto con los datos de la tarea.
+        param now: Hora actual en segundos.
+        return: Hora de la siguiente ejecucion en segundos.
+        '''
+        interval = task["interval"]
+        if not task["aligned"]:
+            return now + interval
+        start = (now - task["delay"]) // interval * interval + task["delay"]
+        return start + interval if start <= now else start
+
+
+    def run_pending(self) -> int:
+        '''
+        Ejecuta las tareas cuya hora ya llego, en el orden en que se agregaron, y las programa de nuevo.
+        return: Cantidad de tareas ejecutadas.
+        '''
+        count = 0
+        for task in self.tasks:
+            if self.stopped:
+                break
+            if self.clock() < task["next"]:
+                continue
+            count += 1
+            task["runs"] += 1
+            try:
+                task["action"]()
+            except Exception as e:
+                task["errors"] += 1
+                self.log.exception(self.cmd(f'Error: Ejecutando la tarea "{task["name"]}". Exception: {str(e)}'))
+            task["next"] = self.next_time(task, self.clock())
+        return count
+
+
+    def seconds_to_next(self) -> float:
+        '''
+        return: Segundos que faltan para la siguiente tarea. Cero si ya hay tareas pendientes.
+        '''
+        if len(self.tasks) == 0:
+            return 0.0
+        return max(0.0, min(task["next"] for task in self.tasks) - self.clock())
+
+
+    def run(self, maxSeconds:Optional[float]=None):
+        '''
+        Ejecuta las tareas hasta que se llame a "stop" o hasta que pasen "maxSeconds" segundos.
+        param maxSeconds: Tiempo maximo de ejecucion en segundos. None para ejecutar sin limite.
+        '''
+        if len(self.tasks) == 0:
+            return
+        end = None if maxSeconds is None else self.clock() + maxSeconds
+        self.stopped = False
+        while not self.stopped:
+            self.run_pending()
+            wait = self.seconds_to_next()
+            if end is not None:
+                if self.clock() + wait > end:
+                    break
+            if wait > 0 and not self.stopped:
+                self.sleep(wait)
+
+
+    def stop(self):
+        '''
+        Detiene el planificador al terminar la tarea en curso.
+        '''
+        self.stopped = True
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+
+    class SimulatedClock:
+        def __init__(self, now:float):
+            self.now = now
+        def time(self) -> float:
+            return self.now
+        def sleep(self, seconds:float):
+            self.now += seconds
+
+    clock = SimulatedClock(1700000000 + 1234.5)
+    scheduler = DaemonScheduler("test", clock.time, clock.sleep)
+    log = []
+    scheduler.add("escaneo", 3600, lambda: log.append(("escaneo", clock.now % 3600)), aligned=True, delay=30)
+    scheduler.add("inversiones", 300, lambda: log.append(("inversiones", clock.now)), runNow=True)
+    scheduler.add("mercados", 6 * 3600, lambda: log.append(("mercados", clock.now)))
+    scheduler.run(maxSeconds=12 * 3600)
+    print(f'Ejecuciones: { {task["name"]: task["runs"] for task in scheduler.tasks} }')
+    print(f'Segundos despues del cierre de la vela en cada escaneo: {sorted(set(value for name, value in log if name == "escaneo"))}')
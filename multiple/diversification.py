@@ -0,0 +1,161 @@
+
+import logging
+from typing import List, Optional
+from basics import *
+from exchange_interface import CANDLE_TIMESTAMP, CANDLE_CLOSE
+
+MILLISECONDS_PER_HOUR = 60 * 60 * 1000
+DEFAULT_MAX_CORRELATION = 0.8
+
+
+class DiversifiedSelection(Basics):
+    '''
+    Evita invertir a la vez en mercados que se mueven juntos.\n
+    Con las velas ya descargadas de los mercados candidatos se forma una matriz de rendimientos
+    horarios alineados por timestamp (un mercado por fila) y se calcula la matriz de correlacion
+    en una sola operacion vectorizada. Un candidato se acepta solo si su correlacion con todos los
+    mercados ya aceptados no supera el maximo configurado. Los candidatos se recorren en el orden
+    de la lista, que esta ordenada por potencial, por lo que la seleccion es voraz (greedy).
+    '''
+
+    def __init__(
+            self,
+            marketsData:ListOfMarketData,
+            hours:int,
+            maxCorrelation:float=DEFAULT_MAX_CORRELATION,
+            logName:Optional[str]=None
+        ):
+        '''
+        param marketsData: Lista de mercados candidatos devuelta por TrendTakerCore.get_ordered_and_filtered_markets.
+        param hours: Cantidad de horas hacia atras que se usan para calcular los rendimientos.
+        param maxCorrelation: Correlacion maxima permitida entre dos mercados aceptados. Entre -1 y 1.
+        param logName: Nombre del log.
+        '''
+        self.log = logging.getLogger(logName)
+        self.maxCorrelation = float(maxCorrelation)
+        self.symbols = [marketData["symbolId"] for marketData in marketsData]
+        self.accepted: List[int] = []
+        self.correlation = None
+        if not NUMPY_AVAILABLE:
+            self.log.warning(self.cmd('Atencion: La seleccion diversificada necesita la libreria numpy. No se aplica.'))
+            return
+        if len(marketsData) > 1:
+            returns = self.returns_matrix([marketData["candles1h"] for marketData in marketsData], hours)
+            self.correlation = self.correlation_matrix(returns)
+
+
+    @staticmethod
+    def returns_matrix(listOfCandles:List, hours:int):
+        '''
+        Devuelve la matriz de rendimientos de los mercados, alineados por timestamp.\n
+        Las columnas son los timestamps presentes en las velas de algun mercado dentro de las ultimas "hours"
+        horas. Si a un mercado le falta la vela de un timestamp, se toma el cierre anterior, por lo que su
+        rendimiento en ese intervalo es cero.
+        param listOfCandles: Velas de cada mercado (listas o CandleSeries).
+        param hours: Cantidad de horas hacia atras que se usan.
+        return: Array (N, M-1) con los rendimientos logaritmicos de los N mercados en los M timestamps.
+        '''
+        import numpy # type: ignore
+        timestamps = [numpy.asarray([candle[CANDLE_TIMESTAMP] for candle in candles], dtype=numpy.int64) for candles in listOfCandles]
+        closes = [numpy.asarray([candle[CANDLE_CLOSE] for candle in candles], dtype=numpy.float64) for candles in listOfCandles]
+        last = max(int(values[-1]) for values in timestamps if len(values) > 0)
+        grid = numpy.unique(numpy.concatenate(timestamps))
+        grid = grid[grid > last - hours * MILLISECONDS_PER_HOUR]
+        prices = numpy.full((len(listOfCandles), len(grid)), numpy.nan)
+        for row, (marketTimestamps, marketCloses) in enumerate(zip(timestamps, closes)):
+            positions = numpy.searchsorted(grid, marketTimestamps)
+            inside = (positions < len(grid)) & (grid[numpy.minimum(positions, len(grid) - 1)] == marketTimestamps)
+            prices[row, positions[inside]] = marketCloses[inside]
+        # Rellena los huecos con el cierre anterior y el inicio con el primer cierre disponible.
+        valid = numpy.isfinite(prices) & (prices > 0)
+        indexes = numpy.where(valid, numpy.arange(len(grid)), 0)
+        numpy.maximum.accumulate(indexes, axis=1, out=indexes)
+        filled = numpy.take_along_axis(prices, indexes, axis=1)
+        first = numpy.argmax(valid, axis=1)
+        firstPrice = prices[numpy.arange(len(listOfCandles)), first]
+        filled = numpy.where(numpy.arange(len(grid)) < first[:, None], firstPrice[:, None], filled)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            returns = numpy.diff(numpy.log(filled), axis=1)
+        return numpy.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+    @staticmethod
+    def correlation_matrix(returns):
+        '''
+        Devuelve la matriz de correlacion de los rendimientos.
+        Los mercados sin variacion (rendimientos constantes) tienen correlacion cero con los demas.
+        param returns: Matriz (N, M) de rendimientos devuelta por "returns_matrix".
+        return: Array (N, N) con las correlaciones de Pearson.
+        '''
+        import numpy # type: ignore
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            correlation = numpy.corrcoef(returns)
+        return numpy.nan_to_num(numpy.atleast_2d(correlation), nan=0.0)
+
+
+    def max_correlation_with_accepted(self, index:int) -> float:
+        '''
+        param index: Posicion del mercado en la lista de candidatos.
+        return: Mayor correlacion del mercado con los mercados aceptados. Si no hay aceptados, devuelve -1.
+        '''
+        if self.correlation is None or len(self.accepted) == 0:
+            return float(-1)
+        return float(self.correlation[index, self.accepted].max())
+
+
+    def is_diversified(self, index:int) -> bool:
+        '''
+        param index: Posicion del mercado en la lista de candidatos.
+        return: True si el mercado no esta demasiado correlacionado con los mercados aceptados.
+        '''
+        return self.max_correlation_with_accepted(index) <= self.maxCorrelation
+
+
+    def accept(self, index:int):
+        '''
+        Agrega el mercado a los mercados aceptados, con los que se comparan los siguientes candidatos.
+        param index: Posicion del mercado en la lista de candidatos.
+        '''
+        if index not in self.accepted:
+            self.accepted.append(index)
+
+
+    def select(self, maxCount:int, mandatory:Optional[List[int]]=None) -> List[int]:
+        '''
+        Selecciona de manera voraz los candidatos diversificados, en el orden de la lista.
+        param maxCount: Cantidad maxima de mercados que se deben seleccionar.
+        param mandatory: Posiciones de mercados que se aceptan siempre, por ejemplo los preseleccionados
+                         o los que ya tienen una inversion abierta.
+        return: Lista con las posiciones de los mercados aceptados.
+        '''
+        for index in mandatory or []:
+            self.accept(index)
+        for index in range(len(self.symbols)):
+            if len(self.accepted) >= maxCount:
+                break
+            if self.is_diversified(index):
+                self.accept(index)
+        return self.accepted
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+    import time
+    import random
+    generator = random.Random(1)
+    hours, count = 168, 300
+    market = [generator.gauss(0, 0.03) for hour in range(hours)]
+    marketsData = []
+    for index in range(count):
+        beta = generator.uniform(0, 1.5) if index % 2 == 0 else 0.0
+        price, candles = 1.0, []
+        for hour in range(hours):
+            price *= 1 + beta * market[hour] + generator.gauss(0, 0.01)
+            candles.append([hour * MILLISECONDS_PER_HOUR, price, price, price, price, 1.0])
+        marketsData.append({"symbolId": f'C{index}/USDT', "candles1h": candles})
+    begin = time.perf_counter()
+    selection = DiversifiedSelection(marketsData, hours, 0.5)
+    selected = selection.select(20)
+    print(f'Seleccionados: {[marketsData[index]["symbolId"] for index in selected]}')
+    print(f'Tiempo con {count} candidatos: {round((time.perf_counter() - begin) * 1000, 1)} ms')
@@ -0,0 +1,114 @@
+
+import heapq
+from typing import Dict, List, Tuple
+from basics import *
+from validations import Validations
+
+DEFAULT_MAX_CHANGE_WHOLE = 100
+
+
+class EarlyTermination(Basics):
+    '''
+    Permite terminar el escaneo de mercados antes de pedir las velas de todos los tickers.\n
+    Los tickers se procesan en el orden de seleccion (de mayor a menor variacion en 24h). El potencial de
+    un mercado es (variacion 24h / 100) * (variacion del rango de velas / 100), por lo que la variacion 24h
+    del ticker, que ya se conoce, y el rango posible de la variacion de las velas dan una cota superior
+    del potencial de cada mercado que todavia no se ha procesado. El rango de la variacion de las velas va
+    desde el filtro "minProfitWhole" hasta el valor "maxChangeWhole" de la configuracion, que es una
+    suposicion: si un mercado supera esa variacion, podria quedar fuera aunque su potencial fuese mayor.\n
+    Un mercado aprobado queda listo (su posicion en la lista final ordenada ya es segura) cuando su
+    potencial es mayor o igual que la cota de todos los tickers restantes. Los mercados listos se entregan
+    en el mismo orden que tendrian en la lista final. Cuando hay suficientes mercados listos, ningun ticker
+    restante puede superarlos y el escaneo se puede terminar.
+    '''
+
+    def __init__(self, tickers:ListOfTickers, configuration:Dict, target:int):
+        '''
+        param tickers: Tickers que se van a procesar, en el orden del escaneo.
+        param configuration: Objeto con la configuracion del algoritmo.
+        param target: Cantidad de mercados listos con la que se puede terminar el escaneo.
+        '''
+        self.target = max(1, int(target))
+        earlyTermination = configuration.get("earlyTermination", {})
+        high = float(earlyTermination.get("maxChangeWhole", DEFAULT_MAX_CHANGE_WHOLE))
+        low = configuration["filters"]["candles"].get("minProfitWhole", None)
+        low = float(low) if low is not None else -high
+        bounds = []
+        for ticker in tickers:
+            if Validations.is_preselected(self.base_of_symbol(ticker["symbol"]), configuration):
+                bounds.append(float('inf'))
+            else:
+                percentage = float(ticker.get("percentage") or 0)
+                bounds.append(max(percentage * low, percentage * high) / 10000)
+        # La cota de la posicion i es el mayor potencial posible de los tickers desde i hasta el final.
+        self.bounds = bounds + [float('-inf')]
+        for index in range(len(bounds) - 1, -1, -1):
+            self.bounds[index] = max(self.bounds[index], self.bounds[index + 1])
+        self.heap: List[Tuple[float, int, MarketData]] = []
+        self.sequence = 0
+        self.emitted = 0
+
+
+    def bound(self, position:int) -> float:
+        '''
+        param position: Posicion del siguiente ticker que se va a procesar.
+        return: Mayor potencial posible de los tickers que faltan por procesar.
+        '''
+        return self.bounds[min(max(position, 0), len(self.bounds) - 1)]
+
+
+    def add(self, market:MarketData):
+        '''
+        Agrega un mercado aprobado en el escaneo.
+        param market: Datos del mercado, devueltos por TrendTakerCore.create_market_data.
+        '''
+        heapq.heappush(self.heap, (-float(market["metrics"]["potential"]), self.sequence, market))
+        self.sequence += 1
+
+
+    def ready(self, position:int) -> ListOfMarketData:
+        '''
+        Devuelve los mercados aprobados que ya no pueden ser superados por los tickers restantes.
+        param position: Posicion del siguiente ticker que se va a procesar.
+        return: Lista de mercados, de mayor a menor potencial.
+        '''
+        bound = self.bound(position)
+        markets = []
+        while len(self.heap) > 0 and -self.heap[0][0] >= bound:
+            markets.append(heapq.heappop(self.heap)[2])
+        self.emitted += len(markets)
+        return markets
+
+
+    def finished(self) -> bool:
+        '''
+        return: True si ya hay suficientes mercados listos y no hace falta procesar los tickers restantes.
+        '''
+        return self.emitted >= self.target
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+    import random
+    from configuration import DEFAULT_CONFIGURATION
+    generator = random.Random(0)
+    tickers = sorted(
+        [{"symbol": f'C{index}/USDT', "percentage": generator.uniform(0, 30)} for index in range(200)],
+        key=lambda ticker: ticker["percentage"], reverse=True
+    )
+    markets = [
+        {"symbolId": ticker["symbol"], "metrics": {"potential": ticker["percentage"] / 100 * generator.uniform(0, 60) / 100}}
+        for ticker in tickers
+    ]
+    configuration = dict(DEFAULT_CONFIGURATION, preselected=[])
+    termination = EarlyTermination(tickers, configuration, 10)
+    emitted = []
+    for position, market in enumerate(markets):
+        if termination.finished():
+            break
+        termination.add(market)
+        emitted += termination.ready(position + 1)
+    expected = sorted(markets, key=lambda market: market["metrics"]["potential"], reverse=True)[0:len(emitted)]
+    print(f'Tickers procesados: {position} de {len(tickers)}   Mercados listos: {len(emitted)}')
+    print(f'Mismo orden que la lista completa: {[m["symbolId"] for m in emitted] == [m["symbolId"] for m in expected]}')
@@ -1,8 +1,8 @@
 
 import time
-import ccxt # type: ignore
 from basics import *
 import logging
+from typing import Iterator
 
 
 CANDLE_TIMESTAMP = 0
@@ -19,11 +19,24 @@ class ExchangeInterface(Basics):
 
     def __init__(self, exchangeId:str, apiKey:str, secret:str, logName:str):
         self.exchange: Any = None
+        self.log = logging.getLogger(logName)
         self.select_exchange(exchangeId, apiKey, secret)   #hitbtc, kraken
         self.exchangeId: str = exchangeId
         self.insistenceCountMax: int = INSISTENCE_COUNT_MAX
         self.insistencePauseSeconds: int = INSISTENCE_PAUSE_SECONDS
-        self.log = logging.getLogger(logName)
+
+
+    @staticmethod
+    def exchange_class(exchangeId:str) -> Any:
+        '''
+        Devuelve la clase del exchange en CCXT. La libreria CCXT se importa aqui, al seleccionar el exchange
+        y no al importar este modulo, porque al importarse carga los modulos de todos los exchanges.
+        param exchangeId: Identificador del exchange. Ej: "hitbtc".
+        return: Clase del exchange.
+        '''
+        import ccxt # type: ignore
+        return getattr(ccxt, exchangeId)
+
 
         
     def select_exchange(self, exchangeId:str, apiKey:str, secret:str) -> bool:
@@ -33,7 +46,7 @@ class ExchangeInterface(Basics):
         return: Instancia del objeto exchange. Si ocurre error, devuelve None.
         '''
         try:
-            self.exchange = (getattr(ccxt, exchangeId))({"apiKey": apiKey, "secret": secret}) 
+            self.exchange = self.exchange_class(exchangeId)({"apiKey": apiKey, "secret": secret}) 
             self.exchangeId = exchangeId
             return True
         except Exception as e:
@@ -76,16 +89,17 @@ class ExchangeInterface(Basics):
             return False
 
 
-    def load_markets_and_currencies(self) -> bool:
+    def load_markets_and_currencies(self, reload:bool=False) -> bool:
         '''
         Carga los mercados y cryptomonedas del exchange y sus datos.
         Si se produce un error, lo intenta nuevamente varias veces antes de fallar.
+        param reload: True para pedirlos de nuevo al exchange. CCXT guarda los mercados de la primera carga.
         Return: True si se logran cargar los mercados y monedas. De lo contrario False.
         '''
         exceptionMsg = ""
         for i in range(self.insistenceCountMax):
             try:
-                self.exchange.load_markets()
+                self.exchange.load_markets(reload)
                 if len(self.exchange.markets) > 0 and len(self.exchange.currencies) > 0:
                     return True
             except Exception as e:
@@ -190,6 +204,56 @@ class ExchangeInterface(Basics):
         return None
 
 
+    def get_candles_chunks(
+            self,
+            symbol:MarketId,
+            count:int=24,
+            timeFrame:str='1h',
+            chunkSize:int=500
+        ) -> Iterator[ListOfCandles]:
+        '''
+        Obtiene las velas del mercado correspondientes a las ultimas "count" velas de tiempo, por partes.\n
+        Cada parte se pide al exchange con el parametro "since" y se entrega antes de pedir la siguiente,
+        por lo que quien recibe las velas no necesita tener el rango completo en memoria.
+        A diferencia de get_last_candles, las velas que faltan en el exchange no se completan con velas
+        anteriores al rango, por lo que un mercado con huecos devuelve menos de "count" velas.
+        Si se produce un error, lo intenta nuevamente varias veces antes de fallar.
+        param symbol: Mercado al que se le van a leer las velas.
+        param count: Cantidad de velas hacia atras que se deben buscar.
+        param timeFrame: Temporalidad de las velas que se deben buscar.
+        param chunkSize: Cantidad maxima de velas de cada peticion.
+        return: Generador de listas de velas, de la mas antigua a la mas reciente. 
+                Si falla alguna peticion, se detiene sin entregar el resto de las velas.
+        '''
+        if self.exchange.timeframes.get(timeFrame, None) is None:
+            self.log.error(self.cmd(f"Error: El timeFrame {timeFrame} no esta soportado por el exchange."))
+            return
+        period = int(self.exchange.parse_timeframe(timeFrame) * 1000)
+        now = int(self.exchange.milliseconds())
+        since = now - now % period - (count - 1) * period
+        remaining = count
+        while remaining > 0 and since <= now:
+            chunk = None
+            exceptionMsg = ""
+            for i in range(self.insistenceCountMax):
+                try:
+                    chunk = self.exchange.fetch_ohlcv(symbol, timeFrame, since=since, limit=min(chunkSize, remaining))
+                    break
+                except Exception as e:
+                    exceptionMsg = str(e)
+                    time.sleep(self.insistencePauseSeconds) 
+            if chunk is None:
+                msg1 = f"Error: Obteniendo las velas {timeFrame} del mercado {symbol} desde {since}. Exception: {exceptionMsg}"
+                self.log.exception(self.cmd(msg1))
+                return
+            chunk = [candle for candle in chunk if candle[CANDLE_TIMESTAMP] >= since][0:remaining]
+            if len(chunk) == 0:
+                return
+            remaining -= len(chunk)
+            since = int(chunk[-1][CANDLE_TIMESTAMP]) + period
+            yield chunk
+
+
     def get_order_book(self, symbol:MarketId, count:int=24):
         '''
         Obtiene las ultimas velas del mercado
@@ -0,0 +1,250 @@
+
+import heapq
+import bisect
+from typing import Callable, Dict, List, Optional, Tuple
+from basics import *
+
+ExitTrigger = Tuple[str, str]       # (identificador de la inversion, motivo)
+Threshold = Tuple[float, str]       # (precio, identificador de la inversion)
+
+REASON_STOP_LOSS = "STOP LOSS"
+REASON_TRAILING_STOP = "TRAILING STOP LOSS"
+REASON_TAKE_PROFIT = "TAKE PROFIT"
+REASON_TIME_STOP = "TIME STOP"
+
+
+class ExitTriggerIndex(Basics):
+    '''
+    Indice de los umbrales de salida de las inversiones abiertas, para que cada precio nuevo o cada
+    comprobacion del tiempo solo revise las inversiones cuyo umbral se ha cruzado.\n
+    - Por cada mercado se guardan dos listas ordenadas: los precios de Stop Loss (incluidos los Trailing
+      Stop) y los precios de Take Profit. Con un precio nuevo, los umbrales cruzados se encuentran con
+      una busqueda binaria.
+    - El Trailing Stop se calcula desde el precio maximo alcanzado (high-water mark) y no desde el precio
+      actual. Cuando el precio supera el maximo, el umbral sube y se notifica con "onHighWater" para
+      guardarlo junto con la inversion.
+    - Los limites de tiempo se guardan en un monticulo (heap) ordenado por fecha de vencimiento.\n
+    Una inversion cuyo umbral se ha cruzado sigue en el indice hasta que se llama a "remove", por lo que
+    si no se logra cerrar se vuelve a notificar en la siguiente comprobacion.
+    '''
+
+    def __init__(self, onHighWater:Optional[Callable[[str, float], None]]=None):
+        '''
+        param onHighWater: Funcion que recibe el identificador de la inversion y su nuevo precio maximo.
+        '''
+        self.onHighWater = onHighWater
+        self.positions: Dict[str, Dict] = {}
+        self.stops: Dict[MarketId, List[Threshold]] = {}
+        self.targets: Dict[MarketId, List[Threshold]] = {}
+        self.highWaters: Dict[MarketId, List[Threshold]] = {}
+        self.deadlines: List[Tuple[float, str]] = []
+
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+
+    def __contains__(self, positionId:str) -> bool:
+        return positionId in self.positions
+
+
+    @staticmethod
+    def _number(value) -> Optional[float]:
+        try:
+            return None if value is None else float(value)
+        except:
+            return None
+
+
+    def add(self, positionId:str, investment:Dict, defaultMaxHours:float):
+        '''
+        Agrega o reemplaza los umbrales de una inversion.
+        param positionId: Identificador de la inversion. En el registro de inversiones, el symbol del mercado.
+        param investment: Datos de la inversion guardados por Investments.open.
+        param defaultMaxHours: Horas maximas de la inversion si no tiene "maxHours".
+        '''
+        self.remove(positionId)
+        forExit = investment.get("forExit", {})
+        buy = investment.get("buy", {})
+        position = {
+            "symbol": investment.get("symbol", positionId),
+            "stop": None,
+            "target": self._number(forExit.get("takeProfitPrice", None)),
+            "trailingPercent": None,
+            "highWater": None,
+            "deadline": None
+        }
+        maxLossPercent = self._number(forExit.get("maxLossPercent", None))
+        if forExit.get("trailingStop", False) and maxLossPercent is not None:
+            position["trailingPercent"] = -abs(maxLossPercent)
+            position["highWater"] = self._number(forExit.get("highWaterPrice", None)) \
+                or self._number(buy.get("price", None)) \
+                or self._number(investment.get("lastTickerPrice", None))
+            if position["highWater"] is not None:
+                position["stop"] = position["highWater"] * (1 + position["trailingPercent"] / 100)
+        elif not forExit.get("trailingStop", False):
+            position["stop"] = self._number(forExit.get("stopLossPrice", None))
+        maxHours = self._number(forExit.get("maxHours", None))
+        timestamp = self._number(buy.get("timestamp", None))
+        if timestamp is not None:
+            position["deadline"] = timestamp + (maxHours if maxHours is not None else float(defaultMaxHours)) * 3600000
+            heapq.heappush(self.deadlines, (position["deadline"], positionId))
+        self.positions[positionId] = position
+        if position["stop"] is not None:
+            bisect.insort(self.stops.setdefault(position["symbol"], []), (position["stop"], positionId))
+        if position["target"] is not None:
+            bisect.insort(self.targets.setdefault(position["symbol"], []), (position["target"], positionId))
+        if position["stop"] is not None and position["trailingPercent"] is not None:
+            bisect.insort(self.highWaters.setdefault(position["symbol"], []), (position["highWater"], positionId))
+
+
+    @staticmethod
+    def _discard(thresholds:Optional[List[Threshold]], item:Threshold):
+        if thresholds is None:
+            return
+        index = bisect.bisect_left(thresholds, item)
+        if index < len(thresholds) and thresholds[index] == item:
+            del thresholds[index]
+
+
+    def remove(self, positionId:str) -> bool:
+        '''
+        Elimina los umbrales de una inversion. Su limite de tiempo se descarta al llegar al inicio del monticulo.
+        param positionId: Identificador de la inversion.
+        return: True si la inversion estaba en el indice.
+        '''
+        position = self.positions.pop(positionId, None)
+        if position is None:
+            return False
+        if position["stop"] is not None:
+            self._discard(self.stops.get(position["symbol"], None), (position["stop"], positionId))
+        if position["target"] is not None:
+            self._discard(self.targets.get(position["symbol"], None), (position["target"], positionId))
+        if position["stop"] is not None and position["trailingPercent"] is not None:
+            self._discard(self.highWaters.get(position["symbol"], None), (position["highWater"], positionId))
+        return True
+
+
+    def update_price(self, symbolId:MarketId, price:float) -> List[ExitTrigger]:
+        '''
+        Procesa un precio nuevo del mercado. Solo se revisan los umbrales cruzados y los Trailing Stop
+        cuyo precio maximo es inferior al precio nuevo.
+        param symbolId: Identificador del mercado.
+        param price: Ultimo precio del mercado.
+        return: Lista de las inversiones cuyo umbral de salida se ha cruzado, con el motivo.
+        '''
+        fired: List[ExitTrigger] = []
+        stops = self.stops.get(symbolId, None)
+        if stops:
+            self._raise_trailing_stops(symbolId, price)
+            for stop, positionId in stops[bisect.bisect_left(stops, (price, "")):]:
+                reason = REASON_TRAILING_STOP if self.positions[positionId]["trailingPercent"] is not None else REASON_STOP_LOSS
+                fired.append((positionId, reason))
+        targets = self.targets.get(symbolId, None)
+        if targets:
+            firedIds = {positionId for positionId, reason in fired}
+            for target, positionId in targets[0:bisect.bisect_right(targets, (price, chr(0x10FFFF)))]:
+                if positionId not in firedIds:
+                    fired.append((positionId, REASON_TAKE_PROFIT))
+        return fired
+
+
+    def _raise_trailing_stops(self, symbolId:MarketId, price:float):
+        '''
+        Actualiza el precio maximo y el umbral de los Trailing Stop del mercado cuyo maximo es inferior al precio.
+        '''
+        highWaters = self.highWaters.get(symbolId, None)
+        if not highWaters:
+            return
+        count = bisect.bisect_left(highWaters, (price, ""))
+        if count == 0:
+            return
+        raised = highWaters[0:count]
+        del highWaters[0:count]
+        stops = self.stops[symbolId]
+        for highWater, positionId in raised:
+            position = self.positions[positionId]
+            self._discard(stops, (position["stop"], positionId))
+            position["highWater"] = price
+            position["stop"] = price * (1 + position["trailingPercent"] / 100)
+            bisect.insort(stops, (position["stop"], positionId))
+            bisect.insort(highWaters, (price, positionId))
+            if self.onHighWater is not None:
+                self.onHighWater(positionId, price)
+
+
+    def expired(self, nowMs:float) -> List[ExitTrigger]:
+        '''
+        Devuelve las inversiones cuyo limite de tiempo ha vencido. Solo se revisa el inicio del monticulo.
+        param nowMs: Hora actual en milisegundos.
+        return: Lista de las inversiones vencidas, con el motivo. Siguen en el indice hasta que se llame a "remove".
+        '''
+        fired: List[ExitTrigger] = []
+        while len(self.deadlines) > 0 and self.deadlines[0][0] <= nowMs:
+            deadline, positionId = heapq.heappop(self.deadlines)
+            position = self.positions.get(positionId, None)
+            if position is not None and position["deadline"] == deadline:
+                fired.append((positionId, REASON_TIME_STOP))
+        for positionId, reason in fired:
+            heapq.heappush(self.deadlines, (self.positions[positionId]["deadline"], positionId))
+        return fired
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+    import time
+    import random
+    generator = random.Random(0)
+    highWaters = {}
+    index = ExitTriggerIndex(lambda positionId, price: highWaters.__setitem__(positionId, price))
+    positions = {}
+    prices = {f'C{number}/USDT': generator.uniform(1, 100) for number in range(500)}
+    for number in range(5000):
+        symbolId = f'C{number % 500}/USDT'
+        trailing = number % 3 == 0
+        investment = {
+            "symbol": symbolId,
+            "buy": {"price": prices[symbolId], "timestamp": number * 1000},
+            "forExit": {
+                "trailingStop": trailing, "maxLossPercent": -5 if trailing else None,
+                "stopLossPrice": None if trailing else prices[symbolId] * 0.95, 
+                "takeProfitPrice": prices[symbolId] * 1.1, "maxHours": 24
+            }
+        }
+        positions[f'{number}'] = dict(investment["forExit"], symbol=symbolId, highWater=prices[symbolId])
+        index.add(f'{number}', investment, 168)
+    updates = []
+    for update in range(20000):
+        symbolId = f'C{generator.randrange(500)}/USDT'
+        prices[symbolId] *= generator.uniform(0.99, 1.011)
+        updates.append((symbolId, prices[symbolId]))
+    begin = time.perf_counter()
+    fired = []
+    for symbolId, price in updates:
+        for positionId, reason in index.update_price(symbolId, price):
+            fired.append((positionId, reason))
+            index.remove(positionId)
+    milliseconds = round((time.perf_counter() - begin) * 1000, 1)
+    # Comprobacion recorriendo todas las inversiones del mercado en cada precio.
+    expected = []
+    for symbolId, price in updates:
+        for positionId, position in list(positions.items()):
+            if position["symbol"] != symbolId:
+                continue
+            if position["trailingStop"]:
+                position["highWater"] = max(position["highWater"], price)
+                if price <= position["highWater"] * 0.95:
+                    expected.append((positionId, REASON_TRAILING_STOP))
+                    del positions[positionId]
+                    continue
+            elif price <= position["stopLossPrice"]:
+                expected.append((positionId, REASON_STOP_LOSS))
+                del positions[positionId]
+                continue
+            if price >= position["takeProfitPrice"]:
+                expected.append((positionId, REASON_TAKE_PROFIT))
+                del positions[positionId]
+    print(f'Precios procesados: {len(updates)} en {milliseconds} ms   Salidas: {len(fired)}   Maximos actualizados: {len(highWaters)}')
+    print(f'Mismas salidas que revisando todas las inversiones: {sorted(fired) == sorted(expected)}')
+    print(f'Limites de tiempo vencidos: {len(index.expired(24 * 3600000 + 2000))}')
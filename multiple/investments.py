@@ -85,10 +85,10 @@ class Investments(Basics):
                     self.log.info(self.cmd(f'Se han cargado los datos de la iversion en {symbolId}.', INDENT))
                 else:
                     self.log.error(self.cmd(f'{index}: Error en los datos de la inversion en el mercado {symbolId}'))
-                time.sleep(1)
+                ConsoleOutput.pause(1)
                 index += 1
-            print()
-            time.sleep(3)
+            ConsoleOutput.write("")
+            ConsoleOutput.pause(3)
             return True
         return False
 
@@ -205,6 +205,30 @@ class Investments(Basics):
 
 
 
+    def set_high_water(self, symbolId:MarketId, price:float, save:bool=True) -> bool:
+        '''
+        Guarda el precio maximo alcanzado por una inversion abierta, desde el que se calcula su Trailing Stop.
+        param symbolId: Identificador del mercado de la inversion.
+        param price: Precio maximo alcanzado desde la compra.
+        param save: True para guardar el fichero en este momento. Con False se debe llamar despues a save_to_file.
+        return: True si la inversion existe y se guarda el precio.
+        '''
+        if not self.contains(symbolId):
+            return False
+        self.data["currentInvestments"][symbolId]["forExit"]["highWaterPrice"] = price
+        if save:
+            self.save_to_file()
+        return True
+
+
+
+
+    def save_to_file(self):
+        FileManager.data_to_file_json(self.data, self.fileName, self.log)
+
+
+
+
     def contains(self, marketId:MarketId) -> bool:
         return marketId in self.data["currentInvestments"]
 
@@ -260,9 +284,78 @@ class Investments(Basics):
         except Exception as e:
             self.log.exception(self.cmd(f'Error en los datos de la inversion actual. Exception: {str(e)}'))
             return False
-    
-    
-       
-    
-    
-    
\ No newline at end of file
+
+
+
+
+class InvestmentsByQuote(Basics):
+    '''
+    Agrupa los registros de inversiones (Investments) de varias currencies quote.
+
+    Se usa cuando el escaneo incluye mercados de varias quotes ("crossQuoteScan"). Cada quote mantiene su
+    propio fichero de inversiones, con los balances y estadisticas en esa quote. Las operaciones de una
+    inversion se envian al registro de la quote de su mercado, y las consultas se hacen sobre todos.
+    '''
+
+    def __init__(self, botId:str, exchangeId:str, directoryLedger:str, quotes:ListOfCurrenciesId, primary:Optional[Investments]=None):
+        '''
+        param quotes: Lista de currencies quote. La primera es la quote principal de la configuracion.
+        param primary: Registro ya creado de la quote principal. Si es None, se crea uno nuevo.
+        '''
+        self.log = logging.getLogger(botId)
+        self.ledgers: Dict[CurrencyId, Investments] = {}
+        for quote in quotes:
+            if quote not in self.ledgers:
+                if primary is not None and len(self.ledgers) == 0:
+                    self.ledgers[quote] = primary
+                else:
+                    self.ledgers[quote] = Investments(botId, exchangeId, directoryLedger, quote)
+
+
+    def of(self, symbolId:MarketId) -> Investments:
+        '''
+        return: Registro de inversiones de la quote del mercado. Si la quote no esta, el de la quote principal.
+        '''
+        return self.ledgers.get(self.quote_of_symbol(symbolId), next(iter(self.ledgers.values())))
+
+
+    def load_from_file(self) -> bool:
+        results = [investments.load_from_file() for investments in self.ledgers.values()]
+        return any(results)
+
+
+    def open(self, symbolId:MarketId, *args, **kwargs) -> bool:
+        return self.of(symbolId).open(symbolId, *args, **kwargs)
+
+
+    def close(self, symbolId:MarketId, order, balanceQuote:float) -> CloseInvestmentResult:
+        return self.of(symbolId).close(symbolId, order, balanceQuote)
+
+
+    def set_high_water(self, symbolId:MarketId, price:float, save:bool=True) -> bool:
+        return self.of(symbolId).set_high_water(symbolId, price, save)
+
+
+    def save_to_file(self):
+        for investments in self.ledgers.values():
+            investments.save_to_file()
+
+
+    def contains(self, marketId:MarketId) -> bool:
+        return self.of(marketId).contains(marketId)
+
+
+    def get(self, marketId:MarketId) -> Optional[Dict]:
+        return self.of(marketId).get(marketId)
+
+
+    def markets(self) -> ListOfMarketsId:
+        return [marketId for investments in self.ledgers.values() for marketId in investments.markets()]
+
+
+    def empty(self) -> bool:
+        return all(investments.empty() for investments in self.ledgers.values())
+
+
+    def count(self) -> int:
+        return sum(investments.count() for investments in self.ledgers.values())
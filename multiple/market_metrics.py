@@ -1,7 +1,9 @@
 
-from typing import Dict, List, Literal, Optional
+from typing import Callable, Dict, List, Literal, Optional, Sequence
 from basics import *
 from exchange_interface import CANDLE_LOW, CANDLE_HIGT, CANDLE_CLOSE
+from candle_series import Candles, CandleSeries
+from candle_resampling import CandleResampling
 
 Metrics = Dict
 MetricsSummary = Dict
@@ -17,16 +19,23 @@ class MarketMetrics(Basics):
     ####################################################################################################
     
     @staticmethod
-    def calculate(ticker:Ticker, candles1h:ListOfCandles, preselected:ListOfCurrenciesId) -> Metrics:
+    def calculate(
+            ticker:Ticker,
+            candles1h:Candles,
+            preselected:ListOfCurrenciesId,
+            timeFrames:Optional[List[str]]=None
+        ) -> Metrics:
         '''
         Devuelve un objeto con las metricas del mercado.\n
         Toma el ultimo ticker y las ultimas velas 1h del mercado, para hacer un resumen calculando
         valores estadisticos de los datos y derivados, que sirven para determinar si el mercado tiene
         potencial de ganancias.\n
         param ticker: Ultimo ticker del mercado, obtenido del exchange, mediante la librería ccxt.
-        param candles1h: Lista de velas h1 obtenidas del exchange, mediante la librería ccxt.
+        param candles1h: Lista o CandleSeries de velas h1 obtenidas del exchange, mediante la librería ccxt.
         param candlesHours: Cantidad de velas que se necesitan para analizar el mercado.
         param preselected: Lista de currencies que deben pasar el filtro siempre y quedar en primera posicion.
+        param timeFrames: Temporalidades mayores, obtenidas de las velas 1h, de las que tambien se calculan 
+                          estadisticas en metrics["timeframes"]. Ej: ["4h", "1d"]. None para no calcularlas.
         return: Devuelve un objeto con las metricas del mercado.
         '''    
         metrics: Metrics = {"completed": False}
@@ -34,6 +43,8 @@ class MarketMetrics(Basics):
         metrics["quote"] = MarketMetrics.quote_of_symbol(ticker["symbol"])
         metrics["ticker"] = MarketMetrics._ticker_statistics(ticker)
         metrics["candles"] = MarketMetrics._candles_statistics(candles1h)
+        if timeFrames:
+            metrics["timeframes"] = MarketMetrics.timeframes_statistics(candles1h, timeFrames)
         metrics["trading"] = MarketMetrics._trading_parameters(metrics)
         metrics["potential"] = MarketMetrics._calculate_potential(metrics, preselected)
         metrics["completed"] = True
@@ -168,7 +179,7 @@ class MarketMetrics(Basics):
     
 
     @staticmethod
-    def _candles_colapses(candles: ListOfCandles, minDeltaAsPercent:float=0.1) -> float:
+    def _candles_colapses(candles: Candles, minDeltaAsPercent:float=0.1) -> float:
         '''
         Devuelve el porciento de velas colapsadas
         Una vela colapsada (doji, linea) tiene sus cuatro componentes open, low, high y close con valores 
@@ -193,7 +204,7 @@ class MarketMetrics(Basics):
 
 
     @staticmethod
-    def _candles_filter_time_range(candles: ListOfCandles, maxCandlesAgeAsHours: float) -> ListOfCandles:
+    def _candles_filter_time_range(candles: Candles, maxCandlesAgeAsHours: float) -> ListOfCandles:
         '''
         Filtra las velas teniendo en cuenta la cantidad de horas requerida.
         Cuando se piden las velas al exchange mediante la libreria ccxt, se debe especificar la 
@@ -225,7 +236,7 @@ class MarketMetrics(Basics):
         
 
     @staticmethod
-    def _candles_1h_completion(candles1h:ListOfCandles, requestedCandlesCount:int) -> float:
+    def _candles_1h_completion(candles1h:Candles, requestedCandlesCount:int) -> float:
         '''
         Devuelve el porciento de completitud del rango de velas de la lista.        
         Cuando se piden las velas al exchange, se especifica la cantidad de velas. 
@@ -245,7 +256,7 @@ class MarketMetrics(Basics):
 
 
     @staticmethod
-    def _candles_statistics(candles:ListOfCandles) -> Optional[Dict]:
+    def _candles_statistics(candles:Candles) -> Optional[Dict]:
         '''
         Devuelve estadisticas descriptivas de las velas.
         param candles: Lista de velas obtenidas del exchange, mediante la librería ccxt.
@@ -286,6 +297,58 @@ class MarketMetrics(Basics):
 
 
 
+    @staticmethod
+    def timeframe_statistics(candles1h:Candles, timeFrame:str, candlesStatistics:Optional[Callable]=None) -> Optional[Dict]:
+        '''
+        Devuelve estadisticas descriptivas de las velas de una temporalidad mayor, obtenidas de las velas 1h.\n
+        No se hacen peticiones al exchange. La completitud se calcula por intervalos de la temporalidad.
+        param candles1h: Lista o CandleSeries de velas 1h obtenidas del exchange, mediante la librería ccxt.
+        param timeFrame: Temporalidad de las velas. Ej: "4h", "1d".
+        param candlesStatistics: Funcion que calcula las estadisticas de las velas. Por defecto "_candles_statistics".
+        return: Devuelve un objeto con las estadisticas descriptivas de las velas de la temporalidad.
+                Si ocurre un error, devuelve None.
+        '''
+        try:
+            resampled = CandleResampling.resample(candles1h, timeFrame)
+            return MarketMetrics.resampled_statistics(resampled, timeFrame, candlesStatistics)
+        except Exception as e:
+            print(f"Error: Calculando las estadisticas de las velas {timeFrame}. Exception: {str(e)}")
+            return None
+
+
+    @staticmethod
+    def resampled_statistics(resampled:ListOfCandles, timeFrame:str, candlesStatistics:Optional[Callable]=None) -> Optional[Dict]:
+        '''
+        Devuelve estadisticas descriptivas de velas ya agrupadas en una temporalidad mayor.
+        param resampled: Velas devueltas por CandleResampling.resample o por un CandleResampler.
+        param timeFrame: Temporalidad de las velas. Ej: "4h", "1d".
+        param candlesStatistics: Funcion que calcula las estadisticas de las velas. Por defecto "_candles_statistics".
+        return: Objeto con las estadisticas, con la completitud calculada por intervalos de la temporalidad.
+        '''
+        if candlesStatistics is None:
+            candlesStatistics = MarketMetrics._candles_statistics
+        statistics = candlesStatistics(resampled)
+        if statistics is not None:
+            statistics["percent"]["completion"] = CandleResampling.completion(resampled, timeFrame)
+        return statistics
+
+
+    @staticmethod
+    def timeframes_statistics(candles1h:Candles, timeFrames:List[str], candlesStatistics:Optional[Callable]=None) -> Dict:
+        '''
+        Devuelve un objeto con las estadisticas de cada temporalidad mayor, obtenidas de las velas 1h.
+        param candles1h: Lista o CandleSeries de velas 1h obtenidas del exchange, mediante la librería ccxt.
+        param timeFrames: Lista de temporalidades. Ej: ["4h", "1d"].
+        param candlesStatistics: Funcion que calcula las estadisticas de las velas. Por defecto "_candles_statistics".
+        return: Objeto con las estadisticas de cada temporalidad, indexado por la temporalidad.
+        '''
+        return {
+            timeFrame: MarketMetrics.timeframe_statistics(candles1h, timeFrame, candlesStatistics) 
+            for timeFrame in timeFrames
+        }
+
+
+
     @staticmethod
     def _trading_parameters(metrics:Metrics) -> Any:
         '''
@@ -309,7 +372,7 @@ class MarketMetrics(Basics):
 
 
     @staticmethod
-    def _candles_trend_deviation(candles: ListOfCandles, trendLine: List[float]) -> Optional[Dict]:
+    def _candles_trend_deviation(candles: Candles, trendLine: List[float]) -> Optional[Dict]:
         '''
         Devuelve los datos de la desviacion de las velas con respecto a una linea.
         param candles: Lista de velas obtenidas del exchange, mediante la librería ccxt.
@@ -320,16 +383,30 @@ class MarketMetrics(Basics):
                 Si hay menos de 5 velas, devuelve None por unsuficiencia de datos.
                 Si ocurre un error, devuelve None.
         '''
+        if isinstance(candles, CandleSeries):
+            return MarketMetrics._closes_trend_deviation(candles.closes, trendLine)
+        return MarketMetrics._closes_trend_deviation([candle[CANDLE_CLOSE] for candle in candles], trendLine)
+
+
+    @staticmethod
+    def _closes_trend_deviation(closes: Sequence[float], trendLine: List[float]) -> Optional[Dict]:
+        '''
+        Devuelve los datos de la desviacion de los precios de cierre con respecto a una linea.
+        Es el calculo de "_candles_trend_deviation" cuando ya se tienen los cierres de las velas en una columna.
+        param closes: Precios de cierre de las velas, de la mas antigua a la mas reciente.
+        param trendLine: Lista de precios que representa una linea que va desde el precio inicial hasta el final.
+        return: Igual que "_candles_trend_deviation".
+        '''
         try:
-            if len(candles) < 5:
+            if len(closes) < 5:
                 return None
             # Valores absolutos de desviacion
-            deviations = list(float(candles[index][CANDLE_CLOSE]) - float(trendLine[index]) for index in range(len(candles)))
+            deviations = list(float(closes[index]) - float(trendLine[index]) for index in range(len(closes)))
             upperDeviation = list(filter(lambda deviation: deviation > 0, deviations))
             lowerDeviation = list(filter(lambda deviation: deviation < 0, deviations))
             absolute = list(abs(deviation) for deviation in deviations)
             # Valores de desviacion expresados en porciento con respecto a la linea de tendencia.
-            deviationsAsPercent = list(float(MarketMetrics.delta(float(trendLine[index]), candles[index][CANDLE_CLOSE])) for index in range(len(candles)))
+            deviationsAsPercent = list(float(MarketMetrics.delta(float(trendLine[index]), closes[index])) for index in range(len(closes)))
             upperDeviationAsPercent = list(filter(lambda deviation: deviation > 0, deviationsAsPercent))
             lowerDeviationAsPercent = list(filter(lambda deviation: deviation < 0, deviationsAsPercent))
             absoluteAsPercent = list(abs(deviation) for deviation in deviationsAsPercent)
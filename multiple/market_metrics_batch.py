@@ -0,0 +1,444 @@
+
+from typing import Any, Dict, List, Optional
+from basics import *
+from exchange_interface import CANDLE_TIMESTAMP, CANDLE_OPEN, CANDLE_HIGT, CANDLE_LOW, CANDLE_CLOSE
+from market_metrics import MarketMetrics, Metrics, MIN_PROFIT_PERCENT
+from candle_series import Candles, CandleSeries
+from validations import Validations
+
+BatchMetrics = Dict
+CandlesTensor = Any     # numpy.ndarray con forma (N, T, 6)
+
+MILLISECONDS_PER_HOUR = 60 * 60 * 1000
+PRESELECTED_POTENTIAL = float(1000000000)
+INVALID_SPREAD = float(1000000)
+
+
+class MarketMetricsBatch(Basics):
+
+    ####################################################################################################
+    # METODO PRICIPAL DE LA CLASE
+    # Calcula las mismas metricas que MarketMetrics.calculate, pero para N mercados a la vez,
+    # a partir de un tensor (N, T, 6) con las velas alineadas de todos los mercados.
+    ####################################################################################################
+
+    @staticmethod
+    def calculate(
+            tickers:ListOfTickers,
+            candles:CandlesTensor,
+            preselected:ListOfCurrenciesId,
+            configuration:Optional[ConfigurationData]=None,
+            timeFrameStatistics:Optional[Dict[str, List[Optional[Dict]]]]=None
+        ) -> BatchMetrics:
+        '''
+        Devuelve un objeto con las metricas de N mercados calculadas en una sola pasada vectorizada.\n
+        La estructura del resultado es la misma que la de las metricas de MarketMetrics.calculate,
+        pero cada valor es un array de N elementos (uno por mercado) en el orden de "tickers".\n
+        param tickers: Lista con los N ultimos tickers de los mercados, obtenidos mediante la librería ccxt.
+        param candles: Tensor (N, T, 6) con las ultimas T velas 1h de cada mercado. Ver "candles_tensor".
+        param preselected: Lista de currencies que deben pasar el filtro siempre y quedar en primera posicion.
+        param configuration: Objeto con la configuracion del algoritmo. Si se especifica, se calculan
+                             las temporalidades mayores de "filters.timeframes" y la mascara "passed"
+                             equivalente a Validations.is_potential_market.
+        param timeFrameStatistics: Estadisticas de las temporalidades mayores ya calculadas, con una lista de N
+                                   valores por temporalidad. Ej: las del cache de metricas. None para calcularlas.
+        return: Devuelve un objeto con las metricas de los N mercados.
+        '''
+        import numpy as np # type: ignore
+        candles = np.asarray(candles, dtype=np.float64)
+        if candles.ndim != 3 or candles.shape[0] != len(tickers):
+            raise ValueError(f'Se esperaba un tensor de velas (N, T, 6) con N={len(tickers)}. Forma: {candles.shape}')
+        symbols = [str(ticker["symbol"]) for ticker in tickers]
+        bases = [MarketMetricsBatch.base_of_symbol(symbol) for symbol in symbols]
+        batch: BatchMetrics = {
+            "count": len(symbols),
+            "symbols": symbols,
+            "base": bases,
+            "quote": [MarketMetricsBatch.quote_of_symbol(symbol) for symbol in symbols],
+            "preselected": np.array(
+                [base.upper() in preselected or base.lower() in preselected for base in bases],
+                dtype=bool
+            )
+        }
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            batch["ticker"] = MarketMetricsBatch._ticker_statistics(tickers)
+            batch["candles"] = MarketMetricsBatch._candles_statistics(candles)
+            batch["trading"] = MarketMetricsBatch._trading_parameters(batch)
+            batch["potential"] = np.where(
+                batch["preselected"],
+                PRESELECTED_POTENTIAL,
+                (batch["ticker"]["percentage"] / 100) * (batch["candles"]["percent"]["changeWhole"] / 100)
+            )
+        batch["valid"] = batch["candles"].pop("valid") & batch["candles"]["hasTrendDeviation"] \
+            & np.isfinite(batch["ticker"]["percentage"]) & np.isfinite(batch["ticker"]["lastPrice"])
+        if configuration is not None:
+            timeFrames = list(configuration.get("filters", {}).get("timeframes", {}).keys())
+            if timeFrameStatistics is not None:
+                batch["timeframes"] = timeFrameStatistics
+            elif timeFrames:
+                batch["timeframes"] = MarketMetricsBatch._timeframes_statistics(candles, timeFrames)
+            batch["passed"] = MarketMetricsBatch.potential_mask(batch, configuration)
+        return batch
+
+
+    @staticmethod
+    def _timeframes_statistics(candles:CandlesTensor, timeFrames:List[str]) -> Dict[str, List[Optional[Dict]]]:
+        '''
+        Calcula las estadisticas de las temporalidades mayores de cada mercado, igual que MarketMetrics.timeframe_statistics.
+        Las velas de cada temporalidad se agrupan por mercado, porque los intervalos dependen de las marcas de tiempo.
+        param candles: Tensor (N, T, 6) con las velas 1h de cada mercado.
+        param timeFrames: Temporalidades mayores. Ej: ["4h", "1d"].
+        return: Objeto con una lista de N estadisticas (o None) por temporalidad.
+        '''
+        listOfCandles = [candles[index].tolist() for index in range(candles.shape[0])]
+        return {
+            timeFrame: [MarketMetrics.timeframe_statistics(candles1h, timeFrame) for candles1h in listOfCandles]
+            for timeFrame in timeFrames
+        }
+
+
+    ####################################################################################################
+    # METODOS DE USO GENERAL
+    ####################################################################################################
+
+    @staticmethod
+    def candles_tensor(listOfCandles:List[Candles], count:int) -> CandlesTensor:
+        '''
+        Crea el tensor (N, T, 6) a partir de las listas de velas de N mercados.\n
+        Igual que en TrendTakerCore, de cada mercado se toman las primeras "count" velas de la lista.\n
+        param listOfCandles: Lista con las velas 1h (listas o CandleSeries) de cada mercado.
+        param count: Cantidad T de velas que se toman de cada mercado.
+        return: Tensor (N, T, 6) de tipo float64 con las velas alineadas de los N mercados.
+        '''
+        import numpy as np # type: ignore
+        tensor = np.empty((len(listOfCandles), count, 6), dtype=np.float64)
+        for index, candles in enumerate(listOfCandles):
+            if len(candles) < count:
+                raise ValueError(f'El mercado {index} tiene {len(candles)} velas y se necesitan {count}.')
+            if isinstance(candles, CandleSeries):
+                for column in range(6):
+                    tensor[index, :, column] = np.frombuffer(candles.column(column), dtype=candles.columns[column].typecode)[0:count]
+            else:
+                tensor[index] = np.asarray(candles[0:count], dtype=np.float64)[:, 0:6]
+        return tensor
+
+
+    @staticmethod
+    def _column(tickers:ListOfTickers, key:str) -> Any:
+        '''
+        Devuelve un array con el valor numerico del campo especificado de cada ticker.
+        param tickers: Lista de tickers obtenidos mediante la librería ccxt.
+        param key: Nombre del campo del ticker.
+        return: Array de N valores float. Los valores ausentes o no numericos se devuelven como NaN.
+        '''
+        import numpy as np # type: ignore
+        values = np.full(len(tickers), np.nan, dtype=np.float64)
+        for index, ticker in enumerate(tickers):
+            try:
+                values[index] = float(ticker[key])
+            except:
+                pass
+        return values
+
+
+    @staticmethod
+    def metrics_of(batch:BatchMetrics, index:int) -> Optional[Metrics]:
+        '''
+        Devuelve las metricas de uno de los mercados del lote, con la misma estructura que MarketMetrics.calculate.
+        param batch: Objeto devuelto por MarketMetricsBatch.calculate.
+        param index: Posicion del mercado en el lote.
+        return: Objeto con las metricas del mercado. None si no se pudieron calcular sus metricas.
+        '''
+        if not bool(batch["valid"][index]):
+            return None
+        trading = MarketMetricsBatch._pick(batch["trading"], index)
+        trading["maxHours"] = int(batch["trading"]["maxHours"])
+        metrics: Metrics = {
+            "completed": True,
+            "base": batch["base"][index],
+            "quote": batch["quote"][index],
+            "ticker": MarketMetricsBatch._pick(batch["ticker"], index),
+            "candles": MarketMetricsBatch.candles_statistics_of(batch["candles"], index),
+            "trading": trading,
+            "potential": float(batch["potential"][index])
+        }
+        if "timeframes" in batch:
+            metrics["timeframes"] = {timeFrame: values[index] for timeFrame, values in batch["timeframes"].items()}
+        return metrics
+
+
+    @staticmethod
+    def candles_statistics_of(statistics:Dict, index:int) -> Optional[Dict]:
+        '''
+        Devuelve las estadisticas de velas de uno de los mercados, igual que MarketMetrics._candles_statistics.
+        param statistics: Objeto de estadisticas de velas del lote. Ej: batch["candles"].
+        param index: Posicion del mercado en el lote.
+        return: Objeto con las estadisticas descriptivas de las velas del mercado.
+                None si el calculo tuvo divisiones por cero, igual que MarketMetrics._candles_statistics.
+        '''
+        if "valid" in statistics and not bool(statistics["valid"][index]):
+            return None
+        candles = MarketMetricsBatch._pick(statistics, index)
+        candles["count"] = int(statistics["count"])
+        if not bool(statistics["hasTrendDeviation"][index]):
+            candles["trendDeviation"] = None
+        del candles["hasTrendDeviation"]
+        candles.pop("valid", None)
+        return candles
+
+
+    @staticmethod
+    def _pick(node:Any, index:int) -> Any:
+        '''
+        Devuelve una copia del objeto en la que cada array se reemplaza por su valor en la posicion "index".
+        '''
+        import numpy as np # type: ignore
+        if isinstance(node, dict):
+            return {key: MarketMetricsBatch._pick(value, index) for key, value in node.items()}
+        if isinstance(node, np.ndarray):
+            return float(node[index])
+        return node
+
+
+    ####################################################################################################
+    # METODOS PARA TICKERS
+    ####################################################################################################
+
+    @staticmethod
+    def _ticker_statistics(tickers:ListOfTickers) -> Dict:
+        import numpy as np # type: ignore
+        last = MarketMetricsBatch._column(tickers, "last")
+        percentage = MarketMetricsBatch._column(tickers, "percentage")
+        bid = MarketMetricsBatch._column(tickers, "bid")
+        ask = MarketMetricsBatch._column(tickers, "ask")
+        low = MarketMetricsBatch._column(tickers, "low")
+        high = MarketMetricsBatch._column(tickers, "high")
+        spread = (ask - bid) / bid * 100
+        amplitude = (high - low) / low * 100
+        deltaOverAmplitude = percentage / amplitude * 100
+        return {
+            "lastPrice": last,
+            "percentage": percentage,
+            "spread": np.where(np.isfinite(spread) & (bid != 0), spread, INVALID_SPREAD),
+            "deltaOverAmplitude": np.where(
+                np.isfinite(deltaOverAmplitude) & (low != 0) & (amplitude != 0),
+                deltaOverAmplitude,
+                0.0
+            )
+        }
+
+
+    ####################################################################################################
+    # METODOS PARA CANDLES (VELAS)
+    ####################################################################################################
+
+    @staticmethod
+    def _candles_statistics(candles:CandlesTensor) -> Dict:
+        '''
+        Devuelve estadisticas descriptivas de las velas de los N mercados.
+        param candles: Tensor (N, T, 6) con las velas de los mercados.
+        return: Objeto con las estadisticas de las velas. Cada valor es un array de N elementos.
+                El array "valid" indica los mercados en los que el calculo no tuvo divisiones por cero y
+                "hasTrendDeviation" los mercados en los que se pudo calcular la desviacion de la tendencia.
+        '''
+        import numpy as np # type: ignore
+        count = candles.shape[1]
+        if count == 0:
+            raise ValueError('Se necesita al menos una vela por mercado.')
+        opens = candles[:, :, CANDLE_OPEN]
+        highs = candles[:, :, CANDLE_HIGT]
+        lows = candles[:, :, CANDLE_LOW]
+        closes = candles[:, :, CANDLE_CLOSE]
+        timestamps = candles[:, :, CANDLE_TIMESTAMP]
+
+        # Porciento de velas colapsadas.
+        candleMin = np.minimum(np.minimum(opens, highs), np.minimum(lows, closes))
+        candleMax = np.maximum(np.maximum(opens, highs), np.maximum(lows, closes))
+        colapsed = (candleMin == 0) | ((candleMax - candleMin) / candleMin * 100 < 0.1)
+        colapses = colapsed.sum(axis=1) / count * 100
+
+        # Porciento de completitud del rango de velas.
+        inTimeRange = (timestamps[:, -1:] - timestamps) < float(MILLISECONDS_PER_HOUR * count)
+        completion = inTimeRange.sum(axis=1) / count * 100
+
+        # Estadisticas de los precios estimados de cada vela.
+        prices = (opens + highs + lows + closes) / 4
+        average = prices.sum(axis=1) / count
+        deviation = np.abs(prices - average[:, None]).sum(axis=1) / count
+        middle = round(float(count - 1) * 0.5)
+        priceOpen = prices[:, 0]
+        priceMiddle = prices[:, middle]
+        priceClose = prices[:, -1]
+        valid = (average != 0) & (priceOpen != 0) & (priceMiddle != 0) & np.isfinite(prices).all(axis=1)
+
+        trendDeviation, hasTrendDeviation = MarketMetricsBatch._candles_trend_deviation(closes, priceOpen, priceClose)
+        return {
+            "count": count,
+            "open": priceOpen,
+            "low": lows.min(axis=1),
+            "higt": highs.max(axis=1),
+            "close": priceClose,
+            "average": average,
+            "deviation": deviation,
+            "percent": {
+                "colapses": colapses,
+                "completion": completion,
+                "deviation": (deviation - average) / average * 100,
+                "changeWhole": (priceClose - priceOpen) / priceOpen * 100,
+                "changeHalf1": (priceMiddle - priceOpen) / priceOpen * 100,
+                "changeHalf2": (priceClose - priceMiddle) / priceMiddle * 100
+            },
+            "trendDeviation": trendDeviation,
+            "hasTrendDeviation": hasTrendDeviation,
+            "valid": valid
+        }
+
+
+    @staticmethod
+    def _masked_statistics(values:Any, mask:Any) -> Dict:
+        '''
+        Devuelve el maximo, minimo y promedio de los valores seleccionados por la mascara, por cada fila.
+        Si una fila no tiene valores seleccionados, los resultados de esa fila son cero.
+        '''
+        import numpy as np # type: ignore
+        count = mask.sum(axis=1)
+        total = np.where(mask, values, 0.0).sum(axis=1)
+        return {
+            "max": np.where(count > 0, np.where(mask, values, -np.inf).max(axis=1), 0.0),
+            "min": np.where(count > 0, np.where(mask, values, np.inf).min(axis=1), 0.0),
+            "average": np.where(count > 0, total / np.maximum(count, 1), 0.0)
+        }
+
+
+    @staticmethod
+    def _candles_trend_deviation(closes:Any, priceBegin:Any, priceEnd:Any) -> Any:
+        '''
+        Devuelve los datos de la desviacion de las velas con respecto a la linea de tendencia de cada mercado.
+        param closes: Array (N, T) con los precios de cierre de las velas.
+        param priceBegin: Array de N precios iniciales de las lineas de tendencia.
+        param priceEnd: Array de N precios finales de las lineas de tendencia.
+        return: Tupla con el objeto de las desviaciones y el array de mercados en los que se pudo calcular.
+                Si hay menos de 5 velas, no se puede calcular en ningun mercado.
+        '''
+        import numpy as np # type: ignore
+        rows, count = closes.shape
+        if count < 5:
+            zeros = np.zeros(rows)
+            empty = {key: zeros for key in ["max", "average", "upperMax", "upperAverage", "lowerMin", "lowerAverage"]}
+            return {"absolute": empty, "percent": dict(empty)}, np.zeros(rows, dtype=bool)
+        index = np.arange(count, dtype=np.float64)
+        slope = (priceEnd - priceBegin) / (count - 1)
+        trendLine = slope[:, None] * index[None, :] + priceBegin[:, None]
+        hasTrendDeviation = (trendLine != 0).all(axis=1)
+
+        result = {}
+        for key, deviations in [
+                ("absolute", closes - trendLine),
+                ("percent", (closes - trendLine) / trendLine * 100)
+            ]:
+            absolute = np.abs(deviations)
+            upper = MarketMetricsBatch._masked_statistics(deviations, deviations > 0)
+            lower = MarketMetricsBatch._masked_statistics(deviations, deviations < 0)
+            result[key] = {
+                "max": absolute.max(axis=1),
+                "average": absolute.sum(axis=1) / count,
+                "upperMax": upper["max"],
+                "upperAverage": upper["average"],
+                "lowerMin": lower["min"],
+                "lowerAverage": lower["average"]
+            }
+        return result, hasTrendDeviation
+
+
+    ####################################################################################################
+    # METODOS PARA TRADING Y FILTRADO
+    ####################################################################################################
+
+    @staticmethod
+    def _trading_parameters(batch:BatchMetrics) -> Dict:
+        import numpy as np # type: ignore
+        profitPercent = np.maximum(np.abs(batch["ticker"]["percentage"]), MIN_PROFIT_PERCENT)
+        maxLossPercent = batch["candles"]["trendDeviation"]["percent"]["lowerMin"]
+        lastPrice = batch["ticker"]["lastPrice"]
+        return {
+            "profitPercent": profitPercent,
+            "maxLossPercent": maxLossPercent,
+            "lastPrice": lastPrice,
+            "takeProfitLevel": lastPrice * (1 + (profitPercent / 100)),
+            "stopLossLevel": lastPrice * (1 + (maxLossPercent / 100)),
+            "maxHours": 24
+        }
+
+
+    @staticmethod
+    def _check(values:Any, condition:ComparisonCondition, limit:Optional[float]) -> Any:
+        '''
+        Version vectorizada de Validations.check.
+        '''
+        import numpy as np # type: ignore
+        if limit is None:
+            return np.zeros(len(values), dtype=bool)
+        if condition == 'above':
+            return values >= float(limit)
+        elif condition == 'below':
+            return values < float(limit)
+        return np.zeros(len(values), dtype=bool)
+
+
+    @staticmethod
+    def potential_mask(batch:BatchMetrics, configuration:ConfigurationData) -> Any:
+        '''
+        Devuelve la mascara de los mercados que tienen suficiente liquidez y potencial de crecimiento.\n
+        Es equivalente a aplicar Validations.is_potential_market a cada mercado del lote. Los filtros de
+        velas 1h se aplican vectorizados y los de temporalidades mayores ("filters.timeframes") solo a los
+        mercados que pasan los anteriores, con Validations.is_confirmed_timeframe.
+        param batch: Objeto devuelto por MarketMetricsBatch.calculate.
+        param configuration: Objeto con la configuracion del algoritmo.
+        return: Array de N valores bool. True para los mercados que pasan el filtro o son preseleccionados.
+        '''
+        import numpy as np # type: ignore
+        filters = configuration["filters"]["candles"]
+        percent = batch["candles"]["percent"]
+        passed = MarketMetricsBatch._check(percent["colapses"], "below", filters.get("maxColapses", None))
+        passed &= MarketMetricsBatch._check(percent["completion"], "above", filters.get("minCompletion", None))
+        passed &= MarketMetricsBatch._check(percent["changeWhole"], "above", filters.get("minProfitWhole", None))
+        passed &= MarketMetricsBatch._check(percent["changeHalf1"], "above", filters.get("minProfitHalf1", None))
+        passed &= MarketMetricsBatch._check(percent["changeHalf2"], "above", filters.get("minProfitHalf2", None))
+        timeFrameFilters = configuration["filters"].get("timeframes", {})
+        if timeFrameFilters:
+            timeFrames = batch.get("timeframes", {})
+            for index in np.flatnonzero(passed):
+                for timeFrame, filtersOfTimeFrame in timeFrameFilters.items():
+                    statistics = timeFrames.get(timeFrame, [None] * batch["count"])[index]
+                    if not Validations.is_confirmed_timeframe(statistics, filtersOfTimeFrame):
+                        passed[index] = False
+                        break
+        return (batch["preselected"] | passed) & batch["valid"]
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+    import time
+    import random
+    from market_metrics import MarketMetrics
+    from configuration import DEFAULT_CONFIGURATION
+    random.seed(1)
+    marketsCount, candlesCount = 1000, 168
+    tickers, listOfCandles = [], []
+    for index in range(marketsCount):
+        price, candles = random.uniform(0.5, 2), []
+        for hour in range(candlesCount):
+            close = price * random.uniform(0.97, 1.035)
+            candles.append([hour * MILLISECONDS_PER_HOUR, price, max(price, close) * 1.01, min(price, close) * 0.99, close, 1000])
+            price = close
+        tickers.append({"symbol": f"C{index}/USDT", "last": price, "percentage": random.uniform(-5, 20),
+            "bid": price, "ask": price * 1.001, "low": price * 0.9, "high": price * 1.1})
+        listOfCandles.append(candles)
+    tensor = MarketMetricsBatch.candles_tensor(listOfCandles, candlesCount)
+    begin = time.perf_counter()
+    batch = MarketMetricsBatch.calculate(tickers, tensor, ["BTC"], DEFAULT_CONFIGURATION)
+    print(f'{marketsCount} mercados en {round((time.perf_counter() - begin) * 1000, 2)} ms')
+    print(f'Mercados potenciales: {int(batch["passed"].sum())}')
+    print(MarketMetricsBatch.metrics_of(batch, 0))
+    print(MarketMetrics.calculate(tickers[0], listOfCandles[0], ["BTC"]))
@@ -0,0 +1,336 @@
+
+import sys
+from array import array
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+from basics import *
+
+DEFAULT_AMOUNT_MIN = float(0)
+DEFAULT_AMOUNT_MAX = float(1000000000)
+NO_VALUE = float('nan')
+
+
+class MarketUniverse(Basics):
+    '''
+    Indice de los mercados del exchange que se crea una sola vez despues de cargar los mercados.\n
+    Evita que en los bucles de seleccion e inversion se repitan las mismas operaciones por cada
+    mercado: separar el symbol en base y quote, buscar el mercado en el diccionario de CCXT y leer
+    sus limites, precisiones y fees dentro de bloques try/except.\n
+    Cada mercado tiene un identificador entero (su posicion en el indice). Los symbols, bases y quotes
+    se guardan internados y los limites, precisiones y fees en arrays de float, con NaN cuando el
+    exchange no los informa. La lista negra y las currencies preseleccionadas se guardan como
+    conjuntos y se comprueban igual que en Validations: la currency esta en la lista si su
+    identificador en mayusculas o en minusculas aparece en ella.
+    '''
+
+    def __init__(
+            self,
+            markets:DictOfMarkets,
+            currencies:Optional[DictOfCurrencies]=None,
+            blackList:Optional[ListOfCurrenciesId]=None,
+            preselected:Optional[ListOfCurrenciesId]=None
+        ):
+        '''
+        param markets: Diccionario de mercados cargado mediante la libreria CCXT.
+        param currencies: Diccionario de currencies cargado mediante la libreria CCXT.
+        param blackList: Lista de cryptomonedas que no deben ser aceptadas.
+        param preselected: Lista de currencies preseleccionadas.
+        '''
+        self.currencies: DictOfCurrencies = currencies if currencies is not None else {}
+        self.blackList: FrozenSet[str] = self.currency_set(blackList)
+        self.preselected: FrozenSet[str] = self.currency_set(preselected)
+        self.symbols: List[MarketId] = []
+        self.bases: List[CurrencyId] = []
+        self.quotes: List[CurrencyId] = []
+        self.markets: List[Market] = []
+        self.ids: Dict[MarketId, int] = {}
+        self.quoteIndex: Dict[CurrencyId, List[int]] = {}
+        self.amountMin = array('d')
+        self.amountMax = array('d')
+        self.amountPrecision = array('d')
+        self.pricePrecision = array('d')
+        self.takerFee = array('d')
+        for symbol, market in markets.items():
+            self.add(symbol, market)
+
+
+    def add(self, symbol:MarketId, market:Market) -> int:
+        '''
+        Agrega un mercado al indice.
+        param symbol: Identificador del mercado.
+        param market: Datos del mercado obtenidos mediante la libreria CCXT.
+        return: Identificador entero del mercado.
+        '''
+        symbol = sys.intern(str(symbol))
+        index = len(self.symbols)
+        base = sys.intern(self.base_of_symbol(symbol))
+        quote = sys.intern(self.quote_of_symbol(symbol))
+        self.symbols.append(symbol)
+        self.bases.append(base)
+        self.quotes.append(quote)
+        self.markets.append(market)
+        self.ids[symbol] = index
+        self.quoteIndex.setdefault(quote, []).append(index)
+        self.amountMin.append(self._number(market, ["limits", "amount", "min"], DEFAULT_AMOUNT_MIN))
+        self.amountMax.append(self._number(market, ["limits", "amount", "max"], DEFAULT_AMOUNT_MAX))
+        self.amountPrecision.append(self._decimals(market, "amount"))
+        self.pricePrecision.append(self._decimals(market, "price"))
+        self.takerFee.append(self._number(market, ["taker"], NO_VALUE))
+        return index
+
+
+    def update(self, symbol:MarketId, market:Market) -> int:
+        '''
+        Actualiza los datos de un mercado del indice, o lo agrega si no esta.
+        param symbol: Identificador del mercado.
+        param market: Datos del mercado obtenidos mediante la libreria CCXT.
+        return: Identificador entero del mercado.
+        '''
+        index = self.ids.get(symbol, None)
+        if index is None:
+            return self.add(symbol, market)
+        self.markets[index] = market
+        self.amountMin[index] = self._number(market, ["limits", "amount", "min"], DEFAULT_AMOUNT_MIN)
+        self.amountMax[index] = self._number(market, ["limits", "amount", "max"], DEFAULT_AMOUNT_MAX)
+        self.amountPrecision[index] = self._decimals(market, "amount")
+        self.pricePrecision[index] = self._decimals(market, "price")
+        self.takerFee[index] = self._number(market, ["taker"], NO_VALUE)
+        return index
+
+
+    def remove(self, symbol:MarketId) -> bool:
+        '''
+        Quita un mercado del indice. Su identificador entero no se reutiliza, para que los arrays
+        creados antes con "ids_array" sigan siendo validos.
+        param symbol: Identificador del mercado.
+        return: True si el mercado estaba en el indice.
+        '''
+        index = self.ids.pop(symbol, None)
+        if index is None:
+            return False
+        self.quoteIndex[self.quotes[index]].remove(index)
+        return True
+
+
+    @staticmethod
+    def currency_set(values:Optional[Iterable[str]]) -> FrozenSet[str]:
+        '''
+        param values: Lista de identificadores de currencies.
+        return: Conjunto con los identificadores, tal como aparecen en la lista.
+        '''
+        return frozenset(str(value) for value in (values or []))
+
+
+    @staticmethod
+    def in_currency_set(currencyId:CurrencyId, values:FrozenSet[str]) -> bool:
+        '''
+        param currencyId: Identificador de la currency.
+        param values: Conjunto devuelto por MarketUniverse.currency_set.
+        return: True si el identificador en mayusculas o en minusculas esta en el conjunto, igual que en Validations.
+        '''
+        return str(currencyId).upper() in values or str(currencyId).lower() in values
+
+
+    @staticmethod
+    def _number(market:Market, keys:List[str], default:float) -> float:
+        '''
+        Devuelve el valor numerico de un campo anidado del mercado, igual que Validations.get_market_limit.
+        '''
+        try:
+            value = market
+            for key in keys:
+                value = value[key]
+            return float(value)
+        except:
+            return default
+
+
+    @staticmethod
+    def _decimals(market:Market, precisionType:PrecisionType) -> float:
+        '''
+        Devuelve la precision del mercado como cantidad de decimales. Igual que en ExchangeInterface.round_to_precision,
+        solo se usa si es un entero. Las precisiones expresadas como tamaño de paso (0.001) se devuelven como NaN.
+        '''
+        try:
+            precision = market["precision"][precisionType]
+            if isinstance(precision, int) and not isinstance(precision, bool):
+                return float(precision)
+        except:
+            pass
+        return NO_VALUE
+
+
+    ####################################################################################################
+    # CONSULTAS POR MERCADO
+    ####################################################################################################
+
+    def count(self) -> int:
+        return len(self.ids)
+
+
+    def id_of(self, symbol:MarketId) -> Optional[int]:
+        '''
+        param symbol: Identificador del mercado.
+        return: Identificador entero del mercado. None si no esta en el indice.
+        '''
+        return self.ids.get(symbol, None)
+
+
+    def market_of(self, symbol:MarketId) -> Optional[Market]:
+        '''
+        param symbol: Identificador del mercado.
+        return: Datos del mercado obtenidos mediante la libreria CCXT. None si no esta en el indice.
+        '''
+        index = self.ids.get(symbol, None)
+        return self.markets[index] if index is not None else None
+
+
+    def base_of(self, symbol:MarketId) -> CurrencyId:
+        index = self.ids.get(symbol, None)
+        return self.bases[index] if index is not None else self.base_of_symbol(symbol)
+
+
+    def quote_of(self, symbol:MarketId) -> CurrencyId:
+        index = self.ids.get(symbol, None)
+        return self.quotes[index] if index is not None else self.quote_of_symbol(symbol)
+
+
+    def ids_of_quote(self, quote:CurrencyId) -> List[int]:
+        '''
+        param quote: Identificador de la currency quote.
+        return: Identificadores enteros de los mercados con esa quote, en el orden en que los devolvio el exchange.
+        '''
+        return self.quoteIndex.get(quote, [])
+
+
+    def is_blacklisted(self, currencyId:CurrencyId) -> bool:
+        return self.in_currency_set(currencyId, self.blackList)
+
+
+    def is_preselected(self, currencyId:CurrencyId) -> bool:
+        return self.in_currency_set(currencyId, self.preselected)
+
+
+    def amount_limit(self, limit:AmountLimit, symbol:MarketId) -> float:
+        '''
+        Devuelve el limite minimo o maximo que se puede invertir en el mercado, igual que Validations.get_market_limit.
+        param limit: Especifica el limite que se desea obtener.
+        param symbol: Identificador del mercado.
+        return: Valor del limite, expresado en currency base.
+        '''
+        index = self.ids.get(symbol, None)
+        if index is None:
+            return DEFAULT_AMOUNT_MIN if limit == "min" else DEFAULT_AMOUNT_MAX
+        return self.amountMin[index] if limit == "min" else self.amountMax[index]
+
+
+    def round_to_precision(self, value:float, symbol:MarketId, precisionType:PrecisionType) -> float:
+        '''
+        Redondea un valor segun la precision del mercado, igual que ExchangeInterface.round_to_precision.
+        param value: Valor que debe ser ajustado.
+        param symbol: Identificador del mercado de donde se toma la precision.
+        param precisionType: Tipo de precision "price" o "amount".
+        return: Valor redondeado. Si el mercado no tiene precision en decimales, devuelve el mismo valor.
+        '''
+        index = self.ids.get(symbol, None)
+        if index is None or precisionType not in ["amount", "price"]:
+            return value
+        precision = (self.amountPrecision if precisionType == "amount" else self.pricePrecision)[index]
+        return value if precision != precision else round(value, int(precision))
+
+
+    def taker_fee(self, symbol:MarketId) -> Optional[float]:
+        '''
+        param symbol: Identificador del mercado.
+        return: Fee "taker" del mercado como fraccion. None si el exchange no lo informa.
+        '''
+        index = self.ids.get(symbol, None)
+        if index is None or self.takerFee[index] != self.takerFee[index]:
+            return None
+        return self.takerFee[index]
+
+
+    ####################################################################################################
+    # OPERACIONES VECTORIZADAS
+    # Necesitan la libreria numpy, que se importa al usarlas. Los arrays del indice se leen sin copiarlos.
+    ####################################################################################################
+
+    def column(self, name:str) -> Any:
+        '''
+        param name: Nombre del array: "amountMin", "amountMax", "amountPrecision", "pricePrecision" o "takerFee".
+        return: Array de numpy de solo lectura con un valor por mercado, ordenado por identificador entero.
+        '''
+        import numpy # type: ignore
+        values = numpy.frombuffer(getattr(self, name), dtype=numpy.float64)
+        values.flags.writeable = False
+        return values
+
+
+    def ids_array(self, symbols:List[MarketId]) -> Any:
+        '''
+        param symbols: Lista de identificadores de mercados. Todos deben estar en el indice.
+        return: Array de numpy con los identificadores enteros de los mercados.
+        '''
+        import numpy # type: ignore
+        return numpy.fromiter((self.ids[symbol] for symbol in symbols), dtype=numpy.int64, count=len(symbols))
+
+
+    def round_amounts(self, values:Any, ids:Any, precisionType:PrecisionType="amount") -> Any:
+        '''
+        Redondea varios valores, cada uno segun la precision de su mercado.\n
+        Se redondea escalando por 10^decimales, por lo que en valores exactamente a medio camino
+        el resultado puede diferir en el ultimo decimal del de la funcion round de Python.
+        param values: Array de valores.
+        param ids: Array con el identificador entero del mercado de cada valor.
+        param precisionType: Tipo de precision "price" o "amount".
+        return: Array con los valores redondeados. Los mercados sin precision en decimales no se modifican.
+        '''
+        import numpy # type: ignore
+        values = numpy.asarray(values, dtype=numpy.float64)
+        decimals = self.column("amountPrecision" if precisionType == "amount" else "pricePrecision")[ids]
+        valid = ~numpy.isnan(decimals)
+        scale = numpy.power(10.0, numpy.where(valid, decimals, 0))
+        return numpy.where(valid, numpy.round(values * scale) / scale, values)
+
+
+    def within_limits(self, amountsAsBase:Any, ids:Any) -> Any:
+        '''
+        Comprueba varios montos a la vez, igual que Validations.check_market_limits pero sin mensajes.
+        param amountsAsBase: Array de montos expresados en currency base.
+        param ids: Array con el identificador entero del mercado de cada monto.
+        return: Array de valores bool. True si el monto esta dentro de los limites de su mercado.
+        '''
+        import numpy # type: ignore
+        amountsAsBase = numpy.asarray(amountsAsBase, dtype=numpy.float64)
+        return (amountsAsBase >= self.column("amountMin")[ids]) & (amountsAsBase <= self.column("amountMax")[ids])
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+    import time
+    import random
+    from validations import Validations
+    from benchmarks import synthetic_markets
+    markets, currencies = synthetic_markets(random.Random(0), 5000, "USDT")
+    for index, market in enumerate(markets.values()):
+        market["precision"] = {"amount": index % 9, "price": 0.001}
+        market["taker"] = 0.001
+    begin = time.perf_counter()
+    universe = MarketUniverse(markets, currencies, ["c1"], ["C2"])
+    print(f'Indice de {universe.count()} mercados creado en {round((time.perf_counter() - begin) * 1000, 1)} ms')
+    symbols = list(markets.keys())
+    differences = 0
+    for symbol in symbols:
+        market = markets[symbol]
+        differences += int(universe.amount_limit("min", symbol) != Validations.get_market_limit("min", market))
+        differences += int(universe.amount_limit("max", symbol) != Validations.get_market_limit("max", market))
+        differences += int(universe.round_to_precision(1.23456789, symbol, "amount") != round(1.23456789, market["precision"]["amount"]))
+        differences += int(universe.round_to_precision(1.23456789, symbol, "price") != 1.23456789)
+    print(f'Diferencias con las funciones originales: {differences}')
+    print(f'Lista negra: {universe.is_blacklisted("C1")}   Preseleccionado: {universe.is_preselected("c2")}')
+    if NUMPY_AVAILABLE:
+        import numpy # type: ignore
+        ids = universe.ids_array(symbols)
+        amounts = numpy.full(len(symbols), 20.0)
+        print(f'Montos dentro de los limites: {int(universe.within_limits(amounts, ids).sum())} de {len(symbols)}')
+        print(f'Redondeo vectorizado: {universe.round_amounts(numpy.full(3, 1.23456789), ids[0:3])}')
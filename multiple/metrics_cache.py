@@ -0,0 +1,302 @@
+
+import copy
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from basics import *
+from file_manager import FileManager
+from exchange_interface import CANDLE_TIMESTAMP
+from market_metrics import MarketMetrics, Metrics
+from candle_series import Candles
+from metrics_engines import MetricsEngine, PythonMetricsEngine
+from rolling_metrics import RollingMetricsBook
+
+CACHE_FILE_VERSION = 2
+DEFAULT_MAX_ENTRIES = 2000
+
+
+class MetricsCache(Basics):
+    '''
+    Memoria de las estadisticas de velas calculadas en escaneos anteriores.\n
+    Entre escaneos seguidos, la mayoria de los mercados candidatos son los mismos y sus velas no han
+    cambiado. Las estadisticas de velas (la parte costosa de MarketMetrics.calculate) se guardan con
+    una clave formada por el mercado, el rango de velas, los valores de la vela mas reciente (que es
+    la vela en curso y cambia hasta que cierra) y un hash de la configuracion de filtros de velas.
+    Las metricas del ticker, de trading y el potencial se recalculan siempre, porque son baratas.\n
+    Las entradas se descartan por antiguedad de uso (LRU) y se pueden guardar en un fichero JSON
+    para reutilizarlas en la siguiente ejecucion del bot ("persist", deshabilitado por defecto).\n
+    Las estadisticas que devuelve el cache son copias, para que los cambios que haga quien las usa
+    no alteren las entradas guardadas.
+    '''
+
+    def __init__(
+            self,
+            botId:str,
+            exchangeId:str,
+            maxEntries:int=DEFAULT_MAX_ENTRIES,
+            persist:bool=False,
+            enable:bool=True,
+            engine:Optional[MetricsEngine]=None
+        ):
+        self.botId = botId
+        self.exchangeId = exchangeId
+        self.log = logging.getLogger(botId)
+        self.enable = enable
+        self.engine:MetricsEngine = engine if engine is not None else PythonMetricsEngine()
+        self.maxEntries = maxEntries
+        self.persist = persist
+        self.fileName = f'./{self.botId}_{self.exchangeId}_metrics_cache.json'
+        self.entries:OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.onStore:Optional[Callable[[str, Optional[Dict]], None]] = None   # Recibe cada entrada nueva. Ver ScanCheckpoint.
+        self.rolling:Optional[RollingMetricsBook] = None      # Acumuladores de velas 1h entre escaneos. Ver "rollingMetrics".
+
+
+    def configure(self, configuration:ConfigurationData) -> bool:
+        '''
+        Establece los parametros del cache desde la configuracion del bot y carga el fichero si existe.\n
+        param configuration: Objeto con la configuracion del algoritmo.
+        return: True si el cache queda habilitado. De lo contrario False.
+        '''
+        cacheConfiguration = configuration.get("metricsCache", {})
+        self.enable = bool(cacheConfiguration.get("enable", True))
+        self.maxEntries = int(cacheConfiguration.get("maxEntries", DEFAULT_MAX_ENTRIES))
+        self.persist = bool(cacheConfiguration.get("persist", False))
+        if bool(configuration.get("rollingMetrics", {}).get("enable", False)):
+            self.rolling = self.rolling if self.rolling is not None else RollingMetricsBook(self.botId)
+        else:
+            self.rolling = None
+        if self.enable and self.persist:
+            self.load_from_file()
+        return self.enable
+
+
+    ####################################################################################################
+    # METODOS PARA CALCULAR LAS METRICAS USANDO EL CACHE
+    ####################################################################################################
+
+    @staticmethod
+    def configuration_hash(configuration:Optional[ConfigurationData]) -> str:
+        '''
+        Devuelve un hash de los parametros de la configuracion relacionados con las velas.
+        param configuration: Objeto con la configuracion del algoritmo.
+        return: Cadena hexadecimal que cambia si cambian los filtros de velas, las temporalidades o el rango de dias.
+        '''
+        if configuration is None:
+            return ""
+        related = {
+            "candlesDays": configuration.get("candlesDays", None),
+            "candles": configuration.get("filters", {}).get("candles", None),
+            "timeframes": configuration.get("filters", {}).get("timeframes", None)
+        }
+        return hashlib.sha1(json.dumps(related, sort_keys=True).encode()).hexdigest()[0:16]
+
+
+    @staticmethod
+    def key(symbol:MarketId, candles:Candles, configurationHash:str, timeFrame:str="1h") -> Optional[str]:
+        '''
+        Devuelve la clave del cache para las velas de un mercado.
+        param symbol: Identificador del mercado.
+        param candles: Velas 1h del mercado con las que se calculan las estadisticas.
+        param configurationHash: Hash devuelto por MetricsCache.configuration_hash.
+        param timeFrame: Temporalidad de las estadisticas. Las temporalidades mayores se obtienen de las velas 1h.
+        return: Clave del cache. None si no hay velas.
+        '''
+        if len(candles) == 0:
+            return None
+        first = candles[0]
+        last = candles[-1]
+        lastValues = ",".join(str(value) for value in last)
+        return f'{symbol}|{timeFrame}|{len(candles)}|{first[CANDLE_TIMESTAMP]}|{lastValues}|{configurationHash}'
+
+
+    def candles_statistics(
+            self,
+            symbol:MarketId,
+            candles:Candles,
+            configurationHash:str="",
+            timeFrame:str="1h"
+        ) -> Optional[Dict]:
+        '''
+        Devuelve las estadisticas de las velas del mercado. Si estan en el cache no se recalculan.
+        Si no estan, se calculan con el motor de metricas del cache, o con los acumuladores de velas
+        si "rollingMetrics" esta habilitado. Para las temporalidades mayores que 1h, las velas solo
+        se agrupan cuando las estadisticas no estan en el cache.
+        param symbol: Identificador del mercado.
+        param candles: Velas 1h del mercado.
+        param configurationHash: Hash devuelto por MetricsCache.configuration_hash.
+        param timeFrame: Temporalidad de las estadisticas. Ej: "1h", "4h", "1d".
+        return: Objeto con las estadisticas descriptivas de las velas, igual que MarketMetrics._candles_statistics.
+        '''
+        key = self.key(symbol, candles, configurationHash, timeFrame) if self.enable else None
+        if key is not None and key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(self.entries[key])
+        if timeFrame == "1h" and self.rolling is not None:
+            statistics = self.rolling.candles_statistics(symbol, candles)
+        elif timeFrame == "1h":
+            statistics = self.engine.candles_statistics(candles)
+        else:
+            statistics = MarketMetrics.timeframe_statistics(candles, timeFrame, self.engine.candles_statistics)
+        self.store(symbol, candles, copy.deepcopy(statistics), configurationHash, timeFrame)
+        return statistics
+
+
+    def contains(self, symbol:MarketId, candles:Candles, configurationHash:str="", timeFrame:str="1h") -> bool:
+        '''
+        param symbol: Identificador del mercado.
+        param candles: Velas 1h del mercado.
+        param configurationHash: Hash devuelto por MetricsCache.configuration_hash.
+        param timeFrame: Temporalidad de las estadisticas.
+        return: True si las estadisticas de las velas estan en el cache.
+        '''
+        return self.enable and self.key(symbol, candles, configurationHash, timeFrame) in self.entries
+
+
+    def store(
+            self,
+            symbol:MarketId,
+            candles:Candles,
+            statistics:Optional[Dict],
+            configurationHash:str="",
+            timeFrame:str="1h"
+        ):
+        '''
+        Guarda en el cache las estadisticas de las velas calculadas fuera del cache, por ejemplo en otro proceso.
+        param symbol: Identificador del mercado.
+        param candles: Velas 1h del mercado.
+        param statistics: Estadisticas de las velas de la temporalidad.
+        param configurationHash: Hash devuelto por MetricsCache.configuration_hash.
+        param timeFrame: Temporalidad de las estadisticas.
+        '''
+        key = self.key(symbol, candles, configurationHash, timeFrame) if self.enable else None
+        if key is not None:
+            self.misses += 1
+            self.restore(key, statistics)
+            if self.onStore is not None:
+                self.onStore(key, statistics)
+
+
+    def restore(self, key:str, statistics:Optional[Dict]):
+        '''
+        Guarda en el cache una entrada con su clave ya calculada, por ejemplo desde el punto de control del escaneo.
+        param key: Clave devuelta por MetricsCache.key.
+        param statistics: Estadisticas de las velas.
+        '''
+        if self.enable:
+            self.entries[key] = statistics
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+
+
+    def calculate(
+            self,
+            ticker:Ticker,
+            candles1h:Candles,
+            preselected:ListOfCurrenciesId,
+            configuration:Optional[ConfigurationData]=None
+        ) -> Metrics:
+        '''
+        Devuelve un objeto con las metricas del mercado, igual que MarketMetrics.calculate,
+        pero tomando del cache las estadisticas de las velas si ya fueron calculadas.\n
+        param ticker: Ultimo ticker del mercado, obtenido del exchange, mediante la librería ccxt.
+        param candles1h: Velas 1h del mercado.
+        param preselected: Lista de currencies que deben pasar el filtro siempre y quedar en primera posicion.
+        param configuration: Objeto con la configuracion del algoritmo. Se usa para la clave del cache y para
+                             obtener las temporalidades mayores de "filters.timeframes".
+        return: Devuelve un objeto con las metricas del mercado.
+        '''
+        configurationHash = self.configuration_hash(configuration)
+        metrics: Metrics = {"completed": False}
+        metrics["base"] = self.base_of_symbol(ticker["symbol"])
+        metrics["quote"] = self.quote_of_symbol(ticker["symbol"])
+        metrics["ticker"] = MarketMetrics._ticker_statistics(ticker)
+        metrics["candles"] = self.candles_statistics(ticker["symbol"], candles1h, configurationHash)
+        timeFrames = self.configured_timeframes(configuration)
+        if timeFrames:
+            metrics["timeframes"] = {
+                timeFrame: self.candles_statistics(ticker["symbol"], candles1h, configurationHash, timeFrame)
+                for timeFrame in timeFrames
+            }
+        metrics["trading"] = MarketMetrics._trading_parameters(metrics)
+        metrics["potential"] = MarketMetrics._calculate_potential(metrics, preselected)
+        metrics["completed"] = True
+        return metrics
+
+
+    @staticmethod
+    def configured_timeframes(configuration:Optional[ConfigurationData]) -> List[str]:
+        '''
+        param configuration: Objeto con la configuracion del algoritmo.
+        return: Lista de temporalidades mayores configuradas en "filters.timeframes".
+        '''
+        if configuration is None:
+            return []
+        return list(configuration.get("filters", {}).get("timeframes", {}).keys())
+
+
+    def invalidate(self, symbols:ListOfMarketsId) -> int:
+        '''
+        Elimina del cache las entradas de los mercados especificados.
+        param symbols: Lista de identificadores de mercados.
+        return: Cantidad de entradas eliminadas.
+        '''
+        prefixes = tuple(f'{symbol}|' for symbol in symbols)
+        keys = [key for key in self.entries.keys() if key.startswith(prefixes)]
+        for key in keys:
+            del self.entries[key]
+        if self.rolling is not None:
+            self.rolling.discard(symbols)
+        return len(keys)
+
+
+    def report(self) -> str:
+        '''
+        return: Cadena con los aciertos y fallos del cache desde la ultima llamada.
+        '''
+        message = f'Cache de metricas: {self.hits} aciertos, {self.misses} calculos, {len(self.entries)} entradas.'
+        if self.rolling is not None:
+            message += f' {self.rolling.report()}'
+        self.hits = 0
+        self.misses = 0
+        return message
+
+
+    ####################################################################################################
+    # METODOS PARA GUARDAR Y CARGAR EL CACHE
+    ####################################################################################################
+
+    def save_to_file(self) -> bool:
+        '''
+        Guarda las entradas del cache en un fichero JSON, en orden de uso.
+        return: True si logra guardar el fichero o si no se debe guardar. False si ocurre error.
+        '''
+        if not self.enable or not self.persist:
+            return True
+        data = {
+            "version": CACHE_FILE_VERSION,
+            "entries": [[key, value] for key, value in self.entries.items()]
+        }
+        return FileManager.data_to_file_json(data, self.fileName, self.log)
+
+
+    def load_from_file(self) -> bool:
+        '''
+        Carga las entradas del cache desde el fichero JSON si existe.
+        return: True si encuentra el fichero y carga las entradas. False si no se cargan entradas.
+        '''
+        data = FileManager.data_from_file_json(self.fileName, False, self.log)
+        if data is None:
+            return False
+        if type(data) != dict or data.get("version", None) != CACHE_FILE_VERSION:
+            self.log.warning(self.cmd(f'El fichero del cache de metricas "{self.fileName}" no es compatible y se ignora.'))
+            return False
+        for key, value in data.get("entries", [])[-self.maxEntries:]:
+            self.entries[key] = value
+        self.log.info(self.cmd(f'Se han cargado {len(self.entries)} entradas del cache de metricas.'))
+        return True
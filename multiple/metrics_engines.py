@@ -0,0 +1,294 @@
+
+import io
+import copy
+import math
+import random
+import logging
+import contextlib
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+from basics import *
+from market_metrics import MarketMetrics, Metrics
+from candle_series import Candles, CandleSeries
+
+MILLISECONDS_PER_HOUR = 60 * 60 * 1000
+PARITY_TOLERANCE = 1e-9
+
+
+class MetricsEngine(Basics, ABC):
+    '''
+    Interfaz de los motores de calculo de metricas de mercados.\n
+    Todos los motores devuelven las mismas metricas que MarketMetrics.calculate. Solo cambia la forma
+    de calcular las estadisticas de las velas, que es la parte costosa. Las metricas del ticker, de
+    trading y el potencial se calculan siempre con MarketMetrics.
+    '''
+
+    name = ""
+
+    @abstractmethod
+    def candles_statistics(self, candles:Candles) -> Optional[Dict]:
+        '''
+        Devuelve estadisticas descriptivas de las velas, igual que MarketMetrics._candles_statistics.
+        param candles: Lista o CandleSeries de velas obtenidas del exchange, mediante la librería ccxt.
+        return: Devuelve un objeto con las estadisticas descriptivas de las velas. Si ocurre un error, devuelve None.
+        '''
+
+
+    def calculate(
+            self,
+            ticker:Ticker,
+            candles1h:Candles,
+            preselected:ListOfCurrenciesId,
+            timeFrames:Optional[List[str]]=None
+        ) -> Metrics:
+        '''
+        Devuelve un objeto con las metricas del mercado, igual que MarketMetrics.calculate.\n
+        param ticker: Ultimo ticker del mercado, obtenido del exchange, mediante la librería ccxt.
+        param candles1h: Lista o CandleSeries de velas h1 obtenidas del exchange, mediante la librería ccxt.
+        param preselected: Lista de currencies que deben pasar el filtro siempre y quedar en primera posicion.
+        param timeFrames: Temporalidades mayores de las que tambien se calculan estadisticas. Ej: ["4h", "1d"].
+        return: Devuelve un objeto con las metricas del mercado.
+        '''
+        metrics: Metrics = {"completed": False}
+        metrics["base"] = self.base_of_symbol(ticker["symbol"])
+        metrics["quote"] = self.quote_of_symbol(ticker["symbol"])
+        metrics["ticker"] = MarketMetrics._ticker_statistics(ticker)
+        metrics["candles"] = self.candles_statistics(candles1h)
+        if timeFrames:
+            metrics["timeframes"] = MarketMetrics.timeframes_statistics(candles1h, timeFrames, self.candles_statistics)
+        metrics["trading"] = MarketMetrics._trading_parameters(metrics)
+        metrics["potential"] = MarketMetrics._calculate_potential(metrics, preselected)
+        metrics["completed"] = True
+        return metrics
+
+
+
+class PythonMetricsEngine(MetricsEngine):
+    '''
+    Motor de referencia. Calcula las estadisticas con el codigo de MarketMetrics en Python puro.
+    '''
+
+    name = "python"
+
+    def candles_statistics(self, candles:Candles) -> Optional[Dict]:
+        return MarketMetrics._candles_statistics(candles)
+
+
+
+class ArrayMetricsEngine(MetricsEngine):
+    '''
+    Motor rapido. Calcula las estadisticas con operaciones vectorizadas de numpy (MarketMetricsBatch).
+    '''
+
+    name = "array"
+
+    def __init__(self):
+        if not NUMPY_AVAILABLE:
+            raise ImportError('El motor de metricas "array" necesita la libreria numpy.')
+
+
+    def candles_statistics(self, candles:Candles) -> Optional[Dict]:
+        import numpy # type: ignore
+        from market_metrics_batch import MarketMetricsBatch
+        try:
+            if len(candles) == 0:
+                return None
+            tensor = MarketMetricsBatch.candles_tensor([candles], len(candles))
+            with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+                statistics = MarketMetricsBatch._candles_statistics(tensor)
+            return MarketMetricsBatch.candles_statistics_of(statistics, 0)
+        except Exception as e:
+            print(f"Error: Calculando las estadisticas de las velas. Exception: {str(e)}")
+            return None
+
+
+
+METRICS_ENGINES = {
+    PythonMetricsEngine.name: PythonMetricsEngine,
+    ArrayMetricsEngine.name: ArrayMetricsEngine
+}
+
+
+def available_metrics_engines() -> List[str]:
+    '''
+    return: Lista con los nombres de los motores de metricas que se pueden usar con las librerias instaladas.
+    '''
+    return [name for name in METRICS_ENGINES.keys() if name != ArrayMetricsEngine.name or NUMPY_AVAILABLE]
+
+
+def create_metrics_engine(name:str="auto", logName:Optional[str]=None) -> MetricsEngine:
+    '''
+    Crea el motor de metricas especificado en la configuracion.\n
+    Con "auto" se selecciona el motor "python", que es el de referencia. El motor "array" solo se usa
+    si se pide de forma explicita. Si el motor pedido no existe o no esta disponible, se usa el motor "python".\n
+    param name: Nombre del motor: "auto", "python" o "array".
+    param logName: Nombre del log donde se reporta el motor seleccionado.
+    return: Instancia del motor de metricas.
+    '''
+    log = logging.getLogger(logName)
+    if name == "auto":
+        name = PythonMetricsEngine.name
+    if name not in available_metrics_engines():
+        log.warning(Basics.cmd(f'Atencion: El motor de metricas "{name}" no esta disponible. Se usa el motor "python".'))
+        name = PythonMetricsEngine.name
+    log.info(f'Motor de metricas seleccionado: {name}')
+    return METRICS_ENGINES[name]()
+
+
+
+####################################################################################################
+# PRUEBAS DE PARIDAD ENTRE MOTORES
+# Comparan las metricas de dos motores sobre series de velas aleatorias, incluyendo huecos,
+# velas colapsadas y mercados con un unico precio.
+####################################################################################################
+
+PARITY_CASES = ["normal", "gaps", "colapses", "singlePrice", "short", "zeroPrice"]
+PARITY_TIMEFRAMES = {"4h": {"minProfitWhole": 0.0}, "1d": {"minProfitHalf2": 0.0}}
+
+
+def random_candles(generator:random.Random, case:str, count:int=168) -> ListOfCandles:
+    '''
+    Crea una serie de velas 1h aleatoria para las pruebas de paridad.
+    param generator: Generador de numeros aleatorios con semilla.
+    param case: Tipo de serie. Uno de PARITY_CASES.
+    param count: Cantidad de velas de la serie.
+    return: Lista de velas OHLCV ordenadas de la mas antigua a la mas reciente.
+    '''
+    if case == "short":
+        count = generator.randint(1, 6)
+    candles: ListOfCandles = []
+    price = 10 ** generator.uniform(-8, 4)
+    timestamp = 1700000000000
+    for index in range(count):
+        timestamp += MILLISECONDS_PER_HOUR * (generator.choice([1, 2, 5]) if case == "gaps" and generator.random() < 0.2 else 1)
+        if case == "singlePrice" or (case == "colapses" and generator.random() < 0.5):
+            candles.append([timestamp, price, price, price, price, 0.0])
+            continue
+        close = price * generator.uniform(0.95, 1.06)
+        high = max(price, close) * generator.uniform(1.0, 1.02)
+        low = min(price, close) * generator.uniform(0.98, 1.0)
+        candles.append([timestamp, price, high, low, close, generator.uniform(0, 1000)])
+        price = close
+    if case == "zeroPrice":
+        candles[generator.randrange(count)][1:5] = [0.0, 0.0, 0.0, 0.0]
+    return candles
+
+
+def _parity_differences(reference:Any, candidate:Any, path:str, scale:float, tolerance:float) -> List[str]:
+    if isinstance(reference, dict) and isinstance(candidate, dict):
+        if set(reference.keys()) != set(candidate.keys()):
+            return [f'{path}: claves distintas {sorted(reference.keys())} != {sorted(candidate.keys())}']
+        differences = []
+        for key in reference.keys():
+            keyScale = 100.0 if key == "percent" else scale
+            differences += _parity_differences(reference[key], candidate[key], f'{path}.{key}', keyScale, tolerance)
+        return differences
+    if isinstance(reference, (int, float)) and isinstance(candidate, (int, float)):
+        if math.isclose(reference, candidate, rel_tol=tolerance, abs_tol=tolerance * scale):
+            return []
+    elif reference == candidate:
+        return []
+    return [f'{path}: {reference} != {candidate}']
+
+
+def _parity_ticker(generator:random.Random, candles:ListOfCandles) -> Ticker:
+    '''
+    Crea un ticker aleatorio coherente con el ultimo precio de las velas, para comparar las metricas completas.
+    '''
+    last = float(candles[-1][4])
+    return {
+        "symbol": "XXX/USDT",
+        "last": last,
+        "bid": last,
+        "ask": last * generator.uniform(1.0, 1.01),
+        "low": last * generator.uniform(0.85, 1.0),
+        "high": last * generator.uniform(1.0, 1.2),
+        "percentage": generator.uniform(-15, 25)
+    }
+
+
+def _parity_outcome(
+        engine:MetricsEngine, 
+        ticker:Ticker, 
+        candles:Candles, 
+        configuration:ConfigurationData
+    ) -> Tuple[Any, Any]:
+    '''
+    Calcula las metricas completas de un motor y la decision de Validations.is_potential_market.
+    return: Metricas y decision. Si el calculo falla, el nombre de la excepcion en lugar de las metricas.
+    '''
+    from validations import Validations
+    try:
+        timeFrames = list(configuration["filters"].get("timeframes", {}).keys())
+        metrics = engine.calculate(ticker, candles, configuration.get("preselected", []), timeFrames)
+    except Exception as e:
+        return f'Exception {type(e).__name__}', None
+    try:
+        passed = Validations.is_potential_market({"baseId": metrics["base"], "metrics": metrics}, configuration)
+    except Exception as e:
+        passed = f'Exception {type(e).__name__}'
+    return metrics, passed
+
+
+def check_parity(
+        reference:MetricsEngine,
+        candidate:MetricsEngine,
+        seriesCount:int=200,
+        seed:int=0,
+        tolerance:float=PARITY_TOLERANCE,
+        configuration:Optional[ConfigurationData]=None
+    ) -> List[str]:
+    '''
+    Compara dos motores sobre series aleatorias: las estadisticas de velas, las metricas completas
+    (ticker, temporalidades, trading y potencial) y la decision de Validations.is_potential_market.\n
+    Los mensajes de error que imprimen los motores con las series invalidas se descartan durante la comparacion.
+    param reference: Motor de referencia. Normalmente PythonMetricsEngine.
+    param candidate: Motor que se debe comparar con el de referencia.
+    param seriesCount: Cantidad de series aleatorias por cada tipo de serie.
+    param seed: Semilla del generador de numeros aleatorios.
+    param tolerance: Tolerancia relativa de la comparacion de valores.
+    param configuration: Configuracion de los filtros. Por defecto DEFAULT_CONFIGURATION con los filtros de PARITY_TIMEFRAMES.
+    return: Lista con las diferencias encontradas. Si los motores son equivalentes, la lista esta vacia.
+    '''
+    if configuration is None:
+        from configuration import DEFAULT_CONFIGURATION
+        configuration = copy.deepcopy(DEFAULT_CONFIGURATION)
+        configuration["filters"]["timeframes"] = copy.deepcopy(PARITY_TIMEFRAMES)
+    generator = random.Random(seed)
+    differences: List[str] = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for case in PARITY_CASES:
+            for index in range(seriesCount):
+                candles = random_candles(generator, case)
+                ticker = _parity_ticker(generator, candles)
+                scale = max(abs(float(value)) for candle in candles for value in candle[1:5])
+                for form, series in [("list", candles), ("series", CandleSeries.from_list(candles))]:
+                    path = f'{case}[{index}] {form}'
+                    expected = reference.candles_statistics(series)
+                    obtained = candidate.candles_statistics(series)
+                    differences += _parity_differences(expected, obtained, path, scale, tolerance)
+                    expectedMetrics, expectedPassed = _parity_outcome(reference, ticker, series, configuration)
+                    obtainedMetrics, obtainedPassed = _parity_outcome(candidate, ticker, series, configuration)
+                    differences += _parity_differences(expectedMetrics, obtainedMetrics, f'{path} metrics', scale, tolerance)
+                    if expectedPassed != obtainedPassed:
+                        differences.append(f'{path} is_potential_market: {expectedPassed} != {obtainedPassed}')
+    return differences
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+    import sys
+    import time
+    engines = [METRICS_ENGINES[name]() for name in available_metrics_engines()]
+    print(f'Motores disponibles: {[engine.name for engine in engines]}')
+    failures = 0
+    for engine in engines[1:]:
+        begin = time.perf_counter()
+        differences = check_parity(engines[0], engine)
+        seconds = round(time.perf_counter() - begin, 2)
+        print(f'Paridad {engines[0].name} vs {engine.name}: {len(differences)} diferencias ({seconds} s)')
+        for difference in differences[0:20]:
+            print(f'{INDENT}{difference}')
+        failures += len(differences)
+    sys.exit(1 if failures > 0 else 0)
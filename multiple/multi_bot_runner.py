@@ -0,0 +1,209 @@
+
+import sys
+import json
+import time
+from typing import Dict, List, Optional
+from basics import *
+from exchange_interface import ExchangeInterface
+from candle_cache import CandleCache
+from configuration import DIRECTORY_LOGS
+from daemon_scheduler import DaemonScheduler
+from trendtaker import TrendTaker
+
+DEFAULT_TICKERS_MAX_AGE_SECONDS = 30
+
+
+class SharedExchangeInterface(ExchangeInterface):
+    '''
+    Interfaz con el exchange compartida por varios bots.\n
+    Los tickers de todos los mercados se piden una sola vez y se guardan como una foto (snapshot) que
+    usan todos los bots mientras tenga menos de "tickersMaxAgeSeconds" segundos. Las peticiones de
+    tickers de algunos mercados se responden desde la misma foto. Con "new_snapshot" se descarta la
+    foto, para que la siguiente peticion la vuelva a pedir al exchange.
+    '''
+
+    def __init__(self, exchangeId:str, apiKey:str, secret:str, logName:str, tickersMaxAgeSeconds:float=DEFAULT_TICKERS_MAX_AGE_SECONDS):
+        '''
+        param tickersMaxAgeSeconds: Edad maxima en segundos de la foto de los tickers.
+        '''
+        ExchangeInterface.__init__(self, exchangeId, apiKey, secret, logName)
+        self.tickersMaxAgeSeconds = float(tickersMaxAgeSeconds)
+        self.snapshot: Optional[DictOfTickers] = None
+        self.snapshotTime = 0.0
+        self.snapshotRequests = 0
+
+
+    def new_snapshot(self):
+        '''
+        Descarta la foto de los tickers.
+        '''
+        self.snapshot = None
+
+
+    def get_tickers(self, symbols:Optional[ListOfMarketsId]=None) -> Optional[DictOfTickers]:
+        '''
+        Devuelve los tickers desde la foto compartida. Si no hay foto o es antigua, se piden al exchange
+        los tickers de todos los mercados. Los mercados que no estan en la foto se piden al exchange.
+        param symbols: Lista de los mercados de los tickers. None para todos los mercados.
+        return: Tickers obtenidos. Si ocurre error, devuelve None.
+        '''
+        now = time.monotonic()
+        if self.snapshot is None or now - self.snapshotTime > self.tickersMaxAgeSeconds:
+            tickers = ExchangeInterface.get_tickers(self)
+            if tickers is None:
+                return None
+            self.snapshot, self.snapshotTime = tickers, now
+            self.snapshotRequests += 1
+        if symbols is None:
+            return self.snapshot
+        if any(symbol not in self.snapshot for symbol in symbols):
+            return ExchangeInterface.get_tickers(self, symbols)
+        return {symbol: self.snapshot[symbol] for symbol in symbols}
+
+
+
+class MultiBotRunner(Basics):
+    '''
+    Ejecuta varios bots (varias configuraciones) en un solo proceso, sobre el mismo exchange.\n
+    Los bots comparten la conexion con el exchange (SharedExchangeInterface), la foto de los tickers y
+    el cache de velas, por lo que los datos de un mercado se descargan una sola vez por ronda. Cada bot
+    mantiene su configuracion, sus filtros, su registro de inversiones, su cache de metricas y su log,
+    y decide sus inversiones de manera independiente sobre los mismos datos.\n
+    Los parametros compartidos ("multiBot", "candleCache" y "daemon") se toman de la configuracion del
+    primer bot que se logra preparar.
+    '''
+
+    def __init__(self, runnerId:str, exchangeId:str, apiKey:str, secret:str, botIds:List[str]):
+        '''
+        param runnerId: Identificador del proceso. Se usa para el log de la interfaz compartida con el exchange.
+        param exchangeId: Identificador del exchange.
+        param botIds: Identificadores de los bots. Cada uno tiene su fichero de configuracion.
+        '''
+        self.runnerId = runnerId
+        self.exchangeId = exchangeId
+        self.apiKey = apiKey
+        self.secret = secret
+        self.botIds = botIds
+        self.bots: List[TrendTaker] = []
+        self.exchangeInterface: Optional[SharedExchangeInterface] = None
+        self.candleCache: Optional[CandleCache] = None
+        self.scheduler: Optional[DaemonScheduler] = None
+
+
+    def configuration(self) -> Dict:
+        '''
+        return: Configuracion del primer bot preparado, de la que se toman los parametros compartidos.
+        '''
+        return self.bots[0].config.data if len(self.bots) > 0 else {}
+
+
+    def prepare_execution(self) -> bool:
+        '''
+        Crea la interfaz compartida con el exchange y el cache de velas, y prepara cada bot.
+        Los bots que no se pueden preparar, o que solo deben cerrar sus inversiones, no se ejecutan.
+        return: True si al menos un bot esta preparado. False si no hay bots que ejecutar.
+        '''
+        Basics.prepare_directory(DIRECTORY_LOGS)
+        try:
+            self.log = self.create_logger(self.runnerId, f'{DIRECTORY_LOGS}{self.runnerId}.log', 7, True)
+        except Exception as e:
+            self.cmd(f'Error creando el handler del logging de "{self.runnerId}". Exception: {str(e)}')
+            return False
+        self.log.info(self.cmd(f'Iniciando {len(self.botIds)} bots en {self.exchangeId}: {", ".join(self.botIds)}', '\n'))
+        self.exchangeInterface = SharedExchangeInterface(self.exchangeId, self.apiKey, self.secret, self.runnerId)
+        if self.exchangeInterface.exchange is None:
+            return False
+        self.candleCache = CandleCache(self.runnerId, self.exchangeInterface)
+        for botId in self.botIds:
+            bot = TrendTaker(botId, self.exchangeId, self.apiKey, self.secret, self.exchangeInterface, self.candleCache)
+            if not bot.prepare_execution():
+                self.log.error(self.cmd(f'Error: No se pudo preparar el bot {botId}.'))
+            elif not bot.force_close_investments_and_exit():
+                self.bots.append(bot)
+        if len(self.bots) == 0:
+            self.log.error(self.cmd('Terminado: No hay bots preparados.'))
+            return False
+        configuration = self.configuration()
+        self.exchangeInterface.tickersMaxAgeSeconds = float(configuration.get("multiBot", {}).get("tickersMaxAgeSeconds", DEFAULT_TICKERS_MAX_AGE_SECONDS))
+        self.candleCache.configure(configuration)
+        return True
+
+
+    def scan_and_invest(self) -> bool:
+        '''
+        Escanea los mercados e invierte con cada bot, sobre una misma foto de los tickers.
+        return: True si todos los bots completan el escaneo.
+        '''
+        self.exchangeInterface.new_snapshot()   # type: ignore
+        result = True
+        for bot in self.bots:
+            result = bot.scan_and_invest() and result
+        self.log.info(self.cmd(self.candleCache.report()))   # type: ignore
+        return result
+
+
+    def actualize_current_investments(self) -> bool:
+        '''
+        Actualiza las inversiones abiertas de cada bot, con una sola peticion de tickers.
+        return: True si algun bot tiene inversiones abiertas.
+        '''
+        self.exchangeInterface.new_snapshot()   # type: ignore
+        result = False
+        for bot in self.bots:
+            result = bot.actualize_current_investments() or result
+        return result
+
+
+    def refresh_valid_markets(self) -> bool:
+        '''
+        Actualiza los mercados validos de cada bot. Los mercados se piden al exchange una sola vez.
+        return: True si todos los bots logran actualizar sus mercados validos.
+        '''
+        result = True
+        for index, bot in enumerate(self.bots):
+            result = bot.refresh_valid_markets(index == 0) and result
+        return result
+
+
+    def execute(self) -> bool:
+        '''
+        Prepara los bots y ejecuta un escaneo. Con "daemon" activado en la configuracion del primer bot,
+        el proceso no termina y repite las tareas periodicamente (ver TrendTaker.run_daemon).
+        return: True si se completa la ejecucion. False si no hay bots preparados.
+        '''
+        if not self.prepare_execution():
+            return False
+        daemon = self.configuration().get("daemon", {})
+        if daemon.get("enable", False):
+            self.scheduler = DaemonScheduler(self.runnerId)
+            self.scheduler.add(
+                "escaneo de mercados",
+                float(daemon.get("scanIntervalSeconds", 3600)),
+                self.scan_and_invest,
+                aligned=True,
+                delay=float(daemon.get("scanDelaySeconds", 30)),
+                runNow=bool(daemon.get("scanOnStart", True))
+            )
+            self.scheduler.add("seguimiento de inversiones", float(daemon.get("monitorIntervalSeconds", 60)), self.actualize_current_investments)
+            self.scheduler.add("actualizacion de mercados", float(daemon.get("universeIntervalSeconds", 21600)), self.refresh_valid_markets)
+            self.log.info(self.cmd('Modo daemon iniciado.', '\n'))
+            try:
+                self.scheduler.run()
+            except KeyboardInterrupt:
+                self.log.info(self.cmd('Modo daemon detenido por el usuario.'))
+        else:
+            self.scan_and_invest()
+        for bot in self.bots:
+            if bot.reportQueue is not None:
+                bot.reportQueue.close()
+        self.log.info(self.cmd(f'Peticiones de todos los tickers: {self.exchangeInterface.snapshotRequests}'))   # type: ignore
+        return True
+
+
+
+
+if __name__ == "__main__":
+    credentials = json.loads(open('D:/1-Lineas/2 - Cryptos/automatic 2024/credential_hitbtc.json').read())
+    botIds = sys.argv[1:] if len(sys.argv) > 1 else ['TrendTaker1', 'TrendTaker2']
+    runner = MultiBotRunner('MultiBotRunner', credentials['exchange'], credentials['key'], credentials['secret'], botIds)
+    runner.execute()
@@ -0,0 +1,244 @@
+
+import os
+import math
+import logging
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional
+from basics import *
+from exchange_interface import CANDLE_TIMESTAMP
+from market_metrics import MarketMetrics, Metrics
+from candle_series import Candles
+from metrics_engines import METRICS_ENGINES, PythonMetricsEngine
+
+CANDLE_VALUES = 6
+FLOAT_BYTES = 8
+
+MetricsRecord = Dict
+
+
+####################################################################################################
+# FUNCIONES QUE SE EJECUTAN EN LOS PROCESOS DEL POOL
+# Deben estar al nivel del modulo para que los procesos las puedan importar.
+####################################################################################################
+
+def _attach_shared_memory(name:str) -> shared_memory.SharedMemory:
+    '''
+    Abre un bloque de memoria compartida creado por el proceso principal. Solo el proceso principal
+    lo elimina. En las versiones de Python sin el parametro "track", los procesos del pool comparten
+    el resource_tracker del proceso principal, que registra cada bloque una sola vez.
+    '''
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)    # type: ignore
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _calculate_records(memoryName:str, count:int, hours:int, timeFrames:List[str], engineName:str) -> List[MetricsRecord]:
+    '''
+    Calcula las estadisticas de las velas de un lote de mercados guardado en memoria compartida.
+    param memoryName: Nombre del bloque de memoria compartida con el tensor (count, hours, 6) de float64.
+    param count: Cantidad de mercados del lote.
+    param hours: Cantidad de velas de cada mercado.
+    param timeFrames: Temporalidades mayores de las que tambien se calculan estadisticas.
+    param engineName: Nombre del motor de metricas que se debe usar.
+    return: Lista de registros {"candles", "timeframes"} con las estadisticas de cada mercado.
+    '''
+    engine = METRICS_ENGINES.get(engineName, PythonMetricsEngine)()
+    memory = _attach_shared_memory(memoryName)
+    try:
+        values = memory.buf.cast('d')
+        records: List[MetricsRecord] = []
+        size = hours * CANDLE_VALUES
+        for index in range(count):
+            flat = values[index * size:(index + 1) * size].tolist()
+            candles = [flat[position:position + CANDLE_VALUES] for position in range(0, size, CANDLE_VALUES)]
+            for candle in candles:
+                candle[CANDLE_TIMESTAMP] = int(candle[CANDLE_TIMESTAMP])
+            record: MetricsRecord = {"candles": engine.candles_statistics(candles)}
+            if timeFrames:
+                record["timeframes"] = MarketMetrics.timeframes_statistics(candles, timeFrames, engine.candles_statistics)
+            records.append(record)
+        values.release()
+        return records
+    finally:
+        memory.close()
+
+
+
+class ParallelMetricsBatch(Basics):
+    '''
+    Lote de mercados enviado al pool. Mantiene la memoria compartida hasta que se leen los resultados.
+    '''
+
+    def __init__(self, memory:shared_memory.SharedMemory, future:Future, count:int):
+        self.memory = memory
+        self.future = future
+        self.count = count
+
+
+    def results(self) -> List[Optional[MetricsRecord]]:
+        '''
+        Espera los resultados del lote y libera la memoria compartida.
+        return: Lista de registros con las estadisticas de cada mercado. None en los mercados del lote si el proceso fallo.
+        '''
+        try:
+            return self.future.result()
+        except Exception as e:
+            logging.getLogger().exception(self.cmd(f'Error: Calculando metricas en el pool de procesos. Exception: {str(e)}'))
+            return [None] * self.count
+        finally:
+            self.memory.close()
+            self.memory.unlink()
+
+
+
+class ParallelMetrics(Basics):
+    '''
+    Calcula las estadisticas de velas de los mercados en un pool de procesos, para que el calculo
+    no compita por el GIL con el bucle que pide las velas al exchange.\n
+    Las velas de cada lote se copian una sola vez a un bloque de memoria compartida (tensor
+    (N, T, 6) de float64) en lugar de enviarse como listas serializadas con pickle. Cada proceso
+    devuelve solo registros compactos con las estadisticas de las velas. Las metricas del ticker,
+    de trading y el potencial se calculan en el proceso principal, porque son baratas.
+    '''
+
+    def __init__(self, botId:str, workers:int=0, engineName:str=PythonMetricsEngine.name):
+        '''
+        param botId: Identificador del bot. Se usa para obtener el log.
+        param workers: Cantidad de procesos del pool. Con cero se usa la cantidad de CPUs.
+        param engineName: Nombre del motor de metricas que se usa en los procesos.
+        '''
+        self.log = logging.getLogger(botId)
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.engineName = engineName
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+
+    def start(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            self.log.info(self.cmd(f'Se ha iniciado el pool de {self.workers} procesos para calcular metricas.'))
+
+
+    def close(self):
+        '''
+        Detiene los procesos del pool.
+        '''
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+
+    @staticmethod
+    def _write_candles(memory:shared_memory.SharedMemory, listOfCandles:List[Candles], hours:int):
+        '''
+        Copia las primeras "hours" velas de cada mercado al tensor (N, T, 6) de la memoria compartida.
+        '''
+        if NUMPY_AVAILABLE:
+            import numpy # type: ignore
+            from market_metrics_batch import MarketMetricsBatch
+            tensor = numpy.ndarray((len(listOfCandles), hours, CANDLE_VALUES), dtype=numpy.float64, buffer=memory.buf)
+            tensor[:] = MarketMetricsBatch.candles_tensor(listOfCandles, hours)
+            del tensor
+            return
+        nan = float('nan')
+        size = hours * CANDLE_VALUES * FLOAT_BYTES
+        for index, candles in enumerate(listOfCandles):
+            values = array('d', [float(value) if value is not None else nan for candle in candles[0:hours] for value in candle])
+            memory.buf[index * size:(index + 1) * size] = values.tobytes()
+
+
+    def submit(self, listOfCandles:List[Candles], hours:int, timeFrames:Optional[List[str]]=None) -> ParallelMetricsBatch:
+        '''
+        Envia al pool el calculo de las estadisticas de las velas de un lote de mercados.
+        param listOfCandles: Velas de cada mercado. Todos deben tener al menos "hours" velas.
+        param hours: Cantidad de velas de cada mercado que se usan. Igual que candles1h[0:hours].
+        param timeFrames: Temporalidades mayores de las que tambien se calculan estadisticas.
+        return: Lote enviado. Sus resultados se obtienen con ParallelMetricsBatch.results.
+        '''
+        self.start()
+        count = len(listOfCandles)
+        memory = shared_memory.SharedMemory(create=True, size=max(1, count * hours * CANDLE_VALUES * FLOAT_BYTES))
+        try:
+            self._write_candles(memory, listOfCandles, hours)
+            future = self.executor.submit(_calculate_records, memory.name, count, hours, timeFrames or [], self.engineName)  # type: ignore
+        except Exception:
+            memory.close()
+            memory.unlink()
+            raise
+        return ParallelMetricsBatch(memory, future, count)
+
+
+    @staticmethod
+    def compose(ticker:Ticker, record:MetricsRecord, preselected:ListOfCurrenciesId) -> Metrics:
+        '''
+        Devuelve las metricas del mercado, igual que MarketMetrics.calculate, a partir del registro calculado en el pool.
+        param ticker: Ultimo ticker del mercado, obtenido del exchange, mediante la librería ccxt.
+        param record: Registro con las estadisticas de las velas, devuelto por ParallelMetricsBatch.results.
+        param preselected: Lista de currencies que deben pasar el filtro siempre y quedar en primera posicion.
+        return: Devuelve un objeto con las metricas del mercado.
+        '''
+        metrics: Metrics = {"completed": False}
+        metrics["base"] = MarketMetrics.base_of_symbol(ticker["symbol"])
+        metrics["quote"] = MarketMetrics.quote_of_symbol(ticker["symbol"])
+        metrics["ticker"] = MarketMetrics._ticker_statistics(ticker)
+        metrics["candles"] = record["candles"]
+        if "timeframes" in record:
+            metrics["timeframes"] = record["timeframes"]
+        metrics["trading"] = MarketMetrics._trading_parameters(metrics)
+        metrics["potential"] = MarketMetrics._calculate_potential(metrics, preselected)
+        metrics["completed"] = True
+        return metrics
+
+
+    def calculate(
+            self,
+            tickers:ListOfTickers,
+            listOfCandles:List[Candles],
+            hours:int,
+            preselected:ListOfCurrenciesId,
+            timeFrames:Optional[List[str]]=None,
+            batchSize:int=0
+        ) -> List[Metrics]:
+        '''
+        Calcula las metricas de todos los mercados repartiendolos en lotes entre los procesos del pool.
+        param tickers: Ticker de cada mercado.
+        param listOfCandles: Velas de cada mercado, en el mismo orden que los tickers.
+        param hours: Cantidad de velas de cada mercado que se usan.
+        param preselected: Lista de currencies que deben pasar el filtro siempre y quedar en primera posicion.
+        param timeFrames: Temporalidades mayores de las que tambien se calculan estadisticas.
+        param batchSize: Cantidad de mercados de cada lote. Con cero se reparte un lote por proceso.
+        return: Lista con las metricas de cada mercado, en el mismo orden que los tickers.
+        '''
+        if batchSize <= 0:
+            batchSize = max(1, math.ceil(len(tickers) / self.workers))
+        batches = [
+            self.submit(listOfCandles[begin:begin + batchSize], hours, timeFrames)
+            for begin in range(0, len(listOfCandles), batchSize)
+        ]
+        records = [record for batch in batches for record in batch.results()]
+        return [self.compose(ticker, record, preselected) for ticker, record in zip(tickers, records)]
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+    import time
+    import random
+    from metrics_engines import random_candles
+    generator = random.Random(0)
+    count, hours = 400, 720
+    listOfCandles = [random_candles(generator, "normal", hours) for index in range(count)]
+    tickers = [{"symbol": f'C{index}/USDT', "last": 1, "percentage": 2, "bid": 1, "ask": 1, "low": 0.9, "high": 1.1} for index in range(count)]
+    begin = time.perf_counter()
+    expected = [MarketMetrics.calculate(ticker, candles, [], ["4h"]) for ticker, candles in zip(tickers, listOfCandles)]
+    print(f'Un proceso: {round(time.perf_counter() - begin, 2)} s')
+    parallel = ParallelMetrics("test")
+    parallel.start()
+    begin = time.perf_counter()
+    obtained = parallel.calculate(tickers, listOfCandles, hours, [], ["4h"])
+    print(f'{parallel.workers} procesos: {round(time.perf_counter() - begin, 2)} s')
+    parallel.close()
+    print(f'Metricas iguales: {obtained == expected}')
@@ -0,0 +1,239 @@
+
+import math
+import logging
+from typing import Dict, List, Optional
+from basics import *
+from validations import Validations
+
+OrderPlan = Dict
+
+
+class PreTradePlanner(Basics):
+    '''
+    Etapa previa a las compras: calcula el monto de todas las ordenes candidatas con un solo balance
+    de la cuenta, en lugar de pedir el balance al exchange por cada mercado.\n
+    El monto a invertir es "amountToInvestAsQuote" en la quote principal o, con "amountIsPercentOfBalance",
+    ese porciento del balance libre de la quote principal al crear el planificador. El monto se convierte
+    a la quote de cada mercado y se redondea a la precision del mercado. Los limites, la precision y el
+    fee se comprueban a la vez para toda la lista de candidatos, con el indice de mercados (MarketUniverse)
+    si numpy esta disponible.\n
+    Cada compra ejecutada reserva su costo (monto + fee), por lo que las compras siguientes solo cuentan
+    con el balance que queda libre.
+    '''
+
+    def __init__(self, core, configuration:Dict, balance:Optional[Balance]):
+        '''
+        param core: Objeto TrendTakerCore con los mercados cargados.
+        param configuration: Objeto con la configuracion del algoritmo.
+        param balance: Balance de la cuenta obtenido del exchange. Se usa el balance libre ("free").
+        '''
+        self.core = core
+        self.configuration = configuration
+        self.log = logging.getLogger(core.botId)
+        self.primaryQuote = str(configuration.get("currencyQuote", "USDT"))
+        self.free: Dict[CurrencyId, float] = {}
+        for currencyId, value in ((balance or {}).get("free", None) or {}).items():
+            try:
+                self.free[currencyId] = float(value)
+            except:
+                continue
+        self.reserved: Dict[CurrencyId, float] = {}
+        self.plans: Dict[MarketId, OrderPlan] = {}
+        self.amountAsPrimaryQuote = self.amount_to_invest(configuration, self.free.get(self.primaryQuote, 0.0))
+
+
+    @staticmethod
+    def amount_to_invest(configuration:Dict, balanceQuote:float) -> float:
+        '''
+        Devuelve el monto a invertir en cada mercado, expresado en la quote principal.
+        param configuration: Objeto con la configuracion del algoritmo.
+        param balanceQuote: Balance libre de la quote principal.
+        return: "amountToInvestAsQuote", o ese porciento de "balanceQuote" si "amountIsPercentOfBalance" es True.
+        '''
+        amount = float(configuration.get("amountToInvestAsQuote", 10))
+        if configuration.get("amountIsPercentOfBalance", False):
+            return balanceQuote * amount / 100
+        return amount
+
+
+    def plan(self, marketsData:ListOfMarketData) -> Dict[MarketId, OrderPlan]:
+        '''
+        Calcula las ordenes de compra de todos los mercados candidatos.
+        param marketsData: Lista de mercados, devuelta por TrendTakerCore.get_ordered_and_filtered_markets.
+        return: Diccionario con la orden planificada de cada mercado. Cada orden tiene "symbolId", "quote",
+                "price", "amountAsQuote", "amountAsBase" (redondeado a la precision), "costAsQuote"
+                (costo del monto redondeado + fee), "withinLimits" (False si el monto no cumple los limites
+                o no se pudo calcular) y "rejection" (motivo por el que se descarta la orden o None).
+        '''
+        conversion: Dict[CurrencyId, Optional[float]] = {}
+        symbols: List[MarketId] = []
+        quotes: List[CurrencyId] = []
+        prices: List[float] = []
+        amountsAsQuote: List[float] = []
+        for marketData in marketsData:
+            symbolId = marketData["symbolId"]
+            quote = self.core.quote_of(symbolId)
+            if quote not in conversion:
+                conversion[quote] = self.core.convert_amount(self.amountAsPrimaryQuote, self.primaryQuote, quote)
+            try:
+                price = float(marketData["tickerData"]["last"])
+            except:
+                price = 0.0
+            symbols.append(symbolId)
+            quotes.append(quote)
+            prices.append(price)
+            amountsAsQuote.append(float('nan') if conversion[quote] is None or price <= 0 else float(conversion[quote]))  # type: ignore
+        universe = self.core.universe
+        if NUMPY_AVAILABLE and universe is not None and all(universe.id_of(symbolId) is not None for symbolId in symbols):
+            import numpy # type: ignore
+            ids = universe.ids_array(symbols)
+            pricesArray = numpy.asarray(prices, dtype=numpy.float64)
+            quoteArray = numpy.asarray(amountsAsQuote, dtype=numpy.float64)
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                amountsAsBase = universe.round_amounts(quoteArray / pricesArray, ids, "amount")
+            within = universe.within_limits(amountsAsBase, ids) & ~numpy.isnan(amountsAsBase)
+            fees = universe.column("takerFee")[ids]
+            rows = zip(amountsAsBase.tolist(), within.tolist(), fees.tolist())
+        else:
+            rows = [self._plan_one(symbolId, price, amount) for symbolId, price, amount in zip(symbols, prices, amountsAsQuote)]
+        for symbolId, quote, price, amountAsQuote, (amountAsBase, withinLimits, fee) in zip(symbols, quotes, prices, amountsAsQuote, rows):
+            if math.isnan(fee):
+                fee = self._market_fee(symbolId)
+            costAsQuote = amountAsBase * price
+            self.plans[symbolId] = {
+                "symbolId": symbolId,
+                "quote": quote,
+                "price": price,
+                "amountAsQuote": amountAsQuote,
+                "amountAsBase": amountAsBase,
+                "costAsQuote": costAsQuote + costAsQuote * fee,
+                "withinLimits": bool(withinLimits),
+                "rejection": None if withinLimits else self._rejection(symbolId, quote, price, amountAsQuote, amountAsBase)
+            }
+        return self.plans
+
+
+    def _rejection(self, symbolId:MarketId, quote:CurrencyId, price:float, amountAsQuote:float, amountAsBase:float) -> str:
+        '''
+        return: Motivo por el que la orden no cumple los limites o no se pudo calcular.
+        '''
+        if not price > 0:
+            return f'El precio del ticker del mercado {symbolId} no es valido: {price}'
+        if math.isnan(amountAsQuote):
+            return f'No se pudo convertir el monto a invertir de {self.primaryQuote} a {quote}'
+        if math.isnan(amountAsBase):
+            return f'No se pudo calcular el monto a comprar en el mercado {symbolId}'
+        market = self.core.get_market(symbolId)
+        if market is None:
+            return f'No se pudieron obtener los datos del mercado {symbolId}'
+        base = self.core.base_of(symbolId)
+        amountMin = Validations.get_market_limit("min", market)
+        if amountAsBase < amountMin:
+            return f'El monto {amountAsBase} {base} es inferior al minimo permitido en el mercado {symbolId}: {amountMin} {base}'
+        return f'El monto {amountAsBase} {base} es superior al maximo permitido en el mercado {symbolId}: {Validations.get_market_limit("max", market)} {base}'
+
+
+
+    def _plan_one(self, symbolId:MarketId, price:float, amountAsQuote:float):
+        '''
+        Calcula una orden sin numpy. Devuelve el monto en base redondeado, si cumple los limites y el fee.
+        '''
+        if math.isnan(amountAsQuote):
+            return float('nan'), False, float('nan')
+        market = self.core.get_market(symbolId)
+        amountAsBase = self.core.round_to_precision(amountAsQuote / price, symbolId, "amount")
+        if market is None:
+            return amountAsBase, False, float('nan')
+        withinLimits = Validations.get_market_limit("min", market) <= amountAsBase <= Validations.get_market_limit("max", market)
+        return amountAsBase, withinLimits, float('nan')
+
+
+    def _market_fee(self, symbolId:MarketId) -> float:
+        '''
+        return: Fee "taker" del mercado como fraccion. Cero si el exchange no lo informa.
+        '''
+        try:
+            fee = self.core.universe.taker_fee(symbolId) if self.core.universe is not None else None
+            if fee is None:
+                fee = float(self.core.get_market(symbolId)["taker"])
+            return float(fee)
+        except:
+            return 0.0
+
+
+    def get(self, marketData:MarketData) -> OrderPlan:
+        '''
+        Devuelve la orden planificada de un mercado. Si no se ha planificado, se calcula en ese momento.
+        param marketData: Datos del mercado, de la lista devuelta por TrendTakerCore.get_ordered_and_filtered_markets.
+        return: Orden planificada. Ver "plan".
+        '''
+        plan = self.plans.get(marketData["symbolId"], None)
+        if plan is None:
+            plan = self.plan([marketData])[marketData["symbolId"]]
+        return plan
+
+
+    def available(self, quote:CurrencyId) -> float:
+        '''
+        return: Balance libre de la quote, menos lo reservado por las compras ya ejecutadas.
+        '''
+        return self.free.get(quote, 0.0) - self.reserved.get(quote, 0.0)
+
+
+    def affordable(self, plan:OrderPlan) -> bool:
+        '''
+        Determina si queda suficiente balance para la orden, teniendo en cuenta el fee y las compras anteriores.
+        param plan: Orden planificada. Ver "plan".
+        return: True si hay suficiente saldo para la orden. False si no hay suficiente.
+        '''
+        quote = plan["quote"]
+        available = self.available(quote)
+        if not available >= plan["costAsQuote"]:
+            self.log.warning(self.cmd(f'No hay suficiente {quote} para comprar.', f'{INDENT}Atencion! '))
+            self.log.warning(self.cmd(f'Solo hay {round(available, 2)} {quote} disponibles.', f'{INDENT}Atencion! '))
+            return False
+        return True
+
+
+    def reserve(self, plan:OrderPlan):
+        '''
+        Reserva el costo de una compra ejecutada, para que no se cuente en las compras siguientes.
+        param plan: Orden planificada. Ver "plan".
+        '''
+        self.reserved[plan["quote"]] = self.reserved.get(plan["quote"], 0.0) + plan["costAsQuote"]
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+    import random
+    from benchmarks import BenchmarkCore, synthetic_markets
+    from market_universe import MarketUniverse
+    from configuration import DEFAULT_CONFIGURATION
+    markets, currencies = synthetic_markets(random.Random(0), 200, "USDT")
+    for index, market in enumerate(markets.values()):
+        market["precision"] = {"amount": index % 6, "price": 8}
+        market["taker"] = 0.001
+    core = BenchmarkCore(markets, currencies)
+    core.universe = MarketUniverse(markets, currencies)
+    core.lastTickers = {}
+    generator = random.Random(1)
+    candidates = [
+        {"symbolId": symbol, "tickerData": {"last": 10 ** generator.uniform(-4, 2)}}
+        for symbol in [symbol for symbol in markets if symbol.endswith("/USDT")][0:30]
+    ]
+    configuration = dict(DEFAULT_CONFIGURATION, amountToInvestAsQuote=5, amountIsPercentOfBalance=True)
+    planner = PreTradePlanner(core, configuration, {"free": {"USDT": 400.0}})
+    plans = planner.plan(candidates)
+    expected = {s: planner._plan_one(s, plan["price"], plan["amountAsQuote"]) for s, plan in plans.items()}
+    bought = 0
+    for marketData in candidates:
+        plan = planner.get(marketData)
+        if plan["withinLimits"] and planner.available("USDT") >= plan["costAsQuote"]:
+            planner.reserve(plan)
+            bought += 1
+    print(f'Monto por orden: {planner.amountAsPrimaryQuote} USDT   Ordenes dentro de limites: {sum(plan["withinLimits"] for plan in plans.values())}')
+    print(f'Compras posibles: {bought}   Balance restante: {round(planner.available("USDT"), 4)} USDT')
+    rejected = [plan["rejection"] for plan in plans.values() if not plan["withinLimits"]]
+    print(f'Motivo de la primera orden descartada: {rejected[0] if len(rejected) > 0 else None}')
+    print(f'Mismo resultado sin vectorizar: {all((plans[s]["amountAsBase"], plans[s]["withinLimits"]) == expected[s][0:2] for s in plans)}')
@@ -4,7 +4,7 @@ import webbrowser
 from typing import Any, Dict, Optional, List
 import datetime
 from exchange_interface import ListOfCandles
-import plotly.graph_objects as go # type: ignore
+from candle_series import Candles
 from market_metrics import Metrics, MetricsSummary
 from basics import *
 import logging
@@ -147,10 +147,10 @@ class Report(Basics):
 
     
     
-    def create_graph(self, candles: ListOfCandles, title:str, fileName:str, metrics:Optional[Dict]=None, show:bool=False):
+    def create_graph(self, candles: Candles, title:str, fileName:str, metrics:Optional[Dict]=None, show:bool=False):
         '''
         Crea un grafico con las velas h1 para guardarlo en un fichero o mostrarlo.
-        param candles: Lista obtenida mediate CCXT que contiene las velas del mercado.
+        param candles: Lista obtenida mediate CCXT o CandleSeries que contiene las velas del mercado.
         param title: Titulo que se muestra en el grafico
         param fileName: Nombre del fichero donde se guarda el grafico. Si es cadena vacia, no guarda en fichero.
         param metrics: Objeto que contiene los datos estadisticos del mercado, que se utilizan para mostrar las desviacines.
@@ -160,6 +160,7 @@ class Report(Basics):
         if fileName == "" and show == False:
             return True
         try:
+            import plotly.graph_objects as go # type: ignore    # Se importa con el primer grafico.
             x = [self.core.exchangeInterface.exchange.iso8601(x[0]) for x in candles]
             open = [x[1] for x in candles]
             high = [x[2] for x in candles]
@@ -0,0 +1,104 @@
+
+import queue
+import logging
+import threading
+from typing import Callable, Optional
+from basics import *
+
+
+class ReportQueue(Basics):
+    '''
+    Cola de trabajos del reporte (graficos y web) que se ejecutan en un hilo aparte.\n
+    Crear la imagen de un grafico tarda mucho mas que decidir y colocar una orden, por lo que las
+    decisiones y compras de los mercados se hacen primero y sus graficos se crean en segundo plano.
+    Los trabajos se ejecutan en el orden en que se agregan, asi que la web del reporte, que se agrega
+    al final, se crea cuando ya estan todos los graficos.\n
+    Con "background" en False los trabajos se ejecutan al momento, en el hilo que los agrega.
+    '''
+
+    def __init__(self, botId:str, background:bool=True):
+        '''
+        param botId: Identificador del bot. Se usa para obtener el log.
+        param background: True para ejecutar los trabajos en un hilo aparte.
+        '''
+        self.log = logging.getLogger(botId)
+        self.background = background
+        self.jobs: queue.Queue = queue.Queue()
+        self.worker: Optional[threading.Thread] = None
+        self.completed = 0
+        self.failed = 0
+
+
+    def submit(self, name:str, job:Callable[[], object]):
+        '''
+        Agrega un trabajo a la cola. El hilo de trabajo se crea con el primer trabajo.
+        param name: Nombre del trabajo. Se usa en los mensajes de error.
+        param job: Funcion sin parametros que ejecuta el trabajo.
+        '''
+        if not self.background:
+            self._run(name, job)
+            return
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self._work, name="report", daemon=True)
+            self.worker.start()
+        self.jobs.put((name, job))
+
+
+    def _work(self):
+        while True:
+            item = self.jobs.get()
+            try:
+                if item is None:
+                    return
+                self._run(*item)
+            finally:
+                self.jobs.task_done()
+
+
+    def _run(self, name:str, job:Callable[[], object]):
+        try:
+            job()
+            self.completed += 1
+        except Exception as e:
+            self.failed += 1
+            self.log.exception(self.cmd(f'Error: Ejecutando el trabajo del reporte "{name}". Exception: {str(e)}'))
+
+
+    def pending(self) -> int:
+        '''
+        return: Cantidad aproximada de trabajos que faltan por ejecutar.
+        '''
+        return self.jobs.unfinished_tasks
+
+
+    def wait(self):
+        '''
+        Espera a que se ejecuten todos los trabajos agregados.
+        '''
+        if self.background and self.worker is not None:
+            self.jobs.join()
+
+
+    def close(self):
+        '''
+        Espera a que se ejecuten todos los trabajos y termina el hilo de trabajo.
+        '''
+        if self.worker is not None and self.worker.is_alive():
+            self.jobs.put(None)
+            self.worker.join()
+        self.worker = None
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+    import time
+    reportQueue = ReportQueue("test")
+    done = []
+    begin = time.perf_counter()
+    for index in range(5):
+        reportQueue.submit(f'grafico {index}', lambda index=index: (time.sleep(0.2), done.append(index)))
+    reportQueue.submit('web', lambda: done.append("web"))
+    print(f'Trabajos agregados en {round((time.perf_counter() - begin) * 1000, 1)} ms   Pendientes: {reportQueue.pending()}')
+    reportQueue.close()
+    print(f'Trabajos terminados en {round((time.perf_counter() - begin) * 1000, 1)} ms   Orden: {done}')
@@ -0,0 +1,402 @@
+
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+import logging
+from basics import *
+from exchange_interface import CANDLE_TIMESTAMP, CANDLE_HIGT, CANDLE_LOW
+from market_metrics import MarketMetrics, Metrics
+from candle_series import Candles
+
+MILLISECONDS_PER_HOUR = 60 * 60 * 1000
+
+
+class RollingMarketMetrics(Basics):
+    '''
+    Acumulador de metricas de un mercado sobre una ventana deslizante de velas 1h.\n
+    Cada vela nueva entra por el final de la ventana y expulsa a la mas antigua. Las sumas, conteos de
+    velas colapsadas, completitud, minimo, maximo y cambios de precio se actualizan en O(1) por vela,
+    de manera que los valores que usa Validations.is_potential_market se obtienen sin recorrer la ventana.\n
+    La desviacion media y la desviacion con respecto a la tendencia dependen de la media y de la linea
+    de tendencia de toda la ventana, que cambian con cada vela. Esas dos metricas se calculan en una
+    sola pasada sobre la ventana y solo cuando se piden las metricas completas.
+    '''
+
+    def __init__(self, symbol:MarketId, windowSize:int):
+        '''
+        param symbol: Identificador del mercado al que pertenecen las velas.
+        param windowSize: Cantidad de velas de la ventana. Ej: candlesDays * 24.
+        '''
+        if windowSize < 1:
+            raise ValueError(f'El tamaño de la ventana debe ser positivo: {windowSize}')
+        self.symbol = symbol
+        self.windowSize = windowSize
+        self.candles:List[Optional[Candle]] = [None] * windowSize
+        self.prices:List[float] = [0.0] * windowSize
+        self.colapsed:List[bool] = [False] * windowSize
+        self.first = 0                  # Secuencia absoluta de la vela mas antigua de la ventana.
+        self.next = 0                   # Secuencia absoluta que tendra la proxima vela.
+        self.priceSum = 0.0
+        self.colapsesCount = 0
+        self.firstInRange = 0           # Primera vela dentro del rango de tiempo que corresponde a la ventana.
+        self.threshold:Optional[float] = None
+        self.pushesSinceResync = 0
+        # Minimos y maximos de todas las velas excepto la mas reciente, que se puede reemplazar.
+        self.lows:Deque[Tuple[int, float]] = deque()
+        self.highs:Deque[Tuple[int, float]] = deque()
+
+
+    ####################################################################################################
+    # METODOS PARA ACTUALIZAR LA VENTANA
+    ####################################################################################################
+
+    def count(self) -> int:
+        return self.next - self.first
+
+
+    def is_ready(self) -> bool:
+        '''
+        return: True si la ventana ya tiene todas las velas. De lo contrario False.
+        '''
+        return self.count() == self.windowSize
+
+
+    def last_timestamp(self) -> Optional[int]:
+        '''
+        return: Timestamp de la vela mas reciente de la ventana. None si la ventana esta vacia.
+        '''
+        if self.count() == 0:
+            return None
+        return self._candle(self.next - 1)[CANDLE_TIMESTAMP]
+
+
+    def is_synchronized(self, candles:Candles) -> bool:
+        '''
+        Comprueba en O(1) que la ventana tiene las mismas velas que la lista, comparando la cantidad
+        y los timestamps de la primera y la ultima vela.
+        param candles: Lista de velas 1h obtenidas del exchange, mediante la librería ccxt.
+        return: True si la ventana corresponde a la lista de velas. De lo contrario False.
+        '''
+        count = self.count()
+        return count > 0 and count == len(candles) and \
+            self._candle(self.first)[CANDLE_TIMESTAMP] == candles[0][CANDLE_TIMESTAMP] and \
+            self._candle(self.next - 1)[CANDLE_TIMESTAMP] == candles[-1][CANDLE_TIMESTAMP]
+
+
+    def update(self, candles:Candles) -> int:
+        '''
+        Agrega a la ventana las velas nuevas de una lista de velas obtenida del exchange.\n
+        Solo se recorren las velas del final de la lista que no son anteriores a la vela mas reciente
+        de la ventana. La vela con el mismo timestamp que la mas reciente la reemplaza, porque es la
+        vela que estaba en curso en la lectura anterior y ya tiene sus valores definitivos.\n
+        param candles: Lista de velas 1h obtenidas del exchange, mediante la librería ccxt.
+        return: Cantidad de velas agregadas o reemplazadas.
+        '''
+        lastTimestamp = self.last_timestamp()
+        begin = len(candles)
+        while begin > 0 and (lastTimestamp is None or candles[begin - 1][CANDLE_TIMESTAMP] >= lastTimestamp):
+            begin -= 1
+        for candle in candles[begin:]:
+            self.push(candle)
+        return len(candles) - begin
+
+
+    def push(self, candle:Candle) -> bool:
+        '''
+        Agrega una vela al final de la ventana y expulsa la mas antigua si la ventana esta llena.\n
+        Si la vela tiene el mismo timestamp que la vela mas reciente, la reemplaza.\n
+        param candle: Vela OHLCV obtenida del exchange, mediante la librería ccxt.
+        return: True si se agrega la vela. False si la vela es anterior a la vela mas reciente.
+        '''
+        lastTimestamp = self.last_timestamp()
+        if lastTimestamp is not None:
+            if candle[CANDLE_TIMESTAMP] < lastTimestamp:
+                return False
+            if candle[CANDLE_TIMESTAMP] == lastTimestamp:
+                self._remove_newest()
+            else:
+                self._commit_newest()
+        if self.count() == self.windowSize:
+            self._evict_oldest()
+        seq = self.next
+        slot = seq % self.windowSize
+        price = float(MarketMetrics._candle_estimated_average(candle))
+        colapsed = MarketMetrics._is_candle_colapse(candle)
+        self.candles[slot] = candle
+        self.prices[slot] = price
+        self.colapsed[slot] = colapsed
+        self.priceSum += price
+        self.colapsesCount += int(colapsed)
+        self.next += 1
+        self._advance_time_range()
+        self.pushesSinceResync += 1
+        if self.pushesSinceResync >= self.windowSize:
+            self._resync()
+        return True
+
+
+    def _candle(self, seq:int) -> Candle:
+        return self.candles[seq % self.windowSize]   # type: ignore
+
+
+    def _price(self, seq:int) -> float:
+        return self.prices[seq % self.windowSize]
+
+
+    def _commit_newest(self):
+        '''
+        Pasa la vela mas reciente a las colas de minimos y maximos, antes de que llegue una vela nueva.
+        '''
+        seq = self.next - 1
+        candle = self._candle(seq)
+        low = float(candle[CANDLE_LOW])
+        high = float(candle[CANDLE_HIGT])
+        while len(self.lows) > 0 and self.lows[-1][1] >= low:
+            self.lows.pop()
+        self.lows.append((seq, low))
+        while len(self.highs) > 0 and self.highs[-1][1] <= high:
+            self.highs.pop()
+        self.highs.append((seq, high))
+
+
+    def _remove_newest(self):
+        seq = self.next - 1
+        slot = seq % self.windowSize
+        self.priceSum -= self.prices[slot]
+        self.colapsesCount -= int(self.colapsed[slot])
+        self.candles[slot] = None
+        self.next -= 1
+
+
+    def _evict_oldest(self):
+        seq = self.first
+        slot = seq % self.windowSize
+        self.priceSum -= self.prices[slot]
+        self.colapsesCount -= int(self.colapsed[slot])
+        self.candles[slot] = None
+        if len(self.lows) > 0 and self.lows[0][0] == seq:
+            self.lows.popleft()
+        if len(self.highs) > 0 and self.highs[0][0] == seq:
+            self.highs.popleft()
+        self.first += 1
+
+
+    def _advance_time_range(self):
+        '''
+        Actualiza la primera vela que esta dentro del rango de tiempo de la ventana.
+        Equivale al filtro de MarketMetrics._candles_filter_time_range, pero avanzando un puntero.
+        '''
+        count = self.count()
+        threshold = float(self._candle(self.next - 1)[CANDLE_TIMESTAMP]) - float(MILLISECONDS_PER_HOUR * count)
+        if self.threshold is None or threshold < self.threshold:
+            self.firstInRange = self.first
+        self.threshold = threshold
+        self.firstInRange = max(self.firstInRange, self.first)
+        while self.firstInRange < self.next and self._candle(self.firstInRange)[CANDLE_TIMESTAMP] <= threshold:
+            self.firstInRange += 1
+
+
+    def _resync(self):
+        '''
+        Recalcula la suma de precios para que no se acumulen errores de redondeo.
+        Se hace una vez cada "windowSize" velas, por lo que su costo por vela es O(1).
+        '''
+        self.priceSum = sum(self._price(seq) for seq in range(self.first, self.next))
+        self.pushesSinceResync = 0
+
+
+    ####################################################################################################
+    # METODOS PARA OBTENER LAS METRICAS
+    ####################################################################################################
+
+    def window(self) -> ListOfCandles:
+        '''
+        return: Lista con las velas de la ventana, de la mas antigua a la mas reciente.
+        '''
+        return [self._candle(seq) for seq in range(self.first, self.next)]
+
+
+    def low(self) -> float:
+        newest = float(self._candle(self.next - 1)[CANDLE_LOW])
+        return min(self.lows[0][1], newest) if len(self.lows) > 0 else newest
+
+
+    def higt(self) -> float:
+        newest = float(self._candle(self.next - 1)[CANDLE_HIGT])
+        return max(self.highs[0][1], newest) if len(self.highs) > 0 else newest
+
+
+    def percent(self) -> Optional[Dict]:
+        '''
+        Devuelve en O(1) los porcientos de las velas que usa Validations.is_potential_market.
+        return: Objeto con los porcientos de colapsos, completitud y cambios de precio de la ventana.
+                Si la ventana esta vacia o algun precio es cero, devuelve None.
+        '''
+        count = self.count()
+        if count == 0:
+            return None
+        try:
+            priceOpen = self._price(self.first)
+            priceClose = self._price(self.next - 1)
+            priceMiddle = self._price(self.first + round(float(count - 1) * 0.5))
+            return {
+                "colapses": float(self.colapsesCount / count * 100),
+                "completion": float((self.next - self.firstInRange) / count * 100),
+                "changeWhole": self.delta(priceOpen, priceClose),
+                "changeHalf1": self.delta(priceOpen, priceMiddle),
+                "changeHalf2": self.delta(priceMiddle, priceClose)
+            }
+        except ZeroDivisionError:
+            return None
+
+
+    def candles_statistics(self) -> Optional[Dict]:
+        '''
+        Devuelve las mismas estadisticas que MarketMetrics._candles_statistics para las velas de la ventana.\n
+        Todo se obtiene del estado acumulado, excepto la desviacion media y la desviacion con respecto
+        a la tendencia, que se calculan en una pasada sobre la ventana.
+        return: Objeto con las estadisticas descriptivas de las velas. Si ocurre un error, devuelve None.
+        '''
+        percent = self.percent()
+        if percent is None:
+            return None
+        try:
+            count = self.count()
+            prices = [self._price(seq) for seq in range(self.first, self.next)]
+            average = float(self.priceSum / count)
+            deviation = sum(abs(price - average) for price in prices) / count
+            trendLine = MarketMetrics._create_trend_line(prices[0], prices[-1], count)
+            percent["deviation"] = self.delta(average, deviation)
+            return {
+                "count": count,
+                "open": prices[0],
+                "low": self.low(),
+                "higt": self.higt(),
+                "close": prices[-1],
+                "average": average,
+                "deviation": deviation,
+                "percent": {
+                    "colapses": percent["colapses"],
+                    "completion": percent["completion"],
+                    "deviation": percent["deviation"],
+                    "changeWhole": percent["changeWhole"],
+                    "changeHalf1": percent["changeHalf1"],
+                    "changeHalf2": percent["changeHalf2"]
+                },
+                "trendDeviation": MarketMetrics._candles_trend_deviation(self.window(), trendLine)
+            }
+        except Exception as e:
+            print(f"Error: Calculando las estadisticas de las velas de {self.symbol}. Exception: {str(e)}")
+            return None
+
+
+    def calculate(self, ticker:Ticker, preselected:ListOfCurrenciesId) -> Metrics:
+        '''
+        Devuelve un objeto con las metricas del mercado, igual que MarketMetrics.calculate
+        con las velas de la ventana.\n
+        param ticker: Ultimo ticker del mercado, obtenido del exchange, mediante la librería ccxt.
+        param preselected: Lista de currencies que deben pasar el filtro siempre y quedar en primera posicion.
+        return: Devuelve un objeto con las metricas del mercado.
+        '''
+        metrics: Metrics = {"completed": False}
+        metrics["base"] = self.base_of_symbol(ticker["symbol"])
+        metrics["quote"] = self.quote_of_symbol(ticker["symbol"])
+        metrics["ticker"] = MarketMetrics._ticker_statistics(ticker)
+        metrics["candles"] = self.candles_statistics()
+        metrics["trading"] = MarketMetrics._trading_parameters(metrics)
+        metrics["potential"] = MarketMetrics._calculate_potential(metrics, preselected)
+        metrics["completed"] = True
+        return metrics
+
+
+
+class RollingMetricsBook(Basics):
+    '''
+    Acumuladores RollingMarketMetrics de los mercados escaneados, para reutilizarlos entre escaneos.\n
+    En cada escaneo horario las velas de un mercado son las del escaneo anterior desplazadas una o dos
+    velas, por lo que solo se agregan las velas nuevas al acumulador del mercado. Si la ventana del
+    acumulador no corresponde a las velas recibidas (cambio del rango de dias, huecos corregidos por el
+    exchange, etc.), el acumulador se vuelve a crear con todas las velas.
+    '''
+
+    def __init__(self, botId:str):
+        self.log = logging.getLogger(botId)
+        self.markets:Dict[MarketId, RollingMarketMetrics] = {}
+        self.updates = 0
+        self.rebuilds = 0
+
+
+    def candles_statistics(self, symbol:MarketId, candles:Candles) -> Optional[Dict]:
+        '''
+        Devuelve las mismas estadisticas que MarketMetrics._candles_statistics, actualizando el acumulador del mercado.
+        param symbol: Identificador del mercado.
+        param candles: Velas 1h del mercado.
+        return: Objeto con las estadisticas descriptivas de las velas. Si ocurre un error, devuelve None.
+        '''
+        if len(candles) == 0:
+            return None
+        rolling = self.markets.get(symbol, None)
+        if rolling is not None and rolling.windowSize == len(candles):
+            rolling.update(candles)
+            if rolling.is_synchronized(candles):
+                self.updates += 1
+                return rolling.candles_statistics()
+        rolling = RollingMarketMetrics(symbol, len(candles))
+        rolling.update(candles)
+        self.markets[symbol] = rolling
+        self.rebuilds += 1
+        if not rolling.is_synchronized(candles):     # Velas desordenadas o repetidas.
+            del self.markets[symbol]
+            return MarketMetrics._candles_statistics(candles)
+        return rolling.candles_statistics()
+
+
+    def discard(self, symbols:ListOfMarketsId) -> int:
+        '''
+        Elimina los acumuladores de los mercados especificados.
+        param symbols: Lista de identificadores de mercados.
+        return: Cantidad de acumuladores eliminados.
+        '''
+        count = 0
+        for symbol in symbols:
+            if self.markets.pop(symbol, None) is not None:
+                count += 1
+        return count
+
+
+    def report(self) -> str:
+        '''
+        return: Cadena con la cantidad de acumuladores actualizados y creados desde la ultima llamada.
+        '''
+        message = f'Acumuladores de velas: {self.updates} actualizados, {self.rebuilds} creados, {len(self.markets)} mercados.'
+        self.updates = 0
+        self.rebuilds = 0
+        return message
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+    import random
+    random.seed(3)
+    candles, price, timestamp = [], 1.0, 0
+    for hour in range(400):
+        timestamp += MILLISECONDS_PER_HOUR * (1 if random.random() > 0.1 else 2)
+        close = price * random.uniform(0.97, 1.035)
+        candles.append([timestamp, price, max(price, close) * 1.01, min(price, close) * 0.99, close, 1000])
+        price = close
+    ticker = {"symbol": "XXX/USDT", "last": price, "percentage": 3.0, "bid": price, "ask": price, "low": 0.9, "high": 1.1}
+    rolling = RollingMarketMetrics("XXX/USDT", 168)
+    rolling.update(candles[0:200])
+    for index in range(200, 400):
+        rolling.update(candles[index-1:index+1])
+    print(rolling.calculate(ticker, [])["candles"]["percent"])
+    print(MarketMetrics.calculate(ticker, candles[-168:], [])["candles"]["percent"])
+    from metrics_engines import _parity_differences, PARITY_TOLERANCE
+    book = RollingMetricsBook("test")
+    differences = 0
+    for index in range(168, 400):
+        statistics = book.candles_statistics("XXX/USDT", candles[index-168:index])
+        expected = MarketMetrics._candles_statistics(candles[index-168:index])
+        differences += len(_parity_differences(expected, statistics, "candles", float(expected["average"]), PARITY_TOLERANCE))
+    print(book.report())
+    print(f'Diferencias con MarketMetrics._candles_statistics: {differences}')
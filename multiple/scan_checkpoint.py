@@ -0,0 +1,185 @@
+
+import os
+import json
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+from basics import *
+from file_manager import FileManager
+
+CHECKPOINT_FILE_VERSION = 1
+DEFAULT_MAX_AGE_SECONDS = 600
+
+
+class ScanCheckpoint(Basics):
+    '''
+    Punto de control del escaneo de mercados, para reanudarlo si el proceso se detiene a mitad.\n
+    Al iniciar un escaneo se guarda en un fichero la foto de los tickers y, a medida que avanza, se agregan
+    las velas descargadas y las estadisticas de velas calculadas. Cada dato es una linea JSON que se agrega
+    al final del fichero, por lo que guardar el progreso no reescribe lo anterior y una linea incompleta por
+    una caida se ignora al leer.\n
+    Si el proceso se reinicia antes de "maxAgeSeconds" segundos desde la foto de los tickers, el escaneo
+    se reanuda con los mismos tickers y las velas y estadisticas del fichero, en lugar de pedirlos otra vez.
+    Al terminar el escaneo el fichero se elimina.
+    '''
+
+    def __init__(self, botId:str, exchangeId:str, maxAgeSeconds:float=DEFAULT_MAX_AGE_SECONDS, enable:bool=False):
+        '''
+        param botId: Identificador del bot. Se usa para el nombre del fichero y para obtener el log.
+        param exchangeId: Identificador del exchange. Se usa para el nombre del fichero.
+        param maxAgeSeconds: Segundos durante los que se puede reanudar un escaneo, desde la foto de los tickers.
+        param enable: True para guardar y reanudar los escaneos. Desactivado por defecto.
+        '''
+        self.log = logging.getLogger(botId)
+        self.botId = botId
+        self.exchangeId = exchangeId
+        self.fileName = f'./{botId}_{exchangeId}_scan_checkpoint.jsonl'
+        self.maxAgeSeconds = float(maxAgeSeconds)
+        self.enable = enable
+        self.active = False
+        self.candles: Dict[str, ListOfCandles] = {}
+        self.metrics: List[Tuple[str, Optional[Dict]]] = []
+        self.resumedCandles = 0
+
+
+    def configure(self, configuration:ConfigurationData):
+        '''
+        Aplica la seccion "scanCheckpoint" de la configuracion.
+        param configuration: Objeto con la configuracion del algoritmo.
+        '''
+        scanCheckpoint = configuration.get("scanCheckpoint", {})
+        self.enable = bool(scanCheckpoint.get("enable", False))
+        self.maxAgeSeconds = float(scanCheckpoint.get("maxAgeSeconds", DEFAULT_MAX_AGE_SECONDS))
+
+
+    @staticmethod
+    def candles_key(symbol:MarketId, count:int, timeFrame:str) -> str:
+        return f'{symbol}|{int(count)}|{timeFrame}'
+
+
+    def _append(self, record:Dict) -> bool:
+        return FileManager.data_to_file_text(json.dumps(record) + "\n", self.fileName, self.log)
+
+
+    def _remove_file(self):
+        try:
+            if os.path.isfile(self.fileName):
+                os.remove(self.fileName)
+        except Exception as e:
+            self.log.exception(self.cmd(f'Error: Eliminando el fichero "{self.fileName}". Exception: {str(e)}'))
+
+
+    def resume(self) -> Optional[DictOfTickers]:
+        '''
+        Lee el fichero del punto de control, si existe y es reciente.
+        return: Foto de los tickers del escaneo interrumpido. None si no hay un escaneo que reanudar.
+        '''
+        self.active = False
+        if not self.enable or not os.path.isfile(self.fileName):
+            return None
+        tickers = None
+        candles: Dict[str, ListOfCandles] = {}
+        metrics: List[Tuple[str, Optional[Dict]]] = []
+        try:
+            with open(self.fileName, 'r') as file:
+                for index, line in enumerate(file):
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if index == 0:
+                        if record.get("version", None) != CHECKPOINT_FILE_VERSION \
+                                or time.time() - float(record.get("time", 0)) > self.maxAgeSeconds:
+                            break
+                    elif record.get("type", None) == "tickers":
+                        tickers = record["data"]
+                    elif record.get("type", None) == "candles":
+                        candles[record["key"]] = record["data"]
+                    elif record.get("type", None) == "metrics":
+                        metrics.append((record["key"], record["data"]))
+        except Exception as e:
+            self.log.exception(self.cmd(f'Error: Leyendo el punto de control "{self.fileName}". Exception: {str(e)}'))
+        if tickers is None:
+            self._remove_file()
+            return None
+        self.active = True
+        self.candles = candles
+        self.metrics = metrics
+        self.resumedCandles = 0
+        self.log.info(self.cmd(f'Reanudando el escaneo interrumpido. Velas guardadas: {len(candles)}  Estadisticas guardadas: {len(metrics)}'))
+        return tickers
+
+
+    def start(self, tickers:DictOfTickers):
+        '''
+        Inicia el punto de control de un escaneo nuevo, guardando la foto de los tickers.
+        param tickers: Tickers de todos los mercados, pedidos al exchange al iniciar el escaneo.
+        '''
+        self.active = False
+        self.candles = {}
+        self.metrics = []
+        self.resumedCandles = 0
+        if not self.enable:
+            return
+        self._remove_file()
+        self.active = self._append({"version": CHECKPOINT_FILE_VERSION, "time": time.time(), "botId": self.botId}) \
+            and self._append({"type": "tickers", "data": tickers})
+
+
+    def get_candles(self, symbol:MarketId, count:int, timeFrame:str) -> Optional[ListOfCandles]:
+        '''
+        return: Velas del mercado guardadas en el punto de control. None si no estan.
+        '''
+        if not self.active:
+            return None
+        candles = self.candles.get(self.candles_key(symbol, count, timeFrame), None)
+        if candles is not None:
+            self.resumedCandles += 1
+        return candles
+
+
+    def add_candles(self, symbol:MarketId, count:int, timeFrame:str, candles:ListOfCandles):
+        '''
+        Guarda en el punto de control las velas descargadas de un mercado.
+        '''
+        if self.active:
+            key = self.candles_key(symbol, count, timeFrame)
+            self.candles[key] = candles
+            self._append({"type": "candles", "key": key, "data": candles})
+
+
+    def add_metrics(self, key:str, statistics:Optional[Dict]):
+        '''
+        Guarda en el punto de control las estadisticas de velas calculadas, con su clave de MetricsCache.
+        '''
+        if self.active:
+            self._append({"type": "metrics", "key": key, "data": statistics})
+
+
+    def finish(self):
+        '''
+        Termina el punto de control del escaneo y elimina el fichero.
+        '''
+        if self.active and self.resumedCandles > 0:
+            self.log.info(self.cmd(f'Velas reutilizadas del escaneo interrumpido: {self.resumedCandles}'))
+        self.active = False
+        self.candles = {}
+        self.metrics = []
+        self._remove_file()
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+    checkpoint = ScanCheckpoint("test", "synthetic", enable=True)
+    checkpoint.start({"ETH/USDT": {"symbol": "ETH/USDT", "last": 2000}})
+    checkpoint.add_candles("ETH/USDT", 3, "1h", [[0, 1, 2, 0.5, 1.5, 10], [1, 1.5, 2, 1, 1.8, 12], [2, 1.8, 2.2, 1.7, 2, 9]])
+    checkpoint.add_metrics("ETH/USDT|1h|3", {"average": 1.76})
+    with open(checkpoint.fileName, 'a') as file:
+        file.write('{"type": "candles", "key": "SOL/USDT|3|1h", "da')      # Linea incompleta por una caida.
+    resumed = ScanCheckpoint("test", "synthetic", enable=True)
+    tickers = resumed.resume()
+    print(f'Tickers: {tickers}')
+    print(f'Velas de ETH/USDT: {resumed.get_candles("ETH/USDT", 3, "1h") is not None}   SOL/USDT: {resumed.get_candles("SOL/USDT", 3, "1h")}')
+    resumed.finish()
+    print(f'Fichero eliminado: {not os.path.isfile(resumed.fileName)}')
@@ -0,0 +1,209 @@
+
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional
+from basics import *
+from exchange_interface import CANDLE_TIMESTAMP, CANDLE_HIGT, CANDLE_LOW, CANDLE_CLOSE
+from market_metrics import MarketMetrics, Metrics
+from candle_series import Candles
+from candle_resampling import CandleResampler
+
+MILLISECONDS_PER_HOUR = 60 * 60 * 1000
+DEFAULT_REPORT_CANDLES = 168
+
+
+class StreamingMarketMetrics(Basics):
+    '''
+    Calcula las metricas de un mercado recibiendo las velas 1h por partes (chunks), para rangos
+    largos de velas (30 a 90 dias) sin guardar la lista de velas completa.\n
+    De cada vela solo se guardan tres columnas compactas (timestamp, precio medio estimado y cierre),
+    unos 24 bytes por vela en lugar de una lista de seis objetos. Los colapsos, el minimo y el maximo
+    se acumulan en O(1) al recibir cada vela. La desviacion media y la desviacion con respecto a la
+    tendencia dependen de la media y del ultimo precio, que no se conocen hasta la ultima vela, por
+    eso se calculan al final en una pasada sobre las columnas compactas.\n
+    Las temporalidades mayores se agrupan de manera incremental y para el reporte se mantienen como
+    maximo "reportCandles" velas, agrupando en temporalidades cada vez mayores si hace falta.
+    Los resultados son los mismos que los de MarketMetrics.calculate con la lista de velas completa.
+    '''
+
+    def __init__(self, timeFrames:Optional[List[str]]=None, reportCandles:int=DEFAULT_REPORT_CANDLES):
+        '''
+        param timeFrames: Temporalidades mayores de las que tambien se calculan estadisticas. Ej: ["4h", "1d"].
+        param reportCandles: Cantidad maxima de velas que se guardan para el grafico del reporte.
+        '''
+        self.timestamps = array('q')
+        self.prices = array('d')
+        self.closes = array('d')
+        self.colapsesCount = 0
+        self.low:Optional[float] = None
+        self.higt:Optional[float] = None
+        self.resamplers:Dict[str, CandleResampler] = {timeFrame: CandleResampler(timeFrame) for timeFrame in (timeFrames or [])}
+        self.reportCandles = max(1, reportCandles)
+        self.reportHours = 1
+        self.reportResampler = CandleResampler("1h", dropPartialFirst=False)
+
+
+    def count(self) -> int:
+        return len(self.timestamps)
+
+
+    def push(self, candles:Candles):
+        '''
+        Agrega una parte de las velas del mercado.
+        param candles: Lista o CandleSeries de velas posteriores a las ya agregadas, de la mas antigua a la mas reciente.
+        '''
+        for candle in candles:
+            self.timestamps.append(int(candle[CANDLE_TIMESTAMP]))
+            self.prices.append(float(MarketMetrics._candle_estimated_average(candle)))
+            self.closes.append(float(candle[CANDLE_CLOSE]))
+            if MarketMetrics._is_candle_colapse(candle):
+                self.colapsesCount += 1
+            self.low = candle[CANDLE_LOW] if self.low is None else min(self.low, candle[CANDLE_LOW])
+            self.higt = candle[CANDLE_HIGT] if self.higt is None else max(self.higt, candle[CANDLE_HIGT])
+        for resampler in self.resamplers.values():
+            resampler.push(candles)
+        self.reportResampler.push(candles)
+        self._compact_report()
+
+
+    def push_chunks(self, chunks:Iterable[Candles]) -> int:
+        '''
+        Agrega todas las partes de las velas del mercado, por ejemplo las de ExchangeInterface.get_candles_chunks.
+        param chunks: Iterable de listas de velas, de la mas antigua a la mas reciente.
+        return: Cantidad total de velas agregadas.
+        '''
+        for chunk in chunks:
+            self.push(chunk)
+        return self.count()
+
+
+    def _compact_report(self):
+        '''
+        Duplica la temporalidad de las velas del reporte mientras haya mas velas de las permitidas.
+        Las temporalidades 1h, 2h, 4h, 8h... estan alineadas entre si, por lo que se pueden agrupar
+        las velas ya agrupadas.
+        '''
+        while len(self.reportResampler.candles) > self.reportCandles:
+            self.reportHours *= 2
+            resampler = CandleResampler(f'{self.reportHours}h', dropPartialFirst=False)
+            resampler.push(self.reportResampler.candles)
+            self.reportResampler = resampler
+
+
+    def report_candles(self) -> ListOfCandles:
+        '''
+        return: Velas para el grafico del reporte. Como maximo "reportCandles" velas.
+        '''
+        return self.reportResampler.candles
+
+
+    def nbytes(self) -> int:
+        '''
+        return: Cantidad aproximada de bytes que ocupan las columnas compactas de las velas.
+        '''
+        return self.count() * (self.timestamps.itemsize + self.prices.itemsize + self.closes.itemsize)
+
+
+    ####################################################################################################
+    # METODOS PARA OBTENER LAS METRICAS
+    ####################################################################################################
+
+    def _completion(self) -> float:
+        '''
+        Igual que MarketMetrics._candles_1h_completion, pero con una busqueda binaria en los timestamps ordenados.
+        '''
+        count = self.count()
+        maxCandlesAgeAsMilliseconds = MILLISECONDS_PER_HOUR * count
+        candlesInTimeRange = count - bisect_right(self.timestamps, self.timestamps[-1] - maxCandlesAgeAsMilliseconds)
+        return float(candlesInTimeRange / count * 100)
+
+
+    def candles_statistics(self) -> Optional[Dict]:
+        '''
+        Devuelve estadisticas descriptivas de las velas recibidas, igual que MarketMetrics._candles_statistics.
+        return: Objeto con las estadisticas descriptivas de las velas. Si no hay velas o si ocurre un error, devuelve None.
+        '''
+        try:
+            count = self.count()
+            if count == 0:
+                return None
+            prices = self.prices
+            average = float(sum(prices) / count)
+            deviation = sum(abs(float(price) - average) for price in prices) / count
+            trendLine = MarketMetrics._create_trend_line(prices[0], prices[-1], count)
+            middle = round(float(count-1) * 0.5)
+            return {
+                "count": count,
+                "open": prices[0],
+                "low": self.low,
+                "higt": self.higt,
+                "close": prices[-1],
+                "average": average,
+                "deviation": deviation,
+                "percent": {
+                    "colapses": float(self.colapsesCount / count * 100),
+                    "completion": self._completion(),
+                    "deviation": MarketMetrics.delta(average, deviation),
+                    "changeWhole": MarketMetrics.delta(prices[0], prices[-1]),
+                    "changeHalf1": MarketMetrics.delta(prices[0], prices[middle]),
+                    "changeHalf2": MarketMetrics.delta(prices[middle], prices[-1])
+                },
+                "trendDeviation": MarketMetrics._closes_trend_deviation(self.closes, trendLine)
+            }
+        except Exception as e:
+            print(f"Error: Calculando las estadisticas de las velas. Exception: {str(e)}")
+            return None
+
+
+    def timeframes_statistics(self) -> Dict:
+        '''
+        return: Objeto con las estadisticas de cada temporalidad mayor, igual que MarketMetrics.timeframes_statistics.
+        '''
+        return {
+            timeFrame: MarketMetrics.resampled_statistics(resampler.candles, timeFrame)
+            for timeFrame, resampler in self.resamplers.items()
+        }
+
+
+    def calculate(self, ticker:Ticker, preselected:ListOfCurrenciesId) -> Metrics:
+        '''
+        Devuelve un objeto con las metricas del mercado, igual que MarketMetrics.calculate
+        con todas las velas recibidas.\n
+        param ticker: Ultimo ticker del mercado, obtenido del exchange, mediante la librería ccxt.
+        param preselected: Lista de currencies que deben pasar el filtro siempre y quedar en primera posicion.
+        return: Devuelve un objeto con las metricas del mercado.
+        '''
+        metrics: Metrics = {"completed": False}
+        metrics["base"] = self.base_of_symbol(ticker["symbol"])
+        metrics["quote"] = self.quote_of_symbol(ticker["symbol"])
+        metrics["ticker"] = MarketMetrics._ticker_statistics(ticker)
+        metrics["candles"] = self.candles_statistics()
+        if len(self.resamplers) > 0:
+            metrics["timeframes"] = self.timeframes_statistics()
+        metrics["trading"] = MarketMetrics._trading_parameters(metrics)
+        metrics["potential"] = MarketMetrics._calculate_potential(metrics, preselected)
+        metrics["completed"] = True
+        return metrics
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+    import random
+    import sys
+    random.seed(5)
+    candles, price, timestamp = [], 1.0, 1700000000000 - 1700000000000 % MILLISECONDS_PER_HOUR
+    for hour in range(90 * 24):
+        timestamp += MILLISECONDS_PER_HOUR * (1 if random.random() > 0.05 else 3)
+        close = price * random.uniform(0.98, 1.021)
+        candles.append([timestamp, price, max(price, close) * 1.01, min(price, close) * 0.99, close, 1000.0])
+        price = close
+    ticker = {"symbol": "XXX/USDT", "last": price, "percentage": 3.0, "bid": price, "ask": price, "low": 0.9, "high": 1.1}
+    streaming = StreamingMarketMetrics(["4h", "1d"], 168)
+    streaming.push_chunks(candles[index:index + 500] for index in range(0, len(candles), 500))
+    obtained = streaming.calculate(ticker, [])
+    expected = MarketMetrics.calculate(ticker, candles, [], ["4h", "1d"])
+    listBytes = sys.getsizeof(candles) + sum(sys.getsizeof(c) + sum(sys.getsizeof(v) for v in c) for c in candles)
+    print(f'Metricas iguales: {obtained == expected}')
+    print(f'Velas del reporte: {len(streaming.report_candles())} de {streaming.reportHours}h')
+    print(f'Lista de listas: {listBytes} bytes   Columnas compactas: {streaming.nbytes()} bytes')
@@ -0,0 +1,102 @@
+import io
+import copy
+import random
+import unittest
+import contextlib
+from basics import *
+from configuration import DEFAULT_CONFIGURATION
+from candle_series import CandleSeries
+from metrics_engines import (
+    MetricsEngine, PythonMetricsEngine, ArrayMetricsEngine, create_metrics_engine, check_parity,
+    random_candles, _parity_differences, _parity_outcome, _parity_ticker,
+    PARITY_CASES, PARITY_TIMEFRAMES, PARITY_TOLERANCE, MILLISECONDS_PER_HOUR
+)
+
+
+def fixed_candles() -> ListOfCandles:
+    '''
+    Serie fija de 48 velas 1h con una subida, una bajada, una vela colapsada y un hueco de 2 horas.
+    '''
+    candles: ListOfCandles = []
+    timestamp = 1700000000000
+    price = 2.5
+    for index in range(48):
+        timestamp += MILLISECONDS_PER_HOUR * (2 if index == 30 else 1)
+        if index == 12:
+            candles.append([timestamp, price, price, price, price, 0.0])
+            continue
+        close = price * (1.012 if index < 36 else 0.991)
+        candles.append([timestamp, price, max(price, close) * 1.004, min(price, close) * 0.997, close, 100.0 + index])
+        price = close
+    return candles
+
+
+@unittest.skipUnless(NUMPY_AVAILABLE, "El motor array necesita numpy.")
+class TestMetricsEnginesParity(unittest.TestCase):
+    '''
+    Compara el motor "array" con el motor "python" de referencia sobre series de velas fijas.
+    '''
+
+    def setUp(self):
+        self.reference = PythonMetricsEngine()
+        self.candidate = ArrayMetricsEngine()
+        self.configuration = copy.deepcopy(DEFAULT_CONFIGURATION)
+        self.configuration["filters"]["timeframes"] = copy.deepcopy(PARITY_TIMEFRAMES)
+
+
+    def assert_parity(self, candles:ListOfCandles, ticker:Ticker):
+        scale = max(abs(float(value)) for candle in candles for value in candle[1:5])
+        for series in [candles, CandleSeries.from_list(candles)]:
+            with contextlib.redirect_stdout(io.StringIO()):
+                expected = self.reference.candles_statistics(series)
+                obtained = self.candidate.candles_statistics(series)
+                expectedMetrics, expectedPassed = _parity_outcome(self.reference, ticker, series, self.configuration)
+                obtainedMetrics, obtainedPassed = _parity_outcome(self.candidate, ticker, series, self.configuration)
+            self.assertEqual(_parity_differences(expected, obtained, "candles", scale, PARITY_TOLERANCE), [])
+            self.assertEqual(_parity_differences(expectedMetrics, obtainedMetrics, "metrics", scale, PARITY_TOLERANCE), [])
+            self.assertEqual(expectedPassed, obtainedPassed)
+
+
+    def test_fixed_series(self):
+        candles = fixed_candles()
+        ticker = {"symbol": "XXX/USDT", "last": candles[-1][4], "bid": candles[-1][4], "ask": candles[-1][4] * 1.001,
+                  "low": candles[-1][4] * 0.9, "high": candles[-1][4] * 1.1, "percentage": 4.0}
+        self.assert_parity(candles, ticker)
+        statistics = self.reference.candles_statistics(candles)
+        self.assertEqual(statistics["count"], 48)
+        self.assertAlmostEqual(statistics["percent"]["colapses"], 100.0 / 48)
+
+
+    def test_seeded_series_of_every_case(self):
+        for case in PARITY_CASES:
+            for seed in range(5):
+                with self.subTest(case=case, seed=seed):
+                    generator = random.Random(seed)
+                    candles = random_candles(generator, case)
+                    self.assert_parity(candles, _parity_ticker(generator, candles))
+
+
+    def test_check_parity(self):
+        self.assertEqual(check_parity(self.reference, self.candidate, seriesCount=5, seed=7), [])
+
+
+
+class TestMetricsEnginesSelection(unittest.TestCase):
+
+    def test_interface_is_abstract(self):
+        with self.assertRaises(TypeError):
+            MetricsEngine()     # type: ignore
+
+
+    def test_auto_selects_python(self):
+        self.assertIsInstance(create_metrics_engine("auto"), PythonMetricsEngine)
+        self.assertEqual(DEFAULT_CONFIGURATION["metricsEngine"], PythonMetricsEngine.name)
+
+
+    def test_unknown_engine_falls_back_to_python(self):
+        self.assertIsInstance(create_metrics_engine("unknown"), PythonMetricsEngine)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
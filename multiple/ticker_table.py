@@ -0,0 +1,219 @@
+
+from typing import Any, Dict, List, Optional
+from basics import *
+
+TICKER_TABLE_AVAILABLE = NUMPY_AVAILABLE
+
+TICKER_COLUMNS = ["last", "bid", "ask", "percentage", "high", "low"]
+TICKER_FILTERS = ["minProfit", "maxSpreadOverProfit", "minProfitOverAmplitude"]
+INVALID_SPREAD = float(1000000)
+PRESELECTED_ORDER = float(1000000)
+
+
+class TickerTable(Basics):
+    '''
+    Tabla por columnas con los tickers de los mercados validos, para filtrarlos y ordenarlos sin
+    recorrerlos uno a uno.\n
+    Los tickers se convierten una sola vez en arrays de numpy (last, bid, ask, percentage, high y low).
+    Los filtros de tickers se aplican como mascaras vectorizadas, con los mismos resultados que
+    Validations.is_valid_ticker, y los primeros "maxTickersToSelect" se obtienen con una ordenacion
+    parcial (numpy.argpartition) en lugar de ordenar todos los tickers.
+    '''
+
+    def __init__(self, tickers:ListOfTickers, preselected:ListOfCurrenciesId, bases:Optional[List[CurrencyId]]=None):
+        '''
+        Convierte los tickers en la tabla con una sola conversion a numpy de todas las columnas.
+        param tickers: Lista de tickers obtenidos del exchange, mediante la librería ccxt.
+        param preselected: Lista de currencies preseleccionadas. Sus tickers pasan siempre el filtro
+                           y quedan en las primeras posiciones.
+        param bases: Currency base de cada ticker, en el mismo orden. Normalmente las de MarketUniverse, para
+                     no separar cada symbol. None para obtenerlas de los symbols.
+        '''
+        import numpy # type: ignore
+        self.tickers = tickers
+        self.count = len(tickers)
+        raw = [[ticker.get(column) for ticker in tickers] for column in TICKER_COLUMNS]
+        try:
+            table = numpy.array(raw, dtype=numpy.float64).reshape(len(TICKER_COLUMNS), self.count)
+        except (TypeError, ValueError):
+            table = numpy.array([self._float_column(values) for values in raw]).reshape(len(TICKER_COLUMNS), self.count)
+        # Los valores ausentes, no numericos o NaN quedan como NaN. Solo esos se revisan uno a uno.
+        self.columns: Dict[str, Any] = {}
+        self.present: Dict[str, Any] = {}
+        for position, column in enumerate(TICKER_COLUMNS):
+            present = ~numpy.isnan(table[position])
+            for index in numpy.flatnonzero(~present):
+                present[index] = self._float_or_none(raw[position][index]) is not None
+            self.columns[column], self.present[column] = table[position], present
+        self.missingPercentage = numpy.zeros(self.count, dtype=bool)
+        for index in numpy.flatnonzero(numpy.isnan(self.columns["percentage"])):
+            self.missingPercentage[index] = "percentage" not in tickers[index]
+        self.preselected = numpy.zeros(self.count, dtype=bool)
+        if len(preselected) > 0:
+            preselectedSet = set(preselected)
+            if bases is None:
+                bases = [self.base_of_symbol(ticker.get("symbol", "")) for ticker in tickers]
+            lowered = {currency.lower() for currency in preselectedSet}
+            for index, base in enumerate(bases):
+                lower = base.lower()
+                if lower in lowered and (lower in preselectedSet or base.upper() in preselectedSet):
+                    self.preselected[index] = True
+
+
+    @staticmethod
+    def _float_column(values:List[Any]) -> Any:
+        '''
+        Convierte una columna con algun valor no numerico. Solo si falla la conversion directa se convierte valor a valor.
+        '''
+        import numpy # type: ignore
+        try:
+            return numpy.array(values, dtype=numpy.float64)
+        except (TypeError, ValueError):
+            values = list(values)
+            for index in [index for index, value in enumerate(values) if type(value) is not float]:
+                values[index] = TickerTable._float_or_none(values[index])
+            return numpy.array(values, dtype=numpy.float64)
+
+
+    @staticmethod
+    def _float_or_none(value:Any) -> Optional[float]:
+        try:
+            return float(value)
+        except:
+            return None
+
+
+    def percentage(self) -> Any:
+        '''
+        return: Variacion en 24h de cada ticker y mascara de los tickers donde el campo existe pero no es numerico.
+                Igual que en Validations.is_valid_ticker, si el campo no existe se toma cero.
+        '''
+        import numpy # type: ignore
+        missing = self.missingPercentage
+        return numpy.where(missing, 0.0, self.columns["percentage"]), ~missing & ~self.present["percentage"]
+
+
+    def spread(self) -> Any:
+        '''
+        return: Spread de cada ticker en porciento, igual que MarketMetrics.ticker_spread.
+                Si no se puede calcular, un spread muy grande, inaceptable.
+        '''
+        import numpy # type: ignore
+        bid, ask = self.columns["bid"], self.columns["ask"]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            spread = (ask - bid) / bid * 100
+        valid = self.present["bid"] & self.present["ask"] & (bid != 0)
+        return numpy.where(valid, spread, INVALID_SPREAD)
+
+
+    def profit_over_amplitude(self) -> Any:
+        '''
+        return: Relacion entre la variacion en 24h y la amplitud low-high de cada ticker, en porciento,
+                igual que MarketMetrics.ticker_profit_over_amplitude. Si no se puede calcular, cero.
+        '''
+        import numpy # type: ignore
+        low, high, percentage = self.columns["low"], self.columns["high"], self.columns["percentage"]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            amplitude = (high - low) / low * 100
+            result = percentage / amplitude * 100
+        valid = self.present["low"] & self.present["high"] & self.present["percentage"] & (low != 0) & (amplitude != 0)
+        return numpy.where(valid, result, 0.0)
+
+
+    def valid_mask(self, configuration:Dict) -> Any:
+        '''
+        Devuelve la mascara de tickers validos, con los mismos resultados que Validations.is_valid_ticker.\n
+        Si falta alguno de los filtros de tickers, solo son validos los tickers preseleccionados.
+        param configuration: Objeto con la configuracion del algoritmo.
+        return: Array de N valores bool. True si el ticker cumple los filtros o si es preseleccionado.
+        '''
+        try:
+            filters = configuration["filters"]["tickers"]
+            limits = {name: float(filters.get(name, None)) for name in TICKER_FILTERS}
+        except:
+            return self.preselected.copy()
+        percentage, invalidPercentage = self.percentage()
+        mask = ~invalidPercentage
+        mask &= ~(percentage < limits["minProfit"])
+        mask &= ~(self.spread() > limits["maxSpreadOverProfit"])
+        mask &= ~(self.profit_over_amplitude() < limits["minProfitOverAmplitude"])
+        return mask | self.preselected
+
+
+    def top(self, mask:Any, count:int) -> List[int]:
+        '''
+        Devuelve las posiciones de los "count" tickers con mayor variacion en 24h entre los de la mascara.
+        Los preseleccionados van primero. Entre valores iguales se mantiene el orden de la tabla, igual
+        que con una ordenacion estable de todos los tickers.
+        param mask: Mascara de tickers que se pueden seleccionar. Ver "valid_mask".
+        param count: Cantidad maxima de tickers que se devuelven.
+        return: Lista con las posiciones de los tickers seleccionados, de mayor a menor variacion.
+        '''
+        import numpy # type: ignore
+        indexes = numpy.flatnonzero(mask)
+        if count <= 0 or len(indexes) == 0:
+            return []
+        percentage = numpy.nan_to_num(self.percentage()[0][indexes], nan=-numpy.inf)
+        keys = numpy.where(self.preselected[indexes], PRESELECTED_ORDER, percentage)
+        if count < len(indexes):
+            threshold = numpy.partition(keys, len(keys) - count)[len(keys) - count]
+            candidates = keys >= threshold
+            indexes, keys = indexes[candidates], keys[candidates]
+        order = numpy.lexsort((indexes, -keys))[0:count]
+        return [int(index) for index in indexes[order]]
+
+
+    def select(self, configuration:Dict, count:int) -> ListOfTickers:
+        '''
+        Filtra y ordena los tickers igual que TrendTakerCore.get_ordered_and_filtered_tickers.
+        param configuration: Objeto con la configuracion del algoritmo.
+        param count: Cantidad maxima de tickers que se devuelven.
+        return: Lista con los tickers validos, los preseleccionados primero y luego de mayor a menor variacion en 24h.
+        '''
+        return [self.tickers[index] for index in self.top(self.valid_mask(configuration), count)]
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+    import time
+    import random
+    from validations import Validations
+    from configuration import DEFAULT_CONFIGURATION
+    generator = random.Random(0)
+    tickers = []
+    for index in range(20000):
+        last = 10 ** generator.uniform(-6, 3)
+        ticker = {
+            "symbol": f'C{index}/USDT', "last": last, "bid": last, "ask": last * (1 + generator.uniform(0, 0.02)),
+            "low": last * generator.uniform(0.85, 1.0), "high": last * generator.uniform(1.0, 1.2),
+            "percentage": round(generator.uniform(-15, 25), 1)
+        }
+        if index % 97 == 0:
+            ticker[generator.choice(TICKER_COLUMNS)] = generator.choice([None, 0, "x"])
+        if index % 89 == 0:
+            del ticker[generator.choice(TICKER_COLUMNS)]
+        tickers.append(ticker)
+    tickers.append({"symbol": "BTC/USDT", "percentage": -5})
+    configuration = DEFAULT_CONFIGURATION
+    count = configuration["maxTickersToSelect"]
+    bases = [Basics.base_of_symbol(ticker["symbol"]) for ticker in tickers]
+    timesLoop, timesTable = [], []
+    for repetition in range(5):
+        begin = time.perf_counter()
+        selected = [ticker for ticker in tickers if Validations.is_valid_ticker(ticker, configuration)]
+        expected = sorted(
+            selected,
+            key=lambda x: float(x.get("percentage") or 0) if not Validations.is_preselected(Basics.base_of_symbol(x["symbol"]), configuration) else 1000000,
+            reverse=True
+        )[0:count]
+        timesLoop.append(time.perf_counter() - begin)
+        begin = time.perf_counter()
+        table = TickerTable(tickers, configuration["preselected"], bases)
+        obtained = table.select(configuration, count)
+        timesTable.append(time.perf_counter() - begin)
+    print(f'Ticker a ticker: {round(min(timesLoop) * 1000, 1)} ms')
+    print(f'Tabla por columnas: {round(min(timesTable) * 1000, 1)} ms')
+    mask = table.valid_mask(configuration)
+    differences = sum(1 for index, ticker in enumerate(tickers) if bool(mask[index]) != Validations.is_valid_ticker(ticker, configuration))
+    print(f'Diferencias en el filtro: {differences}   Seleccion igual: {obtained == expected}')
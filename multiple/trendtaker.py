@@ -8,19 +8,43 @@ from configuration import *
 from file_manager import *
 from basics import *
 from balances import Balances
+from diversification import DiversifiedSelection
+from pre_trade_planner import PreTradePlanner, OrderPlan
+from daemon_scheduler import DaemonScheduler
+from exit_triggers import ExitTriggerIndex
+from report_queue import ReportQueue
 
 
 class TrendTaker(Basics):
     
-    def __init__(self, botId:str, exchangeId:str, apiKey:str, secret:str):
+    def __init__(
+            self, 
+            botId:str, 
+            exchangeId:str, 
+            apiKey:str, 
+            secret:str, 
+            exchangeInterface:Optional[ExchangeInterface]=None, 
+            candleCache:Optional[CandleCache]=None
+        ):
+        '''
+        param exchangeInterface: Interfaz con el exchange compartida con otros bots (ver MultiBotRunner). None para crear una propia.
+        param candleCache: Cache de velas compartido con otros bots. None para crear uno propio.
+        '''
         self.botId = botId
         self.exchangeId = exchangeId
         self.apiKey = apiKey
         self.secret = secret
+        self.sharedExchangeInterface = exchangeInterface
+        self.sharedCandleCache = candleCache
         
         self.listOfValidMarketsId:Optional[ListOfMarketsId] = None
         self.config = Configuration(botId, exchangeId)
         self.balance = Balances(botId)
+        self.planner:Optional[PreTradePlanner] = None
+        self.scheduler:Optional[DaemonScheduler] = None
+        self.exitTriggers:Optional[ExitTriggerIndex] = None
+        self.highWaterChanged = False
+        self.reportQueue:Optional[ReportQueue] = None
 
 
         
@@ -59,12 +83,12 @@ class TrendTaker(Basics):
         Los mercados validos son:\n
         - Los mercados spot en los que se puede operar compras y ventas.
         - No estan en la lista negra de mercados ni sus criptomonedas estan en la lista negra de criptomonedas.
-        - Su currency quote es la seleccionada en la configuracion del bot.\n
+        - Su currency quote es la seleccionada en la configuracion del bot, o una de las quotes de "crossQuoteScan".\n
         Puede mostrar mensajes por pantalla y registrar en el log, segun la configuracion.\n
         return: True si logra cargar los datos de mercado. False si ocurre error o no los carga.
         '''
-        self.listOfValidMarketsId = self.core.get_list_of_valid_markets(
-            str(self.config.data.get('currencyQuote', 'USDT')),
+        self.listOfValidMarketsId = self.core.get_list_of_valid_markets_of_quotes(
+            self.core.quotes,
             self.config.data.get("blackList", None)
         )
         if self.listOfValidMarketsId is None:
@@ -80,6 +104,20 @@ class TrendTaker(Basics):
             return True
 
 
+    def refresh_valid_markets(self, reload:bool=True) -> bool:
+        '''
+        Vuelve a cargar los mercados del exchange y actualiza la lista de mercados validos, validando
+        solo los mercados agregados o modificados. Se usa entre ciclos de una ejecucion larga.
+        param reload: True para pedir de nuevo los mercados al exchange. False si otro bot que comparte
+                      la interfaz con el exchange ya los ha pedido.
+        return: True si se logra actualizar la lista de mercados validos. False si ocurre error.
+        '''
+        if self.core.refresh_markets(self.config.data, reload) is None:
+            self.log.error(self.cmd('Error: Actualizando los mercados del exchange.'))
+            return False
+        return self.get_list_of_valid_markets()
+
+
 
 
 
@@ -95,7 +133,8 @@ class TrendTaker(Basics):
             profitPercent:Optional[float]=None, 
             maxLossPercent:Optional[float]=None, 
             maxHours:Optional[float]=None,
-            trailingStop:bool=False 
+            trailingStop:bool=False,
+            plan:Optional[OrderPlan]=None
         ) -> bool:
         '''
         Abre una inversion nueva comprando el activo.\n
@@ -107,22 +146,32 @@ class TrendTaker(Basics):
         param maxLossPercent: Maximo porciento de perdida que se va a tolerar.
         param maxHours: Cantidad maxima de horas que puede estar abierta la inversion.
         param trailingStop: En True indica que maxLossPercent se debe comportar como un trailingStop. 
+        param plan: Orden calculada por el planificador (PreTradePlanner). Se usan su monto ya redondeado y el
+                    balance del planificador, sin pedir el balance al exchange. El precio del plan es el del
+                    escaneo, por lo que se pide el ticker actual para calcular TakeProfit y StopLoss y se
+                    vuelven a comprobar los limites del mercado con ese precio. Si la compra se ejecuta, se
+                    reserva su costo. None para calcular la orden aqui.
         return: True si logra abrir la inversion. False si no la abre.
         '''
         if maxHours is None:
             maxHours = int(self.config.data["candlesDays"]) * 24
-        market = self.core.exchangeInterface.get_markets()[symbolId]
+        market = self.core.get_market(symbolId)
         if market is not None:
             ticker = self.core.exchangeInterface.get_ticker(symbolId)
             if ticker is not None:
-                base = self.base_of_symbol(symbolId)
-                quote = self.quote_of_symbol(symbolId)
-                self.balance.actualize(self.core.exchangeInterface.get_balance())
-                balanceQuote = self.balance.get(quote)                
+                base = self.core.base_of(symbolId)
+                quote = self.core.quote_of(symbolId)
+                if plan is not None:
+                    balanceQuote = self.planner.available(quote)        # type: ignore
+                    amountAsBase = plan["amountAsBase"]
+                else:
+                    self.balance.actualize(self.core.exchangeInterface.get_balance())
+                    balanceQuote = self.balance.get(quote)                
                 lastPrice = float(ticker.get("last", 0))
                 if lastPrice > 0:
                     if self.core.check_market_limits(market, amountAsBase, lastPrice):
-                        amountAsBase = self.core.exchangeInterface.round_to_precision(amountAsBase, symbolId, "amount")
+                        if plan is None:
+                            amountAsBase = self.core.round_to_precision(amountAsBase, symbolId, "amount")
                         
                         # aqui se deberia comprobar si el amount a invertir supera al balance disponible.
                         
@@ -142,6 +191,8 @@ class TrendTaker(Basics):
                         order = self.core.execute_market('buy', symbolId, amountAsBase, takeProfitPrice, stopLossPrice, maxHours, debug)   
                                              
                         if order is not None:       
+                            if plan is not None:
+                                self.planner.reserve(plan)      # type: ignore
                             self.core.investments.open(symbolId, amountAsBase, lastPrice, order, balanceQuote, profitPercent, 
                                 maxLossPercent, trailingStop, takeProfitPrice, stopLossPrice, maxHours)                            
                             msg1 = f'INVERSION ABIERTA en {symbolId}'
@@ -180,12 +231,12 @@ class TrendTaker(Basics):
             self.log.error(self.cmd(f'Error: No se pudo obtener los datos de inversion actual en el mercado {symbolId}'))
             return False            
         if symbolId is not None:
-            market = self.core.exchangeInterface.get_markets()[symbolId]
+            market = self.core.get_market(symbolId)
             if market is not None:
                 ticker = self.core.exchangeInterface.get_ticker(symbolId)
                 if ticker is not None:
-                    base = self.base_of_symbol(symbolId)
-                    quote = self.quote_of_symbol(symbolId)
+                    base = self.core.base_of(symbolId)
+                    quote = self.core.quote_of(symbolId)
                     amountAsBase = float(investment['buy']['amountAsBase'])
                     lastPrice = float(ticker.get("last", 0))
                     if lastPrice > 0:
@@ -229,62 +280,72 @@ class TrendTaker(Basics):
         Ejecuta las operaciones de venta de los activos cuyo precio a cruzado los umbrales de 
         Take Profit o Stop Loss. Tambien ejecuta la venta si la inversion supera el tiempo maximo
         permitido para la inversion.\n
+        Los precios de todas las inversiones se piden en una sola peticion de tickers y se procesan con
+        el indice de umbrales de salida (ExitTriggerIndex), por lo que solo se revisan las inversiones
+        cuyo umbral se ha cruzado. El Trailing Stop se calcula desde el precio maximo alcanzado, que se
+        guarda con la inversion.\n
         return: True si logra actualizar el estado de las inversiones. False si ocurre un error.
         '''
-        if not self.core.investments.empty():
-            index = 0
-            for marketId in self.core.investments.markets():
-                index += 1
+        if self.core.investments.empty():
+            return False
+        triggers = self.synchronize_exit_triggers()
+        markets = self.core.investments.markets()
+        tickers = self.core.exchangeInterface.get_tickers(markets)
+        if tickers is None:
+            tickers = {}
+        fired = []
+        for marketId in markets:
+            try:
+                actualPrice = float(tickers[marketId]["last"])
+            except:
+                self.log.warning(self.cmd(f'Error: No se pudo obtener el ticker del mercado {marketId}', '\n'))
+                continue
+            fired += triggers.update_price(marketId, actualPrice)
+        fired += triggers.expired(self.core.exchangeInterface.exchange.milliseconds())
+        if self.highWaterChanged:
+            self.core.investments.save_to_file()
+            self.highWaterChanged = False
+        self.cmd(f'Inversiones abiertas: {len(markets)}   Umbrales de salida cruzados: {len(fired)}')
+        closed = set()
+        for index, (marketId, reason) in enumerate(fired):
+            investment = self.core.investments.get(marketId)
+            if marketId in closed or investment is None:
+                continue
+            base = self.base_of_symbol(investment["symbol"])
+            quote = self.quote_of_symbol(investment["symbol"])                                
+            msg1 = f'{index + 1}: Inversion en {investment["symbol"]}'
+            msg2 = f'cantidad comprada: {investment["buy"]["amountAsBase"]} {base}'
+            msg3 = f'precio de compra: {investment["buy"]["price"]} {quote}'
+            self.log.info(f'{msg1} {msg2} {msg3}')
+            self.cmd(f'\n{msg1}\n{INDENT}{msg2}\n{INDENT}{msg3}')
+            self.log.info(self.cmd(f'{reason} activado en {marketId}'))
+            if self.close_investment(marketId):
+                triggers.remove(marketId)
+                closed.add(marketId)
+        return True
+
+
+    def synchronize_exit_triggers(self) -> ExitTriggerIndex:
+        '''
+        Agrega al indice de umbrales de salida las inversiones abiertas desde la ultima comprobacion y
+        elimina las que ya no estan abiertas.
+        return: Indice de umbrales de salida de las inversiones abiertas.
+        '''
+        if self.exitTriggers is None:
+            def on_high_water(marketId:MarketId, price:float):
+                self.highWaterChanged = self.core.investments.set_high_water(marketId, price, False) or self.highWaterChanged
+            self.exitTriggers = ExitTriggerIndex(on_high_water)
+        markets = self.core.investments.markets()
+        openMarkets = set(markets)
+        for marketId in [marketId for marketId in self.exitTriggers.positions if marketId not in openMarkets]:
+            self.exitTriggers.remove(marketId)
+        defaultMaxHours = int(self.config.data["candlesDays"]) * 24
+        for marketId in markets:
+            if marketId not in self.exitTriggers:
                 investment = self.core.investments.get(marketId)
-                openInvesting = True
-                ticker = self.core.exchangeInterface.get_ticker(marketId)
-                if ticker is not None and investment is not None:
-                    actualPrice = float(ticker["last"])
-
-                    #symbolId = investment["symbol"]
-                    base = self.base_of_symbol(investment["symbol"])
-                    quote = self.quote_of_symbol(investment["symbol"])                                
-                    msg1 = f'{index}: Inversion en {investment["symbol"]}'
-                    msg2 = f'cantidad comprada: {investment["buy"]["amountAsBase"]} {base}'
-                    msg3 = f'precio de compra: {investment["buy"]["price"]} {quote}'
-                    self.log.info(f'{msg1} {msg2} {msg3}')
-                    self.cmd(f'\n{msg1}\n{INDENT}{msg2}\n{INDENT}{msg3}')
-                    
-                    if openInvesting:
-                        if investment["forExit"]["trailingStop"]:
-                            if investment["maxLossPercent"] is not None:
-                                trailingStopPrice = actualPrice * (1 + (float(investment["forExit"]["maxLossPercent"]) / 100))
-                                if actualPrice <= float(trailingStopPrice):
-                                    self.log.info(self.cmd(f'TRAILING STOP LOSS activado en {marketId}'))
-                                    openInvesting = not self.close_investment(marketId)
-                        else:
-                            if investment["forExit"]["stopLossPrice"] is not None:
-                                if actualPrice <= float(investment["forExit"]["stopLossPrice"]):
-                                    self.log.info(self.cmd(f'STOP LOSS activado en {marketId}'))
-                                    openInvesting = not self.close_investment(marketId)
-                                    
-                    if openInvesting and investment["forExit"]["takeProfitPrice"] is not None:
-                        if actualPrice >= float(investment["takeProfitPrice"]):
-                            self.log.info(self.cmd(f'TAKE PROFIT activado en {marketId}'))
-                            openInvesting = not self.close_investment(marketId)
-                            
-                    if openInvesting:
-                        if investment["forExit"]["maxHours"] is not None:
-                            maxHours = float(investment["forExit"]["maxHours"])
-                        else:
-                            maxHours = int(self.config.data["candlesDays"]) * 24
-                        timestamp = self.core.exchangeInterface.exchange.milliseconds()
-                        initialTimestamp = int(investment["buy"]["timestamp"])
-                        hours = float((timestamp - initialTimestamp) / 1000 / 60 / 60)
-                        self.cmd(f'{INDENT}duracion: {round(hours, 2)} horas')
-                        if hours >= maxHours:
-                            self.log.info(self.cmd(f'TIME STOP activado en {marketId}'))
-                            openInvesting = not self.close_investment(marketId)
-                else:
-                    self.log.warning(self.cmd(f'Error: No se pudo obtener el ticker del mercado {marketId}', '\n'))
-                time.sleep(0.2)
-            return True
-        return False
+                if investment is not None:
+                    self.exitTriggers.add(marketId, investment, defaultMaxHours)
+        return self.exitTriggers
 
 
 
@@ -314,15 +375,30 @@ class TrendTaker(Basics):
             self.log.info(self.cmd(f'Iniciando bot: {self.botId}', '\n'))
             self.log.info(self.cmd(f'exchangeId: {self.exchangeId}'))            
             if self.config.load():
+                self.configure_console()
+                self.config.show()
                 currencyQuote = self.config.data["currencyQuote"]
-                self.core = TrendTakerCore(self.botId, self.exchangeId, self.apiKey, self.secret, currencyQuote)                
+                metricsEngine = str(self.config.data.get("metricsEngine", "python"))
+                self.core = TrendTakerCore(
+                    self.botId, 
+                    self.exchangeId, 
+                    self.apiKey, 
+                    self.secret, 
+                    currencyQuote, 
+                    metricsEngine, 
+                    self.sharedExchangeInterface, 
+                    self.sharedCandleCache
+                )
+                self.core.metricsCache.configure(self.config.data)
+                self.core.checkpoint.configure(self.config.data)
+                self.core.configure_quotes(self.config.data)
                 if self.core.exchangeInterface.check_exchange_methods(True):           
-                    time.sleep(1)
+                    ConsoleOutput.pause(1)
                     if self.balance.actualize(self.core.exchangeInterface.get_balance()):
                         self.balance.show(currencyQuote)
-                        time.sleep(1)
+                        ConsoleOutput.pause(1)
                         if self.sufficient_balance():
-                            if self.core.load_markets():
+                            if self.core.load_markets(self.config.data):
                                 if self.get_list_of_valid_markets():
                                     self.initialExecutionDateTimeAsSeconds = self.core.exchangeInterface.exchange.seconds()
                                     if self.core.investments.load_from_file():
@@ -335,11 +411,26 @@ class TrendTaker(Basics):
 
 
 
+    def configure_console(self):
+        '''
+        Aplica la seccion "console" de la configuracion. Con "headless" no se imprime nada en la consola
+        ni se hacen las pausas para leerla. Con "background" la consola se imprime en un hilo aparte y con
+        "backgroundLog" los ficheros log se escriben en un hilo aparte. Ver ConsoleOutput.
+        '''
+        console = self.config.data.get("console", {})
+        ConsoleOutput.configure(bool(console.get("headless", False)), bool(console.get("background", True)))
+        if console.get("backgroundLog", True):
+            ConsoleOutput.background_logging(self.log)
+
+
+
+
+
     def sufficient_balance(self):
         param = "amountToInvestAsQuote"
         quote = self.config.data["currencyQuote"]
         balanceQuote = self.balance.get(quote)
-        amountToInvestAsQuote = float(self.config.data.get(param, 10))
+        amountToInvestAsQuote = PreTradePlanner.amount_to_invest(self.config.data, balanceQuote)
         if balanceQuote < amountToInvestAsQuote * 2.5 and not DEBUG_MODE["ignoreBalance"]:
             self.log.error(self.cmd(f'El balance libre actual de {quote} en la cuenta no es suficiente para operar.'))
             self.log.info(self.cmd(f'Debe reducir el valor del parametro "{param}" o aumentar el balance de la cuenta.'))
@@ -381,7 +472,7 @@ class TrendTaker(Basics):
         '''
         if self.config.data.get("forceCloseInvestmentAndExit", False):
             self.log.error(self.cmd('ATENCION: La configuracion del bot indica que deben cerrarse todas las inversiones inmediatamente.', '\n'))
-            time.sleep(3)
+            ConsoleOutput.pause(3)
             if not self.core.investments.empty():
                 for marketId in self.core.investments.markets():
                     self.close_investment(marketId)
@@ -393,12 +484,120 @@ class TrendTaker(Basics):
 
 
 
+    def create_pre_trade_planner(self) -> PreTradePlanner:
+        '''
+        Prepara la etapa previa a las compras con un solo balance de la cuenta, que se pide en este momento.
+        Si no se puede obtener el balance, se usa el ultimo balance conocido.
+        return: Objeto PreTradePlanner con el que se calculan y reservan los montos de las compras.
+        '''
+        self.balance.actualize(self.core.exchangeInterface.get_balance())
+        return PreTradePlanner(self.core, self.config.data, self.balance.current or self.balance.initial)
+
+
+    def create_diversified_selection(self, orderedMarkets:ListOfMarketData) -> Optional[DiversifiedSelection]:
+        '''
+        Prepara la seleccion de mercados poco correlacionados entre si, si esta activada en la configuracion.
+        Los mercados en los que ya hay una inversion abierta se aceptan desde el inicio, para que los
+        candidatos nuevos tambien se comparen con ellos.
+        param orderedMarkets: Lista de mercados ordenados por potencial.
+        return: Objeto DiversifiedSelection. None si la diversificacion esta desactivada.
+        '''
+        diversification = self.config.data.get("diversification", {})
+        if not diversification.get("enable", False) or len(orderedMarkets) < 2:
+            return None
+        selection = DiversifiedSelection(
+            orderedMarkets, 
+            int(self.config.data["candlesDays"]) * 24, 
+            float(diversification.get("maxCorrelation", 1)), 
+            self.botId
+        )
+        if selection.correlation is None:
+            return None
+        for index, marketData in enumerate(orderedMarkets):
+            if self.core.investments.contains(marketData["symbolId"]):
+                selection.accept(index)
+        return selection
+
+
+
+    def process_market(self, marketData:MarketData, report:Report) -> bool:
+        '''
+        Invierte en el mercado si todavia hay espacio para otra inversion y agrega el mercado al reporte.\n
+        Al terminar, marketData["status"] indica si la inversion ya estaba abierta ("open"), si se abrio
+        ("new") o si solo se agrego al reporte ("potential").
+        param marketData: Datos del mercado, de la lista devuelta por TrendTakerCore.get_ordered_and_filtered_markets.
+        param report: Reporte de la ejecucion.
+        return: True si se proceso el mercado. False si ya no hay espacio para mas inversiones o si no cumple los limites del mercado.
+        '''
+        if self.core.investments.count() >= int(self.config.data["maxCurrenciesToInvest"]):
+            return False
+        symbolId = marketData["symbolId"]
+        percentage = float(marketData['tickerData']['percentage'])
+        preselected = self.core.is_preselected(self.core.base_of(symbolId), self.config.data)
+        msg1 = f"{symbolId}  crecimiento en 24h: {round(percentage, 2)} %"
+        self.log.info(self.cmd(msg1, "Mercado preseleccionado: " if preselected else "Mercado potencial: "))                                
+        plan = self.planner.get(marketData)
+        amountToInvestAsBase = plan["amountAsBase"]
+        if not plan["withinLimits"]:
+            self.log.warning(self.cmd(f'{plan["rejection"]}', f'{INDENT}Atencion! '))
+            return False
+        marketData["status"] = "potential"         
+        if self.core.investments.contains(symbolId):
+            marketData["status"] = "open"                             
+        else:
+            if self.planner.affordable(plan):
+                if self.config.data["modeActive"]["enable"]:
+                    if self.invest_in(
+                            symbolId, 
+                            amountToInvestAsBase, 
+                            marketData["metrics"]["profitPercent"], 
+                            marketData["metrics"]["maxLossPercent"],
+                            marketData["metrics"]["maxHours"],
+                            self.config.data["modeActive"]["trailingStopEnable"],
+                            plan
+                        ):
+                        marketData["status"] = "new" 
+                else:
+                    if self.invest_in(symbolId, amountToInvestAsBase, plan=plan):
+                        marketData["status"] = "new"   
+        self.submit_market_report(marketData, report)
+        return True
+
+
+    def submit_market_report(self, marketData:MarketData, report:Report):
+        '''
+        Agrega a la cola del reporte el grafico del mercado y sus datos, para que se creen despues de
+        decidir y colocar la orden. Ver ReportQueue.
+        param marketData: Datos del mercado, con el estado ("status") ya decidido.
+        param report: Reporte de la ejecucion.
+        '''
+        symbolId = marketData["symbolId"]
+        graphFileName = report.create_unique_filename(symbolId)
+        graphTitle = f'{self.botId} {self.exchangeId} {symbolId}'
+        def create_market_report():
+            report.create_graph(marketData["candles1h"], graphTitle, graphFileName, marketData["metrics"], False)
+            report.append_market_data(graphFileName, marketData)
+        self.report_queue().submit(f'grafico de {symbolId}', create_market_report)
+
+
+    def report_queue(self) -> ReportQueue:
+        '''
+        return: Cola de trabajos del reporte. Se crea la primera vez, segun "backgroundReport" en la configuracion.
+        '''
+        if self.reportQueue is None:
+            background = bool(self.config.data.get("backgroundReport", {}).get("enable", True))
+            self.reportQueue = ReportQueue(self.botId, background)
+        return self.reportQueue
+
+
+
     def execute(self) -> bool:
         '''
         Ejecuta el algoritmo de inversion del bot.\n
         Primero prepara las variables y recursos necesarios para iniciar la ejecucion y luego 
-        entra en un bucle infinito donde se obtienen regularmente datos del mercado y se determina
-        si se debe invertir o no en un activo.
+        obtiene los datos del mercado y determina si se debe invertir o no en un activo.
+        Con "daemon" activado en la configuracion, el proceso no termina: repite el escaneo
+        periodicamente (ver run_daemon).
         '''
         if not self.prepare_execution():
             return False
@@ -406,56 +605,95 @@ class TrendTaker(Basics):
             return True
         if self.force_close_investments_and_exit():
             return True
+        if self.config.data.get("daemon", {}).get("enable", False):
+            return self.run_daemon()
+        result = self.scan_and_invest()
+        if self.reportQueue is not None:
+            self.reportQueue.close()
+        return result
+
+
+    def scan_and_invest(self) -> bool:
+        '''
+        Escanea los mercados validos, invierte en los de mayor potencial y crea el reporte.
+        return: True si se completa el escaneo. False si ocurre un error obteniendo los datos del mercado.
+        '''
         report = Report(self.core, self.botId, self.exchangeId, DIRECTORY_GRAPHICS, "png")
         validTickers = self.core.get_ordered_and_filtered_tickers(self.listOfValidMarketsId, self.config.data)
         if validTickers is None: 
             return False
-        orderedMarkets = self.core.get_ordered_and_filtered_markets(validTickers, self.config.data)
+        self.planner = self.create_pre_trade_planner()
+        processed = []
+        def invest_when_ready(marketData:MarketData):
+            processed.append(marketData["symbolId"])
+            self.process_market(marketData, report)
+        earlyInvest = self.config.data.get("earlyTermination", {}).get("enable", False) \
+            and not self.config.data.get("diversification", {}).get("enable", False)
+        orderedMarkets = self.core.get_ordered_and_filtered_markets(
+            validTickers, 
+            self.config.data, 
+            invest_when_ready if earlyInvest else None
+        )
         if orderedMarkets is None: 
             return False
-        for marketData in orderedMarkets:
-            if self.core.investments.count() < int(self.config.data["maxCurrenciesToInvest"]):
-                symbolId = marketData["symbolId"]
-                percentage = float(marketData['tickerData']['percentage'])
-                preselected = self.core.is_preselected(self.quote_of_symbol(symbolId), self.config.data)
-                msg1 = f"{symbolId}  crecimiento en 24h: {round(percentage, 2)} %"
-                self.log.info(self.cmd(msg1, "Mercado preseleccionado: " if preselected else "Mercado potencial: "))                                
-                lastPrice = float(marketData["tickerData"]["last"])
-                #travajar aqui para que se pueda especificar el amoumt por porciemto.
-                amountToInvestAsQuote = float(self.config.data["amountToInvestAsQuote"])
-                amountToInvestAsBase = amountToInvestAsQuote / lastPrice 
-                if self.core.check_market_limits(marketData["symbolData"], amountToInvestAsBase, lastPrice):
-                    graphFileName = report.create_unique_filename(symbolId)
-                    graphTitle = f'{self.botId} {self.exchangeId} {symbolId}'
-                    report.create_graph(marketData["candles1h"], graphTitle, graphFileName, marketData["metrics"], False)           
-                    marketData["status"] = "potential"         
-                    if self.core.investments.contains(symbolId):
-                        marketData["status"] = "open"                             
-                    else:
-                        if self.core.sufficient_quote_to_buy(amountToInvestAsQuote, symbolId):
-                            if self.config.data["modeActive"]["enable"]:
-                                if self.invest_in(
-                                        symbolId, 
-                                        amountToInvestAsBase, 
-                                        marketData["metrics"]["profitPercent"], 
-                                        marketData["metrics"]["maxLossPercent"],
-                                        marketData["metrics"]["maxHours"],
-                                        self.config.data["modeActive"]["trailingStopEnable"]
-                                    ):
-                                    marketData["status"] = "new" 
-                            else:
-                                if self.invest_in(symbolId, amountToInvestAsBase):
-                                    marketData["status"] = "new"   
-                    report.append_market_data(graphFileName, marketData)
-                    time.sleep(1)
+        self.planner.plan([marketData for marketData in orderedMarkets if marketData["symbolId"] not in processed])
+        selection = self.create_diversified_selection(orderedMarkets)
+        for index, marketData in enumerate(orderedMarkets):
+            symbolId = marketData["symbolId"]
+            if symbolId in processed:
+                continue
+            if selection is not None and self.core.investments.count() < int(self.config.data["maxCurrenciesToInvest"]):
+                preselected = self.core.is_preselected(self.core.base_of(symbolId), self.config.data)
+                if not preselected and not self.core.investments.contains(symbolId):
+                    if not selection.is_diversified(index):
+                        correlation = round(selection.max_correlation_with_accepted(index), 2)
+                        self.log.info(self.cmd(f"{symbolId}  correlacion con los mercados seleccionados: {correlation}", "Mercado descartado: "))
+                        continue
+                if self.process_market(marketData, report) and (preselected or marketData["status"] in ["open", "new"]):
+                    selection.accept(index)
+            else:
+                self.process_market(marketData, report)
+        self.core.metricsCache.save_to_file()
         if self.config.data["createWebReport"]:
-            report.create_web(self.config.data["showWebReport"])
+            self.report_queue().submit('web', lambda: report.create_web(self.config.data["showWebReport"]))
         if self.core.investments.empty():
             self.log.info(self.cmd('SIN INVERTIR: No se han encontrado mercados favorables.'))
         self.log.info(self.cmd('Terminado'))
         return True
 
 
+    def run_daemon(self) -> bool:
+        '''
+        Ejecuta el bot como un proceso de larga duracion, manteniendo los mercados cargados y los caches.\n
+        Se programan tres tareas, cada una con su intervalo en la seccion "daemon" de la configuracion:\n
+        - Escaneo completo de mercados e inversion, unos segundos despues del cierre de cada vela de 1h.
+        - Seguimiento de las inversiones abiertas (TakeProfit, StopLoss y tiempo maximo), con mas frecuencia.
+        - Actualizacion de la lista de mercados validos, con menos frecuencia.\n
+        return: True cuando el proceso se detiene.
+        '''
+        daemon = self.config.data.get("daemon", {})
+        self.scheduler = DaemonScheduler(self.botId)
+        self.scheduler.add(
+            "escaneo de mercados", 
+            float(daemon.get("scanIntervalSeconds", 3600)), 
+            self.scan_and_invest, 
+            aligned=True, 
+            delay=float(daemon.get("scanDelaySeconds", 30)), 
+            runNow=bool(daemon.get("scanOnStart", True))
+        )
+        self.scheduler.add("seguimiento de inversiones", float(daemon.get("monitorIntervalSeconds", 60)), self.actualize_current_investments)
+        self.scheduler.add("actualizacion de mercados", float(daemon.get("universeIntervalSeconds", 21600)), self.refresh_valid_markets)
+        self.log.info(self.cmd('Modo daemon iniciado.', '\n'))
+        try:
+            self.scheduler.run()
+        except KeyboardInterrupt:
+            self.log.info(self.cmd('Modo daemon detenido por el usuario.'))
+        self.core.metricsCache.save_to_file()
+        if self.reportQueue is not None:
+            self.reportQueue.close()
+        return True
+
+
 
 
 if __name__ == "__main__":
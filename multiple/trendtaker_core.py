@@ -3,39 +3,196 @@ import time
 from exchange_interface import *
 from market_metrics import *
 from basics import *
-from typing import Dict, Literal, Optional, List
+from typing import Callable, Dict, Literal, Optional, List
 from validations import Validations
-from investments import Investments
+from investments import Investments, InvestmentsByQuote
+from candle_series import CandleSeries
+from metrics_cache import MetricsCache
+from metrics_engines import create_metrics_engine
+from candle_filter_pipeline import CandleFilterPipeline
+from candle_series import Candles
+from streaming_metrics import StreamingMarketMetrics, DEFAULT_REPORT_CANDLES
+from parallel_metrics import ParallelMetrics
+from ticker_table import TickerTable, TICKER_TABLE_AVAILABLE
+from market_universe import MarketUniverse
+from universe_manager import UniverseManager, UniverseChanges
+from early_termination import EarlyTermination
+from candle_cache import CandleCache
+from scan_checkpoint import ScanCheckpoint
 from configuration import *
 
+ScanState = Dict    # Estado de un escaneo de mercados. Ver TrendTakerCore._prepare_scan.
+
+
 class TrendTakerCore(Validations, Basics):
 
-    def __init__(self, botId:str, exchangeId:str, apiKey:str, secret:str, quote:CurrencyId):
+    def __init__(
+            self, 
+            botId:str, 
+            exchangeId:str, 
+            apiKey:str, 
+            secret:str, 
+            quote:CurrencyId, 
+            metricsEngine:str="python",
+            exchangeInterface:Optional[ExchangeInterface]=None,
+            candleCache:Optional[CandleCache]=None
+        ):
+        '''
+        param exchangeInterface: Interfaz con el exchange compartida con otros bots. None para crear una propia.
+        param candleCache: Cache de velas compartido con otros bots. None para crear uno propio.
+        '''
         Validations.__init__(self, botId)
+        self.botId = botId
         self.exchangeId = exchangeId
-        self.exchangeInterface = ExchangeInterface(exchangeId, apiKey, secret, botId)
-        self.metrics = MarketMetrics()
+        self.exchangeInterface = exchangeInterface if exchangeInterface is not None else ExchangeInterface(exchangeId, apiKey, secret, botId)
+        self.metrics = create_metrics_engine(metricsEngine, botId)
+        self.metricsCache = MetricsCache(botId, exchangeId, engine=self.metrics)
         self.validMarkets = None
         self.orderableMarket = None
         self.outQuotes = None     
+        self.quotes = [quote]
         self.investments = Investments(botId, exchangeId, DIRECTORY_LEDGER, quote)
+        self.lastTickers: Optional[DictOfTickers] = None
+        self.candleCache = candleCache if candleCache is not None else CandleCache(botId, self.exchangeInterface)
+        self.checkpoint = ScanCheckpoint(botId, exchangeId)
+        self.candleRequests = 0     # Peticiones de velas que no se sirven desde el punto de control del escaneo.
+        self.metricsCache.onStore = self.checkpoint.add_metrics
+        self.universeManager = UniverseManager(botId, self.exchangeInterface, self)
+        self.universeManager.subscribe(self.on_universe_changes)
 
 
-    def load_markets(self) -> bool:
+    def load_markets(self, configuration:Optional[ConfigurationData]=None) -> bool:
         '''
         Carga las listas de mercados y cryptomonedas del exchange y sus datos.\n
+        Despues crea el indice de mercados (MarketUniverse) que se usa en las consultas frecuentes
+        y valida los mercados de la currency quote de la configuracion.\n
+        param configuration: Objeto con la configuracion del algoritmo. De ella se toman la quote,
+                             la lista negra y las currencies preseleccionadas del indice.
         return: True si se logran cargar los mercados y monedas. De lo contrario False.
         '''
-        if self.exchangeInterface.load_markets_and_currencies():
+        if self.refresh_markets(configuration, False) is not None:
             countOfCurrencies = len(self.exchangeInterface.get_currencies())          
-            countOfMarkets = len(self.exchangeInterface.get_markets())
+            countOfMarkets = self.universe.count()       # type: ignore
             self.log.info(self.cmd(f'Total de criptomonedas del exchange: {countOfCurrencies}'))
             self.log.info(self.cmd(f'Total de mercados del exchange: {countOfMarkets}'))
             return True
         else:
             self.log.error(self.cmd('Error: Cargando mercados.'))
             return False
-        
+
+
+    def refresh_markets(self, configuration:Optional[ConfigurationData]=None, reload:bool=True) -> Optional[UniverseChanges]:
+        '''
+        Vuelve a cargar los mercados del exchange y valida solo los agregados o modificados desde la carga anterior.\n
+        Se usa en las ejecuciones largas para detectar los mercados retirados del exchange.
+        param configuration: Objeto con la configuracion del algoritmo.
+        param reload: True para pedir de nuevo los mercados al exchange.
+        return: Objeto con los mercados agregados, retirados y modificados. None si no se pudieron cargar.
+        '''
+        configuration = configuration if configuration is not None else {}
+        changes = self.universeManager.refresh(
+            str(configuration.get("currencyQuote", "USDT")),
+            configuration.get("blackList", None),
+            configuration.get("preselected", None),
+            reload
+        )
+        self.universe = self.universeManager.universe
+        return changes
+
+
+    def on_universe_changes(self, changes:UniverseChanges):
+        '''
+        Invalida en el cache de metricas y en el cache de velas solo los mercados retirados o modificados.
+        param changes: Objeto con los cambios de mercados devuelto por UniverseManager.
+        '''
+        affected = changes["removed"] + changes["changed"]
+        if len(affected) > 0:
+            count = self.metricsCache.invalidate(affected)
+            self.log.info(self.cmd(f'Entradas del cache de metricas invalidadas: {count}'))
+            self.candleCache.invalidate(affected)
+
+
+    @staticmethod
+    def scan_quotes(configuration:ConfigurationData) -> ListOfCurrenciesId:
+        '''
+        Devuelve las currencies quote de los mercados que se escanean. La primera es siempre "currencyQuote".
+        Con "crossQuoteScan" activado se agregan las quotes de su lista, sin repetir.
+        param configuration: Objeto con la configuracion del algoritmo.
+        return: Lista de currencies quote.
+        '''
+        quotes = [str(configuration.get("currencyQuote", "USDT"))]
+        crossQuoteScan = configuration.get("crossQuoteScan", {})
+        if crossQuoteScan.get("enable", False):
+            for quote in crossQuoteScan.get("quotes", []):
+                if str(quote) not in quotes:
+                    quotes.append(str(quote))
+        return quotes
+
+
+    def configure_quotes(self, configuration:ConfigurationData) -> ListOfCurrenciesId:
+        '''
+        Prepara el core para escanear las quotes de la configuracion. Con varias quotes, las inversiones
+        se guardan en un registro por quote (InvestmentsByQuote).
+        param configuration: Objeto con la configuracion del algoritmo.
+        return: Lista de currencies quote que se escanean.
+        '''
+        self.quotes = self.scan_quotes(configuration)
+        self.candleCache.configure(configuration)
+        if len(self.quotes) > 1 and not isinstance(self.investments, InvestmentsByQuote):
+            self.investments = InvestmentsByQuote(self.botId, self.exchangeId, DIRECTORY_LEDGER, self.quotes, self.investments)
+            self.log.info(self.cmd(f'Quotes del escaneo: {", ".join(self.quotes)}'))
+        return self.quotes
+
+
+    def get_list_of_valid_markets_of_quotes(
+            self, 
+            quotes:ListOfCurrenciesId, 
+            blackList:Optional[ListOfCurrenciesId]=None
+        ) -> Optional[ListOfMarketsId]:
+        '''
+        Devuelve la union de las listas de mercados validos de varias currencies quote.
+        Ver get_list_of_valid_markets.
+        param quotes: Lista de currencies quote.
+        param blackList: Lista de cryptomonedas que no deben ser aceptadas.
+        return: Lista de los mercados validos de todas las quotes. Si ocurre error, devuelve None.
+        '''
+        validMarkets = []
+        for quote in quotes:
+            markets = self.get_list_of_valid_markets(quote, blackList)
+            if markets is None:
+                return None
+            validMarkets += markets
+        return validMarkets
+
+
+    def convert_amount(self, amount:float, fromQuote:CurrencyId, toQuote:CurrencyId) -> Optional[float]:
+        '''
+        Convierte una cantidad de una currency a otra con el ultimo precio del mercado que las une.
+        Se usan los tickers del ultimo escaneo, para no pedirlos de nuevo al exchange. Si el mercado
+        no esta en esos tickers, se pide su ticker.
+        param amount: Cantidad expresada en "fromQuote".
+        param fromQuote: Currency en la que esta expresada la cantidad.
+        param toQuote: Currency a la que se convierte la cantidad.
+        return: Cantidad expresada en "toQuote". None si no hay un mercado entre las dos currencies.
+        '''
+        if fromQuote == toQuote:
+            return amount
+        tickers = self.lastTickers if self.lastTickers is not None else {}
+        for symbolId, inverse in [(f'{toQuote}/{fromQuote}', True), (f'{fromQuote}/{toQuote}', False)]:
+            if self.get_market(symbolId) is None:
+                continue
+            ticker = tickers.get(symbolId, None)
+            if ticker is None:
+                ticker = self.exchangeInterface.get_ticker(symbolId)
+            try:
+                price = float(ticker["last"])           # type: ignore
+            except:
+                continue
+            if price > 0:
+                return amount / price if inverse else amount * price
+        self.log.warning(self.cmd(f'No se puede convertir {fromQuote} a {toQuote}'))
+        return None
+
 
     def get_list_of_valid_markets(
             self, 
@@ -56,6 +213,21 @@ class TrendTakerCore(Validations, Basics):
             currencies = self.exchangeInterface.get_currencies()
             if currencies is None:
                 return None
+            if self.universeManager.matches(quoteCurrency, blackList):
+                return self.universeManager.valid_markets()
+            if self.universe is not None:
+                blackListSet = MarketUniverse.currency_set(blackList)
+                for index in self.universe.ids_of_quote(quoteCurrency):
+                    base = self.universe.bases[index]
+                    if MarketUniverse.in_currency_set(base, blackListSet):
+                        continue
+                    if self.is_valid_market(
+                            self.universe.markets[index],
+                            currencies.get(base, None),
+                            currencies.get(quoteCurrency, None)
+                        ):
+                        validMarkets.append(self.universe.symbols[index])
+                return validMarkets
             for symbol in markets:
                 quote = self.quote_of_symbol(symbol)
                 if quote == quoteCurrency:
@@ -84,6 +256,8 @@ class TrendTakerCore(Validations, Basics):
         '''
         Dada una lista de mercados (symols) validos, pide al exchange todos los tickers y devuelve solo los que 
         pertenecen a mercados validos, y que cumplen las condiciones de seleccion del filtro.\n
+        Los mercados validos pueden ser de varias quotes ("crossQuoteScan"). Los tickers se piden una sola vez
+        y se ordenan juntos, porque la variacion en 24h se expresa en porciento.\n
         Nota: Se recomienda no llamar a esta función de manera muy seguida para evitar ser bloqueado por el exchange.\n
         param validMakets: Lista con los ID de los mercados (symbols) que se consideran validos.
         param configuration: Objeto con la configuracion del algoritmo.
@@ -93,7 +267,22 @@ class TrendTakerCore(Validations, Basics):
             return None
         selected = []
         try:
-            tickers = self.exchangeInterface.get_tickers()
+            tickers = self.checkpoint.resume()
+            if tickers is not None:
+                for key, statistics in self.checkpoint.metrics:
+                    self.metricsCache.restore(key, statistics)
+            else:
+                tickers = self.exchangeInterface.get_tickers()
+                if tickers is not None:
+                    self.checkpoint.start(tickers)
+            self.lastTickers = tickers
+            if tickers is not None and TICKER_TABLE_AVAILABLE:
+                symbols = [marketId for marketId in validMakets if marketId in tickers]
+                return self.select_tickers_with_table(
+                    [tickers[marketId] for marketId in symbols], 
+                    configuration,
+                    [self.base_of(marketId) for marketId in symbols]
+                )
             if tickers is not None:
                 for marketId in validMakets:
                     if marketId in tickers:
@@ -110,14 +299,7 @@ class TrendTakerCore(Validations, Basics):
                     reverse=True
                 )
                 result = result[0:configuration.get("maxTickersToSelect", 100)]
-                if len(result) > 0:
-                    self.cmd(f'Primeros {len(result)} mercados creciendo en las ultimas 24 horas:')
-                    for ticker in result:
-                        baseId = self.base_of_symbol(ticker["symbol"]) 
-                        preselectedLabel = '[PRESELECTED]' if self.is_preselected(baseId, configuration) else ''
-                        self.cmd(f'{round(float(ticker["percentage"]), 2)} %   {ticker["symbol"]}   {preselectedLabel}')
-                        time.sleep(0.1)
-                    self.cmd('\n')
+                self.show_selected_tickers(result, configuration)
                 return result
             except Exception as e:
                 self.log.exception(f'{self.cmd("Error: Ordenando los tickers filtrados de mercados validos.")} Exception: {str(e)}')
@@ -125,68 +307,468 @@ class TrendTakerCore(Validations, Basics):
         except Exception as e:
             self.log.exception(f'{self.cmd("Error: Leyendo los tickers y filtrando mercados validos.")} Exception: {str(e)}')
             return None
+
+
+    def select_tickers_with_table(
+            self, 
+            tickers:ListOfTickers, 
+            configuration:Dict, 
+            bases:Optional[List[CurrencyId]]=None
+        ) -> Optional[ListOfTickers]:
+        '''
+        Filtra y ordena los tickers igual que get_ordered_and_filtered_tickers, pero convirtiendolos una sola vez
+        en una tabla por columnas. Los filtros se aplican como mascaras vectorizadas y los primeros
+        "maxTickersToSelect" se obtienen con una ordenacion parcial.
+        param tickers: Tickers de los mercados validos.
+        param configuration: Objeto con la configuracion del algoritmo.
+        param bases: Currency base de cada ticker, tomadas del indice de mercados. None para obtenerlas de los symbols.
+        return: Lista filtrada con los tickers recientes, validos y crecientes. None si ha ocurrido un error.
+        '''
+        table = TickerTable(tickers, configuration.get("preselected", []), bases)
+        mask = table.valid_mask(configuration)
+        self.log.info(self.cmd(f'Cantidad de mercados creciendo en las ultimas 24 horas: {int(mask.sum())}', '\n', '\n'))
+        try:
+            result = [tickers[index] for index in table.top(mask, configuration.get("maxTickersToSelect", 100))]
+            self.show_selected_tickers(result, configuration)
+            return result
+        except Exception as e:
+            self.log.exception(f'{self.cmd("Error: Ordenando los tickers filtrados de mercados validos.")} Exception: {str(e)}')
+            return None
+
+
+    def show_selected_tickers(self, result:ListOfTickers, configuration:Dict):
+        '''
+        Muestra en la consola los tickers seleccionados.
+        param result: Lista de tickers seleccionados.
+        param configuration: Objeto con la configuracion del algoritmo.
+        '''
+        if len(result) > 0:
+            self.cmd(f'Primeros {len(result)} mercados creciendo en las ultimas 24 horas:')
+            for ticker in result:
+                baseId = self.base_of_symbol(ticker["symbol"]) 
+                preselectedLabel = '[PRESELECTED]' if self.is_preselected(baseId, configuration) else ''
+                self.cmd(f'{round(float(ticker.get("percentage") or 0), 2)} %   {ticker["symbol"]}   {preselectedLabel}')
+                ConsoleOutput.pause(0.1)
+            self.cmd('\n')
         
 
-    def get_ordered_and_filtered_markets(self, validTickers:ListOfTickers, configuration:Dict) -> Optional[ListOfMarketData]:
+    def get_ordered_and_filtered_markets(
+            self, 
+            validTickers:ListOfTickers, 
+            configuration:Dict,
+            onReady:Optional[Callable[[MarketData], None]]=None
+        ) -> Optional[ListOfMarketData]:
         '''
         Dada una lista de tickers de mercados validos, pide al exchange los datos y velas de cada mercado
         para devolver una lista de los mercados con sus velas y datos descriptivos.\n
+        Con "earlyTermination" activado, el escaneo termina cuando hay "maxCurrenciesToInvest" mercados
+        que ya no pueden ser superados por los tickers restantes (ver EarlyTermination). No se aplica
+        si las metricas se calculan en el pool de procesos.\n
         Nota: Se recomienda no llamar a esta función de manera muy seguida para evitar ser bloqueado por el exchange.\n
         param validTickers: Lista con los tickers de los mercados (symbols) que se consideran validos.
         param configuration: Objeto con la configuracion del algoritmo.
+        param onReady: Funcion que recibe cada mercado en cuanto su posicion en la lista final es segura,
+                       durante el escaneo y en el orden de la lista final. Solo con "earlyTermination" activado.
         return: Lista de mercados con los tickers, ultimas velas y datos descriptivos. None si ha ocurrido un error.
         '''
-        marketsData:ListOfMarketData = []
+        scan:Optional[ScanState] = None
         try:
-            preselected = configuration.get("preselected", [])
-            candlesHours = int(configuration.get("candlesDays", 7)) * 24
+            scan = self._prepare_scan(validTickers, configuration)
+            ranking = scan["ranking"]
             maxCount = len(validTickers)
             count = 0
             for ticker in validTickers:
+                if ranking is not None:
+                    self.emit_ready_markets(ranking, count, onReady)
+                    if ranking.finished():
+                        self.log.info(self.cmd(f'Escaneo terminado antes de tiempo. Tickers sin procesar: {maxCount - count}'))
+                        break
                 count += 1
-                symbolId = ticker['symbol']
-                baseId = self.base_of_symbol(symbolId)
-                quoteId = self.quote_of_symbol(symbolId)
-                candles1h = self.exchangeInterface.get_last_candles(symbolId, candlesHours, "1h")
-                if candles1h is not None:
-                    if len(candles1h) >= candlesHours:      # Si el mercado tiene la cantidad de velas pedidas...
-                        market = {
-                            "symbolId": symbolId,
-                            "baseId": baseId,
-                            "quoteId": quoteId,
-                            "tickerData": ticker,
-                            "symbolData": self.exchangeInterface.get_markets()[symbolId],
-                            "baseData": self.exchangeInterface.get_currencies()[baseId],
-                            "quoteData": self.exchangeInterface.get_currencies()[quoteId],
-                            "candles1h": candles1h,
-                            "metrics": self.metrics.calculate(ticker, candles1h[0:candlesHours], preselected)
-                        }              
-                        msg1 = f'Se han obtenido los datos del mercado: {symbolId}'
-                        if self.is_preselected(market["baseId"], configuration):
-                            market["preselected"] = True
-                            marketsData.append(market)
-                            msg1 = f"{msg1}  [PRESELECTED]"
-                        elif self.is_potential_market(market, configuration):
-                            market["preselected"] = False
-                            marketsData.append(market)
-                            msg1 = f"{msg1}  [POTENCIAL]"
-                        self.log.info(self.cmd(msg1, f'[{count} de {maxCount}] '))
-                    else:
-                        self.log.info(self.cmd(f"No hay suficientes velas en el mercado {symbolId}", f'[{count} de {maxCount}] '))                        
-                else:
-                    self.log.warning(self.cmd(f"No se pudieron obtener las velas del mercado {symbolId}"))
+                preselectedMarket = self.is_preselected(self.base_of(ticker['symbol']), configuration)
+                label = f'[{count} de {maxCount}] '
+                candleRequests = self.candleRequests
+                market = self._fetch_market(scan, ticker, preselectedMarket, count, label)
+                if market is not None:
+                    if self.select_market(scan["marketsData"], market, preselectedMarket, configuration, scan["pipeline"], label):
+                        if ranking is not None:
+                            ranking.add(market)
+                if self.candleRequests != candleRequests:     # Sin pausa si las velas salieron del punto de control.
+                    time.sleep(0.1)
+            if ranking is not None and not ranking.finished():
+                self.emit_ready_markets(ranking, maxCount, onReady)
+            self._flush_parallel_batches(scan, maxCount)
+            self._score_batch(scan, maxCount)
+            return self._finish_scan(scan)
+        except Exception as e:
+            self.log.exception(f'{self.cmd("Error: Obteniendo los datos descriptivos y velas de los mercados validos.")} Exception: {str(e)}')
+            if scan is not None and scan["parallel"] is not None:
+                scan["parallel"].close()
+            return None
+
+
+    def _prepare_scan(self, validTickers:ListOfTickers, configuration:Dict) -> ScanState:
+        '''
+        Lee de la configuracion los parametros del escaneo y crea los filtros, el pool de procesos y el
+        ranking de terminacion anticipada que se usan durante el escaneo.
+        param validTickers: Lista con los tickers de los mercados que se van a escanear.
+        param configuration: Objeto con la configuracion del algoritmo.
+        return: Estado del escaneo, que reciben las demas funciones del escaneo.
+        '''
+        candlesHours = int(configuration.get("candlesDays", 7)) * 24
+        configurationHash = self.metricsCache.configuration_hash(configuration)
+        twoPhaseFetch = configuration.get("twoPhaseFetch", {})
+        streamingCandles = configuration.get("streamingCandles", {})
+        minCompletion = configuration["filters"]["candles"].get("minCompletion", None)
+        probe = None
+        if twoPhaseFetch.get("enable", False):
+            probe = CandleFilterPipeline(self.botId, {"candles": twoPhaseFetch.get("filters", {})}, onlyPresent=True)
+        parallelMetrics = configuration.get("parallelMetrics", {})
+        parallel = None
+        if parallelMetrics.get("enable", False) and not streamingCandles.get("enable", False):
+            parallel = ParallelMetrics(self.botId, int(parallelMetrics.get("workers", 0)), self.metrics.name)
+        batch = False
+        if configuration.get("batchMetrics", {}).get("enable", False) and parallel is None and not streamingCandles.get("enable", False):
+            batch = NUMPY_AVAILABLE
+            if not batch:
+                self.log.warning(self.cmd('Atencion: El calculo de metricas por lotes necesita la libreria numpy. No se aplica.'))
+        ranking = None
+        earlyTermination = configuration.get("earlyTermination", {})
+        if earlyTermination.get("enable", False) and parallel is None and not batch:
+            target = int(configuration.get("maxCurrenciesToInvest", 1)) + int(earlyTermination.get("extraCandidates", 0))
+            ranking = EarlyTermination(validTickers, configuration, target)
+        return {
+            "configuration": configuration,
+            "preselected": configuration.get("preselected", []),
+            "candlesHours": candlesHours,
+            "configurationHash": configurationHash,
+            "timeFrames": MetricsCache.configured_timeframes(configuration),
+            "pipeline": CandleFilterPipeline(
+                self.botId,
+                configuration["filters"],
+                lambda symbol, candles, timeFrame: self.metricsCache.candles_statistics(symbol, candles, configurationHash, timeFrame)
+            ),
+            "probe": probe,
+            "probeHours": min(int(twoPhaseFetch.get("probeHours", 24)), candlesHours),
+            "streaming": streamingCandles.get("enable", False),
+            "chunkSize": int(streamingCandles.get("chunkSize", 500)),
+            "reportCandles": int(streamingCandles.get("reportCandles", DEFAULT_REPORT_CANDLES)),
+            "minStreamingCandles": candlesHours * float(minCompletion if minCompletion is not None else 0) / 100,
+            "parallel": parallel,
+            "batchSize": max(1, int(parallelMetrics.get("batchSize", 50))),
+            "batch": batch,
+            "batchMarkets": [],
+            "ranking": ranking,
+            "pendingMarkets": [],
+            "batches": [],
+            "downloadedCandles": 0,
+            "marketsData": []
+        }
+
+
+    def _fetch_market(
+            self, 
+            scan:ScanState, 
+            ticker:Ticker, 
+            preselectedMarket:bool, 
+            count:int, 
+            label:str
+        ) -> Optional[MarketData]:
+        '''
+        Pide las velas de un mercado, le aplica los filtros de velas y calcula sus metricas.\n
+        Con "parallelMetrics" activado, las metricas que no estan en el cache se dejan pendientes para
+        calcularlas en el pool de procesos (ver _flush_parallel_batches).
+        param scan: Estado del escaneo, devuelto por _prepare_scan.
+        param ticker: Ultimo ticker del mercado.
+        param preselectedMarket: True si el mercado esta preseleccionado. Sus velas no se filtran.
+        param count: Posicion del ticker en el escaneo.
+        param label: Prefijo de los mensajes de la consola.
+        return: Datos del mercado. None si se descarta, si falla o si sus metricas quedan pendientes.
+        '''
+        symbolId = ticker['symbol']
+        candlesHours = scan["candlesHours"]
+        probe = scan["probe"]
+        if probe is not None and not preselectedMarket:
+            # Primera fase: Se descartan con pocas velas recientes los mercados que no cumplen los filtros del sondeo.
+            probeHours = scan["probeHours"]
+            candleRequests = self.candleRequests
+            candlesProbe = CandleSeries.from_list(self.get_last_candles(symbolId, probeHours, "1h"))
+            scan["downloadedCandles"] += len(candlesProbe) if candlesProbe is not None else 0
+            if self.candleRequests != candleRequests:
                 time.sleep(0.1)
-            self.log.info(self.cmd(f'Se han preseleccionado {len(marketsData)} mercados con ganancia potencial.', '', '\n'))
-            try:
-                return sorted(marketsData, key=lambda x: float(x["metrics"]["potential"]), reverse=True)
-            except Exception as e:
-                self.log.exception(f'{self.cmd("Error: Ordenando la lista de mercados seleccionados.")} Exception: {str(e)}')
+            if candlesProbe is None or len(candlesProbe) < probeHours or not probe.run(symbolId, candlesProbe[0:probeHours]):
+                self.log.info(self.cmd(f'Se ha descartado el mercado en el sondeo: {symbolId}', label))
+                return None
+        if scan["streaming"]:
+            # Las velas se reciben por partes. Solo se guardan columnas compactas y las velas del reporte.
+            streaming = StreamingMarketMetrics(scan["timeFrames"], scan["reportCandles"])
+            self.candleRequests += 1
+            streaming.push_chunks(self.exchangeInterface.get_candles_chunks(symbolId, candlesHours, "1h", scan["chunkSize"]))
+            scan["downloadedCandles"] += streaming.count()
+            if streaming.count() == 0 or streaming.count() < scan["minStreamingCandles"]:
+                self.log.info(self.cmd(f"No hay suficientes velas en el mercado {symbolId}", label))
                 return None
+            return self.create_market_data(ticker, streaming.report_candles(), streaming.calculate(ticker, scan["preselected"]))
+        candles1h = CandleSeries.from_list(self.get_last_candles(symbolId, candlesHours, "1h"))
+        scan["downloadedCandles"] += len(candles1h) if candles1h is not None else 0
+        if candles1h is None:
+            self.log.warning(self.cmd(f"No se pudieron obtener las velas del mercado {symbolId}"))
+        elif len(candles1h) < candlesHours:     # Si el mercado no tiene la cantidad de velas pedidas...
+            self.log.info(self.cmd(f"No hay suficientes velas en el mercado {symbolId}", label))
+        elif not preselectedMarket and not scan["pipeline"].run(symbolId, candles1h[0:candlesHours]):
+            self.log.info(self.cmd(f'Mercado descartado por el filtro de velas "{scan["pipeline"].failedStage}": {symbolId}', label))
+        elif scan["parallel"] is not None and not self.metrics_are_cached(symbolId, candles1h[0:candlesHours], scan["configurationHash"], scan["timeFrames"]):
+            # Las metricas se calculan en el pool de procesos mientras se piden las velas de los siguientes mercados.
+            scan["pendingMarkets"].append((ticker, candles1h, preselectedMarket, count))
+            if len(scan["pendingMarkets"]) >= scan["batchSize"]:
+                self._submit_pending_markets(scan)
+        elif scan["batch"] and not self.metrics_are_cached(symbolId, candles1h[0:candlesHours], scan["configurationHash"], scan["timeFrames"]):
+            # Las metricas se calculan al final del escaneo, para todos los mercados a la vez (ver _score_batch).
+            scan["batchMarkets"].append((ticker, candles1h, preselectedMarket, count))
+        else:
+            metrics = self.metricsCache.calculate(ticker, candles1h[0:candlesHours], scan["preselected"], scan["configuration"])
+            return self.create_market_data(ticker, candles1h, metrics)
+        return None
+
+
+    def _submit_pending_markets(self, scan:ScanState):
+        '''
+        Envia al pool de procesos el lote de mercados con metricas pendientes.
+        param scan: Estado del escaneo, devuelto por _prepare_scan.
+        '''
+        pendingMarkets = scan["pendingMarkets"]
+        scan["batches"].append((pendingMarkets, scan["parallel"].submit([item[1] for item in pendingMarkets], scan["candlesHours"])))
+        scan["pendingMarkets"] = []
+
+
+    def _flush_parallel_batches(self, scan:ScanState, maxCount:int):
+        '''
+        Recoge las metricas calculadas en el pool de procesos, las guarda en el cache de metricas y
+        selecciona los mercados. Al terminar se cierra el pool. Sin pool de procesos no hace nada.
+        param scan: Estado del escaneo, devuelto por _prepare_scan.
+        param maxCount: Cantidad de tickers del escaneo. Se usa en los mensajes de la consola.
+        '''
+        parallel = scan["parallel"]
+        if parallel is None:
+            return
+        candlesHours = scan["candlesHours"]
+        configurationHash = scan["configurationHash"]
+        if len(scan["pendingMarkets"]) > 0:
+            self._submit_pending_markets(scan)
+        for pending, batch in scan["batches"]:
+            for (ticker, candles1h, preselectedMarket, count), record in zip(pending, batch.results()):
+                if record is None:
+                    self.log.warning(self.cmd(f'No se pudieron calcular las metricas del mercado {ticker["symbol"]}'))
+                    continue
+                self.metricsCache.store(ticker["symbol"], candles1h[0:candlesHours], record["candles"], configurationHash)
+                if scan["timeFrames"]:
+                    # Las temporalidades ya se calcularon en la etapa "timeframes" del filtro de velas.
+                    record["timeframes"] = {
+                        timeFrame: self.metricsCache.candles_statistics(ticker["symbol"], candles1h[0:candlesHours], configurationHash, timeFrame)
+                        for timeFrame in scan["timeFrames"]
+                    }
+                market = self.create_market_data(ticker, candles1h, ParallelMetrics.compose(ticker, record, scan["preselected"]))
+                self.select_market(scan["marketsData"], market, preselectedMarket, scan["configuration"], scan["pipeline"], f'[{count} de {maxCount}] ')
+        parallel.close()
+
+
+    def _score_batch(self, scan:ScanState, maxCount:int):
+        '''
+        Calcula en una sola pasada vectorizada (MarketMetricsBatch) las metricas y la decision de
+        Validations.is_potential_market de los mercados pendientes del escaneo por lotes. Las estadisticas
+        de las velas se guardan en el cache de metricas. Sin mercados pendientes no hace nada.
+        param scan: Estado del escaneo, devuelto por _prepare_scan.
+        param maxCount: Cantidad de tickers del escaneo. Se usa en los mensajes de la consola.
+        '''
+        pending = scan["batchMarkets"]
+        if len(pending) == 0:
+            return
+        from market_metrics_batch import MarketMetricsBatch
+        candlesHours = scan["candlesHours"]
+        configurationHash = scan["configurationHash"]
+        listOfCandles = [candles1h[0:candlesHours] for (ticker, candles1h, preselectedMarket, count) in pending]
+        # Las temporalidades ya se calcularon en la etapa "timeframes" del filtro de velas.
+        timeFrameStatistics = {
+            timeFrame: [
+                self.metricsCache.candles_statistics(ticker["symbol"], candles, configurationHash, timeFrame)
+                for (ticker, candles1h, preselectedMarket, count), candles in zip(pending, listOfCandles)
+            ]
+            for timeFrame in scan["timeFrames"]
+        } if scan["timeFrames"] else None
+        batch = MarketMetricsBatch.calculate(
+            [item[0] for item in pending],
+            MarketMetricsBatch.candles_tensor(listOfCandles, candlesHours),
+            scan["preselected"],
+            scan["configuration"],
+            timeFrameStatistics
+        )
+        for index, ((ticker, candles1h, preselectedMarket, count), candles) in enumerate(zip(pending, listOfCandles)):
+            metrics = MarketMetricsBatch.metrics_of(batch, index)
+            if metrics is None:
+                self.log.warning(self.cmd(f'No se pudieron calcular las metricas del mercado {ticker["symbol"]}'))
+                continue
+            self.metricsCache.store(ticker["symbol"], candles, metrics["candles"], configurationHash)
+            market = self.create_market_data(ticker, candles1h, metrics)
+            self.select_market(
+                scan["marketsData"], market, preselectedMarket, scan["configuration"], scan["pipeline"], 
+                f'[{count} de {maxCount}] ', bool(batch["passed"][index])
+            )
+        scan["batchMarkets"] = []
+
+
+    def _finish_scan(self, scan:ScanState) -> Optional[ListOfMarketData]:
+        '''
+        Muestra el resumen del escaneo, termina el punto de control y ordena los mercados seleccionados.
+        param scan: Estado del escaneo, devuelto por _prepare_scan.
+        return: Lista de mercados ordenada de mayor a menor potencial. None si ha ocurrido un error.
+        '''
+        marketsData = scan["marketsData"]
+        if scan["probe"] is not None:
+            self.log.info(self.cmd(f'Sondeo de {scan["probeHours"]} velas. {scan["probe"].report()}'))
+        self.log.info(self.cmd(scan["pipeline"].report()))
+        self.log.info(self.cmd(f'Velas descargadas en el escaneo: {scan["downloadedCandles"]}'))
+        self.log.info(self.cmd(self.candleCache.report()))
+        self.log.info(self.cmd(self.metricsCache.report()))
+        self.log.info(self.cmd(f'Se han preseleccionado {len(marketsData)} mercados con ganancia potencial.', '', '\n'))
+        self.checkpoint.finish()
+        try:
+            return sorted(marketsData, key=lambda x: float(x["metrics"]["potential"]), reverse=True)
         except Exception as e:
-            self.log.exception(f'{self.cmd("Error: Obteniendo los datos descriptivos y velas de los mercados validos.")} Exception: {str(e)}')
+            self.log.exception(f'{self.cmd("Error: Ordenando la lista de mercados seleccionados.")} Exception: {str(e)}')
             return None
     
 
+    def get_last_candles(self, symbolId:MarketId, count:int, timeFrame:str="1h") -> Optional[ListOfCandles]:
+        '''
+        Devuelve las ultimas velas del mercado desde el punto de control del escaneo, si se esta reanudando
+        un escaneo interrumpido, o desde el cache de velas. Las velas descargadas se guardan en el punto de control.
+        Los parametros son los mismos que en ExchangeInterface.get_last_candles.
+        return: Lista con las velas obtenidas. Si falla devuelve None.
+        '''
+        candles = self.checkpoint.get_candles(symbolId, count, timeFrame)
+        if candles is None:
+            self.candleRequests += 1
+            candles = self.candleCache.get_last_candles(symbolId, count, timeFrame)
+            if candles is not None:
+                self.checkpoint.add_candles(symbolId, count, timeFrame, candles)
+        return candles
+
+
+    def emit_ready_markets(self, ranking:EarlyTermination, position:int, onReady:Optional[Callable[[MarketData], None]]):
+        '''
+        Entrega a "onReady" los mercados cuya posicion en la lista final ya es segura.
+        param ranking: Objeto EarlyTermination del escaneo.
+        param position: Posicion del siguiente ticker que se va a procesar.
+        param onReady: Funcion que recibe cada mercado. Si es None, solo se cuentan.
+        '''
+        for market in ranking.ready(position):
+            if onReady is not None:
+                onReady(market)
+
+
+    def metrics_are_cached(self, symbolId:MarketId, candles1h:Candles, configurationHash:str, timeFrames:List[str]) -> bool:
+        '''
+        param symbolId: Identificador del mercado.
+        param candles1h: Velas 1h del mercado con las que se calculan las metricas.
+        param configurationHash: Hash devuelto por MetricsCache.configuration_hash.
+        param timeFrames: Temporalidades mayores configuradas.
+        return: True si las estadisticas de las velas 1h y de todas las temporalidades estan en el cache de metricas.
+        '''
+        return all(self.metricsCache.contains(symbolId, candles1h, configurationHash, timeFrame) for timeFrame in ["1h"] + timeFrames)
+
+
+    def select_market(
+            self,
+            marketsData:ListOfMarketData,
+            market:MarketData,
+            preselectedMarket:bool,
+            configuration:Dict,
+            pipeline:CandleFilterPipeline,
+            prefix:str,
+            potential:Optional[bool]=None
+        ) -> bool:
+        '''
+        Agrega el mercado a la lista de mercados seleccionados si es preseleccionado o si tiene potencial.
+        param marketsData: Lista de mercados seleccionados.
+        param market: Datos del mercado, devueltos por create_market_data.
+        param preselectedMarket: True si el mercado esta preseleccionado.
+        param configuration: Objeto con la configuracion del algoritmo.
+        param pipeline: Filtro de velas del escaneo, donde se registra el resultado de la etapa "metrics".
+        param prefix: Prefijo del mensaje que se muestra en el log.
+        param potential: Resultado de Validations.is_potential_market ya calculado. Ej: por MarketMetricsBatch.
+                         None para calcularlo aqui.
+        return: True si el mercado se agrega a la lista.
+        '''
+        msg1 = f'Se han obtenido los datos del mercado: {market["symbolId"]}'
+        selected = False
+        if preselectedMarket:
+            market["preselected"] = True
+            marketsData.append(market)
+            msg1 = f"{msg1}  [PRESELECTED]"
+            selected = True
+        elif pipeline.count("metrics", self.is_potential_market(market, configuration) if potential is None else potential):
+            market["preselected"] = False
+            marketsData.append(market)
+            msg1 = f"{msg1}  [POTENCIAL]"
+            selected = True
+        self.log.info(self.cmd(msg1, prefix))
+        return selected
+
+
+    def get_market(self, symbolId:MarketId) -> Optional[Market]:
+        '''
+        param symbolId: Identificador del mercado.
+        return: Datos del mercado obtenidos mediante la libreria CCXT. None si el mercado no existe.
+        '''
+        if self.universe is not None:
+            return self.universe.market_of(symbolId)
+        return self.exchangeInterface.get_markets().get(symbolId, None)
+
+
+    def base_of(self, symbolId:MarketId) -> CurrencyId:
+        return self.universe.base_of(symbolId) if self.universe is not None else self.base_of_symbol(symbolId)
+
+
+    def quote_of(self, symbolId:MarketId) -> CurrencyId:
+        return self.universe.quote_of(symbolId) if self.universe is not None else self.quote_of_symbol(symbolId)
+
+
+    def round_to_precision(self, value:float, symbolId:MarketId, precisionType:PrecisionType) -> float:
+        '''
+        Redondea un valor segun la precision del mercado. Usa el indice de mercados si ya fue creado.
+        param value: Valor que debe ser ajustado.
+        param symbolId: Identificador del mercado de donde se toma la precision.
+        param precisionType: Tipo de precision "price", "amount" o "cost"
+        return: Devuelve el valor redondeado a la cantidad de decimales especificada por el exchange.
+        '''
+        if self.universe is not None and self.universe.id_of(symbolId) is not None and precisionType != "cost":
+            return self.universe.round_to_precision(value, symbolId, precisionType)
+        return self.exchangeInterface.round_to_precision(value, symbolId, precisionType)
+
+
+    def create_market_data(self, ticker:Ticker, candles1h:Candles, metrics:Metrics) -> MarketData:
+        '''
+        Devuelve el objeto con los datos de un mercado que se usa en la seleccion y el reporte.
+        param ticker: Ultimo ticker del mercado, obtenido del exchange, mediante la librería ccxt.
+        param candles1h: Velas del mercado que se muestran en el grafico del reporte.
+        param metrics: Metricas del mercado.
+        return: Objeto con los datos del mercado.
+        '''
+        symbolId = ticker['symbol']
+        baseId = self.base_of(symbolId)
+        quoteId = self.quote_of(symbolId)
+        return {
+            "symbolId": symbolId,
+            "baseId": baseId,
+            "quoteId": quoteId,
+            "tickerData": ticker,
+            "symbolData": self.get_market(symbolId),
+            "baseData": self.exchangeInterface.get_currencies()[baseId],
+            "quoteData": self.exchangeInterface.get_currencies()[quoteId],
+            "candles1h": candles1h,
+            "metrics": metrics
+        }
+
+
     def create_simulated_order(self, side:Side, symbol:MarketId, amount:float) -> Optional[Order]:
         '''
         Devuelve datos ficticios de una orden simulada.
@@ -300,10 +882,12 @@ class TrendTakerCore(Validations, Basics):
         '''
         currencyId = ""
         try:
-            currencyId = self.quote_of_symbol(marketId)
+            currencyId = self.quote_of(marketId)
             currentBalance = self.exchangeInterface.get_balance()
             if currentBalance is not None:
-                takerFeeRate = float(self.exchangeInterface.get_markets()[marketId]["taker"])
+                takerFeeRate = self.universe.taker_fee(marketId) if self.universe is not None else None
+                if takerFeeRate is None:
+                    takerFeeRate = float(self.exchangeInterface.get_markets()[marketId]["taker"])
                 necessaryCurrencyBalance = amountQuoteToBuy + (amountQuoteToBuy * takerFeeRate)
                 availableCurrencyBalance = float(currentBalance['free'][currencyId])
                 if availableCurrencyBalance < necessaryCurrencyBalance:
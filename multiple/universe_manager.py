@@ -0,0 +1,234 @@
+
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+from basics import *
+from market_universe import MarketUniverse
+from validations import Validations
+
+UniverseChanges = Dict[str, ListOfMarketsId]
+UniverseListener = Callable[[UniverseChanges], None]
+
+# Campos del mercado que, si cambian, obligan a validarlo de nuevo o a actualizar el indice.
+MARKET_FINGERPRINT_FIELDS = ["active", "spot", "type", "base", "quote", "taker", "limits", "precision"]
+
+
+class UniverseManager(Basics):
+    '''
+    Mantiene el indice de mercados (MarketUniverse) y la lista de mercados validos de un bot que se
+    ejecuta durante mucho tiempo, para detectar mercados nuevos, retirados o modificados.\n
+    En cada refresco se pide de nuevo la lista de mercados al exchange y se compara con la anterior
+    mediante una huella (fingerprint) de los campos que afectan a la validacion y al indice. Solo se
+    validan de nuevo los mercados agregados o modificados. Los cambios se notifican a los suscriptores
+    (cache de metricas, cache de velas...) para que invaliden solo los mercados afectados.\n
+    Si cambia la quote o la lista negra, se validan de nuevo todos los mercados.
+    '''
+
+    def __init__(self, botId:str, exchangeInterface, validations:Validations):
+        '''
+        param botId: Identificador del bot. Se usa para obtener el log.
+        param exchangeInterface: Interfaz con el exchange. Debe tener load_markets_and_currencies, get_markets y get_currencies.
+        param validations: Objeto con el metodo is_valid_market. Normalmente el TrendTakerCore.
+        '''
+        self.log = logging.getLogger(botId)
+        self.exchangeInterface = exchangeInterface
+        self.validations = validations
+        self.universe: Optional[MarketUniverse] = None
+        self.fingerprints: Dict[MarketId, Tuple] = {}
+        self.valid: Dict[MarketId, bool] = {}
+        self.criteria: Optional[Tuple] = None
+        self.listeners: List[UniverseListener] = []
+
+
+    def subscribe(self, listener:UniverseListener):
+        '''
+        Registra una funcion que recibe los cambios de cada refresco.
+        param listener: Funcion que recibe un objeto con las listas "added", "removed", "changed",
+                        "validAdded" y "validRemoved" de identificadores de mercados.
+        '''
+        self.listeners.append(listener)
+
+
+    @staticmethod
+    def fingerprint(market:Market, currencies:DictOfCurrencies) -> Tuple:
+        '''
+        Devuelve la huella de un mercado: los campos que usan la validacion y el indice de mercados,
+        incluido el estado de sus currencies base y quote.
+        param market: Datos del mercado obtenidos mediante la libreria CCXT.
+        param currencies: Diccionario de currencies cargado mediante la libreria CCXT.
+        return: Tupla comparable con las huellas de otros refrescos.
+        '''
+        fields = tuple(repr(market.get(field, None)) for field in MARKET_FINGERPRINT_FIELDS)
+        base = currencies.get(str(market.get("base", "")), None)
+        quote = currencies.get(str(market.get("quote", "")), None)
+        return fields + (
+            None if base is None else base.get("active", None),
+            None if quote is None else quote.get("active", None)
+        )
+
+
+    def refresh(
+            self,
+            quoteCurrency:CurrencyId,
+            blackList:Optional[ListOfCurrenciesId]=None,
+            preselected:Optional[ListOfCurrenciesId]=None,
+            reload:bool=True
+        ) -> Optional[UniverseChanges]:
+        '''
+        Carga los mercados del exchange y actualiza el indice y la lista de mercados validos.
+        param quoteCurrency: Currency quote de los mercados que se deben validar.
+        param blackList: Lista de cryptomonedas que no deben ser aceptadas.
+        param preselected: Lista de currencies preseleccionadas.
+        param reload: True para pedir de nuevo los mercados al exchange. En la primera carga no hace falta.
+        return: Objeto con los cambios encontrados. None si no se pudieron cargar los mercados.
+        '''
+        if not self.exchangeInterface.load_markets_and_currencies(reload and self.universe is not None):
+            return None
+        markets = self.exchangeInterface.get_markets()
+        currencies = self.exchangeInterface.get_currencies()
+        if markets is None or currencies is None:
+            return None
+        criteria = (quoteCurrency, MarketUniverse.currency_set(blackList), MarketUniverse.currency_set(preselected))
+        if self.universe is None or criteria != self.criteria:
+            return self.rebuild(markets, currencies, criteria)
+        return self.apply(markets, currencies)
+
+
+    def rebuild(self, markets:DictOfMarkets, currencies:DictOfCurrencies, criteria:Tuple) -> UniverseChanges:
+        '''
+        Crea el indice y valida todos los mercados. Se usa en la primera carga y cuando cambia la quote o la lista negra.
+        '''
+        quoteCurrency, blackList, preselected = criteria
+        self.criteria = criteria
+        self.universe = MarketUniverse(markets, currencies)
+        self.universe.blackList, self.universe.preselected = blackList, preselected
+        self.fingerprints = {symbol: self.fingerprint(market, currencies) for symbol, market in markets.items()}
+        previous = {symbol for symbol, valid in self.valid.items() if valid}
+        self.valid = {}
+        for index in self.universe.ids_of_quote(quoteCurrency):
+            self.valid[self.universe.symbols[index]] = self.validate(index)
+        changes = {
+            "added": list(markets.keys()),
+            "removed": [],
+            "changed": [],
+            "validAdded": [symbol for symbol, valid in self.valid.items() if valid and symbol not in previous],
+            "validRemoved": [symbol for symbol in sorted(previous) if not self.valid.get(symbol, False)]
+        }
+        self.notify(changes)
+        return changes
+
+
+    def apply(self, markets:DictOfMarkets, currencies:DictOfCurrencies) -> UniverseChanges:
+        '''
+        Compara los mercados cargados con los del indice y procesa solo las diferencias.
+        '''
+        universe: MarketUniverse = self.universe        # type: ignore
+        quoteCurrency = self.criteria[0]                # type: ignore
+        changes: UniverseChanges = {"added": [], "removed": [], "changed": [], "validAdded": [], "validRemoved": []}
+        universe.currencies = currencies
+        for symbol in [symbol for symbol in self.fingerprints if symbol not in markets]:
+            del self.fingerprints[symbol]
+            universe.remove(symbol)
+            changes["removed"].append(symbol)
+            if self.valid.pop(symbol, False):
+                changes["validRemoved"].append(symbol)
+        for symbol, market in markets.items():
+            fingerprint = self.fingerprint(market, currencies)
+            previous = self.fingerprints.get(symbol, None)
+            if previous == fingerprint:
+                continue
+            self.fingerprints[symbol] = fingerprint
+            index = universe.update(symbol, market)
+            changes["added" if previous is None else "changed"].append(symbol)
+            if universe.quotes[index] != quoteCurrency:
+                continue
+            wasValid = self.valid.get(symbol, False)
+            self.valid[symbol] = self.validate(index)
+            if self.valid[symbol] and not wasValid:
+                changes["validAdded"].append(symbol)
+            elif wasValid and not self.valid[symbol]:
+                changes["validRemoved"].append(symbol)
+        self.notify(changes)
+        return changes
+
+
+    def validate(self, index:int) -> bool:
+        '''
+        Valida un mercado del indice igual que TrendTakerCore.get_list_of_valid_markets.
+        param index: Identificador entero del mercado.
+        return: True si el mercado es valido.
+        '''
+        universe: MarketUniverse = self.universe        # type: ignore
+        base = universe.bases[index]
+        if universe.is_blacklisted(base):
+            return False
+        return self.validations.is_valid_market(
+            universe.markets[index],
+            universe.currencies.get(base, None),
+            universe.currencies.get(universe.quotes[index], None)
+        )
+
+
+    def notify(self, changes:UniverseChanges):
+        '''
+        Envia los cambios a los suscriptores. Un error en un suscriptor no impide notificar a los demas.
+        '''
+        count = sum(len(changes[key]) for key in ["added", "removed", "changed"])
+        if count > 0:
+            msg1 = f'Mercados agregados: {len(changes["added"])}  retirados: {len(changes["removed"])}  modificados: {len(changes["changed"])}'
+            self.log.info(self.cmd(msg1))
+        for listener in self.listeners:
+            try:
+                listener(changes)
+            except Exception as e:
+                self.log.exception(self.cmd(f'Error: Notificando los cambios de mercados. Exception: {str(e)}'))
+
+
+    def matches(self, quoteCurrency:CurrencyId, blackList:Optional[ListOfCurrenciesId]=None) -> bool:
+        '''
+        return: True si la lista de mercados validos se creo con la quote y la lista negra especificadas.
+        '''
+        return self.criteria is not None and self.criteria[0:2] == (quoteCurrency, MarketUniverse.currency_set(blackList))
+
+
+    def valid_markets(self) -> ListOfMarketsId:
+        '''
+        return: Lista de los mercados validos, en el orden en que los devolvio el exchange.
+        '''
+        if self.universe is None:
+            return []
+        quoteCurrency = self.criteria[0]                # type: ignore
+        return [self.universe.symbols[index] for index in self.universe.ids_of_quote(quoteCurrency) if self.valid.get(self.universe.symbols[index], False)]
+
+
+
+# Codigo de ejemplo y test.
+if __name__ == "__main__":
+    import copy
+    import random
+    from benchmarks import BenchmarkCore, synthetic_markets
+
+    class ChangingExchangeInterface(Basics):
+        def __init__(self, markets:DictOfMarkets, currencies:DictOfCurrencies):
+            self.markets, self.currencies = markets, currencies
+        def load_markets_and_currencies(self, reload:bool=False) -> bool:
+            return True
+        def get_markets(self) -> DictOfMarkets:
+            return self.markets
+        def get_currencies(self) -> DictOfCurrencies:
+            return self.currencies
+
+    markets, currencies = synthetic_markets(random.Random(0), 3000, "USDT")
+    exchange = ChangingExchangeInterface(copy.deepcopy(markets), copy.deepcopy(currencies))
+    core = BenchmarkCore(markets, currencies)
+    manager = UniverseManager("test", exchange, core)
+    manager.subscribe(lambda changes: print(f'Evento: { {key: len(value) for key, value in changes.items()} }'))
+    manager.refresh("USDT", ["C5"], reload=False)
+    symbols = [symbol for symbol in exchange.markets if symbol.endswith("/USDT")]
+    del exchange.markets[symbols[0]]
+    exchange.markets[symbols[1]]["active"] = not exchange.markets[symbols[1]]["active"]
+    exchange.markets[symbols[2]]["limits"]["amount"]["min"] = 1
+    exchange.markets["NEW/USDT"] = dict(exchange.markets[symbols[3]], symbol="NEW/USDT", base="NEW", active=True, spot=True, type="spot")
+    exchange.currencies["NEW"] = {"id": "NEW", "active": True}
+    manager.refresh("USDT", ["C5"])
+    expected = BenchmarkCore(exchange.markets, exchange.currencies).get_list_of_valid_markets("USDT", ["C5"])
+    print(f'Lista de mercados validos igual a una validacion completa: {sorted(manager.valid_markets()) == sorted(expected or [])}')
@@ -2,6 +2,7 @@
 from typing import Any, Dict, Literal, Optional, List
 from exchange_interface import *
 from market_metrics import MarketMetrics
+from market_universe import MarketUniverse
 import logging
 from basics import *
 
@@ -10,6 +11,7 @@ class Validations(Basics):
     
     def __init__(self, botId:str):
         self.log = logging.getLogger(botId)
+        self.universe: Optional[MarketUniverse] = None
         
     
     @staticmethod
@@ -34,11 +36,17 @@ class Validations(Basics):
         return: True si el valor "amountAsBase" esta dentro de los limites permitidos. False si esta fuera de los limites.
         '''
         symbolId = symbolData['symbol']
-        base = Basics.base_of_symbol(symbolId)
-        quote = Basics.quote_of_symbol(symbolId)
+        if self.universe is not None and self.universe.id_of(symbolId) is not None:
+            base = self.universe.base_of(symbolId)
+            quote = self.universe.quote_of(symbolId)
+            amountMin = self.universe.amount_limit("min", symbolId)
+            amountMax = self.universe.amount_limit("max", symbolId)
+        else:
+            base = Basics.base_of_symbol(symbolId)
+            quote = Basics.quote_of_symbol(symbolId)
+            amountMin = Validations.get_market_limit("min", symbolData)
+            amountMax = Validations.get_market_limit("max", symbolData)
         decimals = 2 if quote.upper() == "USDT" else 12
-        amountMin = Validations.get_market_limit("min", symbolData)
-        amountMax = Validations.get_market_limit("max", symbolData)
         amountMinAsQuote = float(amountMin * lastPrice)
         amountMaxAsQuote = float(amountMax * lastPrice)
         if amountAsBase < amountMin:
@@ -193,6 +201,35 @@ class Validations(Basics):
         # Verifica si el profit del ultimo cuarto del rango de velas es adecuado.
         if not Validations.check(metricsOfCandles["changeHalf2"], "above", filters.get("minProfitHalf2", None)):
             return False
+        # Verifica si las temporalidades mayores confirman la tendencia.
+        for timeFrame, timeFrameFilters in configuration["filters"].get("timeframes", {}).items():
+            if not Validations.is_confirmed_timeframe(marketData["metrics"].get("timeframes", {}).get(timeFrame, None), timeFrameFilters):
+                return False
+        return True
+
+
+    @staticmethod
+    def is_confirmed_timeframe(metricsOfTimeFrame:Optional[Dict], filters:Dict) -> bool:
+        '''
+        Devuelve true si las estadisticas de las velas de una temporalidad mayor cumplen sus filtros.\n
+        Solo se comprueban los filtros presentes en la configuracion de la temporalidad.
+        param metricsOfTimeFrame: Estadisticas de las velas de la temporalidad, obtenidas con MarketMetrics.timeframe_statistics.
+        param filters: Filtros de la temporalidad. Usa las mismas claves que los filtros de velas 1h.
+        return: Devuelve True si la temporalidad confirma la tendencia. De lo contrario, devuelve False.
+        '''
+        if metricsOfTimeFrame is None:
+            return False
+        percent = metricsOfTimeFrame["percent"]
+        checks = [
+            ("colapses", "below", "maxColapses"),
+            ("completion", "above", "minCompletion"),
+            ("changeWhole", "above", "minProfitWhole"),
+            ("changeHalf1", "above", "minProfitHalf1"),
+            ("changeHalf2", "above", "minProfitHalf2")
+        ]
+        for metric, condition, filterName in checks:
+            if filterName in filters and not Validations.check(percent[metric], condition, filters[filterName]):
+                return False
         return True
 
     